@@ -0,0 +1,171 @@
+"""
+Batch runner of interpret.py tests, runs all programs of test directory in pool of warm worker processes
+
+Test is given by NAME.src (XML source), optional NAME.in (input, default empty), NAME.out (expected output,
+default empty) and NAME.rc (expected return code, default 0). Output is compared only when return code is 0,
+same as in test.php.
+
+With --differential every test is run by reference and compiled engine, test fails when their output
+or return code differ. --opt runs all tests with given optimizer passes, expected results stay the same.
+
+Usage: python batch.py DIR [--jobs N] [--timeout SECONDS] [--slowest N] [--quiet]
+                           [--engine reference|compiled] [--differential] [--opt PASSES]
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from interpret import ENGINES, run
+from optimizer import PeepholeOptimizer
+
+RC_TIMEOUT = -1     # return code reported for test stopped by --timeout
+
+
+class TestTimeout(BaseException):
+    """
+    Raised by SIGALRM handler, not Exception, so it is not caught by error handling of interpreter
+    (e.g. parser turns any Exception into error 31 or 32), same as KeyboardInterrupt
+    """
+
+
+def _alarm(signum, frame):
+    raise TestTimeout()
+
+
+def execute(source, stdin, timeout=None, engine='reference', optimize=None):
+    """
+    Run one program in this process, every run has its own interpreter state
+    :param source: XML source as bytes
+    :param stdin: input as bytes
+    :param timeout: maximal run time in seconds or None
+    :param engine: name of interpreter engine
+    :param optimize: names of optimizer passes or None
+    :return: (stdout bytes, stderr str, return code)
+    """
+    if timeout:
+        signal.signal(signal.SIGALRM, _alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        stdout, stderr, code = run(source, stdin, engine=engine, optimize=optimize)
+        stderr = stderr.decode('utf-8', 'replace')
+    except TestTimeout:
+        stdout, stderr, code = b'', 'Timeout after %g s\n' % timeout, RC_TIMEOUT
+    except Exception:
+        # crash of interpreter, same code as uncaught exception in separate process
+        stdout, stderr, code = b'', traceback.format_exc(), 1
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return stdout, stderr, code
+
+
+def _read(path, default):
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return default
+
+
+def run_test(args):
+    """
+    Run test in worker process
+    :param args: (path without suffix, timeout, engine, differential, optimizer passes)
+    :return: (path, passed, return code, expected return code, wall time, message)
+    """
+    base, timeout, engine, differential, optimize = args
+    start = time.perf_counter()
+    try:
+        source = _read(base + '.src', b'')
+        stdin = _read(base + '.in', b'')
+        expected_output = _read(base + '.out', b'')
+        expected_rc = int(_read(base + '.rc', b'0').strip() or 0)
+    except (OSError, ValueError) as e:
+        return base, False, None, None, time.perf_counter() - start, 'Unable to read test: ' + str(e)
+
+    stdout, stderr, code = execute(source, stdin, timeout, engine, optimize)
+    if differential:
+        compiled_stdout, _, compiled_code = execute(source, stdin, timeout, 'compiled', optimize)
+        if (compiled_stdout, compiled_code) != (stdout, code):
+            return (base, False, code, expected_rc, time.perf_counter() - start,
+                    'Engines differ: compiled rc=%s%s' % (compiled_code, ', output differs'
+                                                          if compiled_stdout != stdout else ''))
+    elapsed = time.perf_counter() - start
+
+    if code != expected_rc:
+        lines = stderr.strip().splitlines()
+        return base, False, code, expected_rc, elapsed, lines[-1][-200:] if lines else ''
+    if code == 0 and stdout != expected_output:
+        return base, False, code, expected_rc, elapsed, 'Output differs'
+    return base, True, code, expected_rc, elapsed, ''
+
+
+def find_tests(directory):
+    tests = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.src'):
+                tests.append(os.path.join(root, name[:-len('.src')]))
+    return tests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory', help='directory searched recursively for .src files')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--timeout', type=float, help='maximal run time of one test in seconds')
+    parser.add_argument('--slowest', type=int, default=10, help='number of slowest tests in summary')
+    parser.add_argument('--quiet', action='store_true', help='print only failed tests and summary')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='reference')
+    parser.add_argument('--differential', action='store_true',
+                        help='run each test also by compiled engine and compare it with reference engine')
+    parser.add_argument('--opt', help='comma separated optimizer passes or "all", same as in interpret.py')
+    args = parser.parse_args()
+    if args.differential:
+        args.engine = 'reference'
+    optimize = args.opt.split(',') if args.opt else None
+    if optimize:
+        try:
+            PeepholeOptimizer(optimize)
+        except ValueError as e:
+            sys.exit(str(e))
+
+    tests = find_tests(args.directory)
+    if not tests:
+        sys.exit('No tests found in ' + args.directory)
+
+    start = time.perf_counter()
+    results = []
+    # bigger chunks for big corpus, workers stay warm between tests
+    chunksize = max(1, len(tests) // (args.jobs * 16))
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        jobs = ((test, args.timeout, args.engine, args.differential, optimize) for test in tests)
+        for result in executor.map(run_test, jobs, chunksize=chunksize):
+            base, passed, code, expected_rc, elapsed, message = result
+            results.append(result)
+            name = os.path.relpath(base, args.directory)
+            if not passed:
+                print('FAIL %-50s %8.3f s  rc=%s expected %s  %s' % (name, elapsed, code, expected_rc, message))
+            elif not args.quiet:
+                print('PASS %-50s %8.3f s' % (name, elapsed))
+    wall = time.perf_counter() - start
+
+    failed = sum(1 for result in results if not result[1])
+    print()
+    print('%d tests, %d passed, %d failed' % (len(results), len(results) - failed, failed))
+    print('wall time %.3f s, sum of test times %.3f s, %d workers'
+          % (wall, sum(result[4] for result in results), args.jobs))
+    if args.slowest:
+        print('slowest tests:')
+        for base, _, _, _, elapsed, _ in sorted(results, key=lambda result: -result[4])[:args.slowest]:
+            print('  %8.3f s  %s' % (elapsed, os.path.relpath(base, args.directory)))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
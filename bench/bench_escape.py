@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of decoding escape sequences of string literals, compares ValidateArguments.escape_string
+with the previous implementation, which searched and sliced the string for each escape, on escape-dense
+strings of increasing size. Cache of escape_string is cleared before each run, so decoding is measured
+
+Usage: python bench/bench_escape.py [--size N ...] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import interpret  # noqa: E402
+
+
+def slicing_escape(text):
+    """
+    Previous implementation, quadratic in number of escapes
+    """
+    starting_index = 0
+    while text.find('\\', starting_index) != -1:
+        i = text.find('\\', starting_index)
+        char = text[i + 1:i + 4]
+        if char != '':
+            text = text[:i] + chr(int(char)) + text[i + 4:]
+            starting_index = i + 1
+        else:
+            text = text[:i] + text[i] + text[i + 4:]
+            starting_index = i + 1
+    return text
+
+
+def escape_dense(size):
+    """
+    :param size: number of escape sequences
+    :return: literal with escaped space, hash and backslash separated by single characters
+    """
+    escapes = ('\\032', '\\035', '\\092')
+    return ''.join(escapes[i % 3] + 'ab'[i % 2] for i in range(size))
+
+
+def single_pass_escape(text):
+    interpret.ValidateArguments.escape_string.cache_clear()
+    return interpret.ValidateArguments.escape_string(text)
+
+
+def measure(function, text, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print('%10s %12s %12s %9s' % ('escapes', 'slicing', 'single pass', 'speedup'))
+    for size in args.size:
+        text = escape_dense(size)
+        if single_pass_escape(text) != slicing_escape(text):
+            sys.exit('decoded strings differ for size %d' % size)
+        old = measure(slicing_escape, text, args.repeat)
+        new = measure(single_pass_escape, text, args.repeat)
+        print('%10d %11.6fs %11.6fs %8.1fx' % (size, old, new, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of --source-format=ippcode front end, compares end-to-end latency of running IPPcode23 source
+directly with the pipeline php parse.php | interpret.py (XML), and time of loading program in process
+by ParseIPPcode and ParseXML. Outputs and exit codes of both ways must be the same.
+
+When php is not installed, the pipeline is measured without parse.php, as interpret.py run on XML
+generated by the benchmark, which is lower bound of the pipeline latency.
+
+Usage: python bench/bench_frontend.py [--program NAME] [--size N ...] [--repeat N]
+"""
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as XML
+
+from programs import BENCHMARKS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import interpret  # noqa: E402
+
+INTERPRETER = os.path.join(ROOT, 'interpret.py')
+
+
+def to_source(xml):
+    """
+    Convert generated XML program back to IPPcode23 source
+    """
+    lines = ['.IPPcode23']
+    for instruction in XML.fromstring(xml):
+        tokens = [instruction.attrib['opcode']]
+        for arg in sorted(instruction, key=lambda arg: arg.tag):
+            text = arg.text or ''
+            arg_type = arg.attrib['type']
+            tokens.append(text if arg_type in ('var', 'label', 'type') else arg_type + '@' + text)
+        lines.append(' '.join(tokens))
+    return '\n'.join(lines) + '\n'
+
+
+def best_time(function, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_command(command, stdin_path):
+    with open(stdin_path, 'rb') as stdin:
+        process = subprocess.run(command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=ROOT)
+    return process.stdout, process.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--program', choices=sorted(BENCHMARKS), default='large_program')
+    parser.add_argument('--size', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    php = shutil.which('php')
+    if php is None:
+        print('php not found, pipeline is measured without parse.php (lower bound)')
+    pipeline_name = 'php+xml' if php else 'xml only'
+
+    print('%8s %12s %12s %9s %12s %12s %9s'
+          % ('size', 'ippcode', pipeline_name, 'speedup', 'load ippcode', 'load xml', 'speedup'))
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.size:
+            xml, text, _ = BENCHMARKS[args.program][0](size)
+            source = to_source(xml)
+            paths = {}
+            for suffix, content in (('src', source), ('xml', xml), ('in', text)):
+                paths[suffix] = os.path.join(workdir, '%s-%d.%s' % (args.program, size, suffix))
+                with open(paths[suffix], 'w') as file:
+                    file.write(content)
+
+            direct = [sys.executable, INTERPRETER, '--source-format=ippcode', '--source', paths['src'],
+                      '--input', paths['in']]
+            if php:
+                xml_path = paths['xml'] + '.php'
+                pipeline = ['sh', '-c', '"$1" parse.php < "$2" > "$3" && "$4" interpret.py --source "$3" --input "$5"',
+                            'sh', php, paths['src'], xml_path, sys.executable, paths['in']]
+            else:
+                pipeline = [sys.executable, INTERPRETER, '--source', paths['xml'], '--input', paths['in']]
+
+            direct_time, direct_result = best_time(lambda: run_command(direct, os.devnull), args.repeat)
+            pipeline_time, pipeline_result = best_time(lambda: run_command(pipeline, os.devnull), args.repeat)
+            if direct_result != pipeline_result:
+                sys.exit('size %d: output or exit code of ippcode and xml differ' % size)
+
+            load_source, _ = best_time(lambda: interpret.Program.from_source(io.BytesIO(source.encode()),
+                                                                             source_format='ippcode'), args.repeat)
+            load_xml, _ = best_time(lambda: interpret.Program.from_source(io.BytesIO(xml.encode())), args.repeat)
+            print('%8d %11.4fs %11.4fs %8.2fx %11.4fs %11.4fs %8.2fx'
+                  % (size, direct_time, pipeline_time, pipeline_time / direct_time,
+                     load_source, load_xml, load_xml / load_source))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark of peephole optimizer, runs program with patterns of generated code without optimization,
+with each optimization pass separately and with all of them, also number of instructions specialized
+by type inference. Program is run in process by interpret.run
+and CPU time is measured, so startup and other load of machine do not hide small differences
+
+Usage: python bench/bench_opt.py [--size N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+from programs import optimizable_loop
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import interpret  # noqa: E402
+
+CONFIGS = (None, 'fold', 'dead', 'defmove', 'cmpjump', 'concat', 'types', 'all')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    xml, _, _ = optimizable_loop(args.size)
+    programs = {opt: interpret.load_program(xml.encode(), None if opt is None else [opt]) for opt in CONFIGS}
+
+    # configurations are interleaved, so slow drift of machine affects all of them
+    times = {opt: [] for opt in CONFIGS}
+    expected = None
+    for _ in range(args.repeat):
+        for opt in CONFIGS:
+            start = time.process_time()
+            result = interpret.run(programs[opt])
+            times[opt].append(time.process_time() - start)
+            if expected is None:
+                expected = result
+            elif result != expected:
+                sys.exit('optimization %s changed result of program' % opt)
+
+    baseline = min(times[None])
+    for opt in CONFIGS:
+        best = min(times[opt])
+        print('%-10s %6d instructions %5d specialized %8.3f s %+7.1f %%'
+              % (opt or 'none', len(programs[opt].instructions), programs[opt].specialized, best,
+                 (best / baseline - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark of program loading: XML parsing and validation (ParseXML) and decoding of operands,
+reports parse throughput in instructions per second and peak traced memory
+
+Usage: python bench/bench_parse.py [--size N ...] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from programs import large_program
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import interpret  # noqa: E402
+
+
+def load(path):
+    interpret.Program.from_source(path, source_format='xml')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.size:
+        xml, _, _ = large_program(size)
+        with tempfile.NamedTemporaryFile('w', suffix='.xml', delete=False) as source:
+            source.write(xml)
+        try:
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                load(source.name)
+                best = min(best, time.perf_counter() - start)
+
+            tracemalloc.start()
+            load(source.name)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        finally:
+            os.unlink(source.name)
+        print('%8d instructions %8.1f KiB xml %8.3f s %10.0f instructions/s %10.1f KiB peak'
+              % (size, len(xml.encode()) / 1024, best, size / best, peak / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark of overhead of sampling profiler (--profile), call-heavy programs are run in process by
+InterpretWorker without profiler and with profiler at several sampling intervals, runs of all intervals
+are interleaved, reports best wall time, overhead and number of samples of the last run
+
+Usage: python bench/bench_profile.py [--interval SECONDS ...] [--repeat N]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from programs import BENCHMARKS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import interpret  # noqa: E402
+from profiler import SamplingProfiler  # noqa: E402
+
+PROGRAMS = (('fibonacci', 22), ('call_recursion', 50000), ('variable_loop', 200000))
+
+
+def run_once(program, profiler):
+    output = interpret.OutputBuffer(io.BytesIO())
+    worker = interpret.InterpretWorker(program, output, interpret.InputReader(io.BytesIO(b'')), profiler=profiler)
+    start = time.perf_counter()
+    worker.start_interpreter()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--interval', type=float, nargs='+', default=[0.01, 0.001, 0.0002])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('%-16s %10s %10s %10s %9s' % ('program', 'interval', 'time', 'overhead', 'samples'))
+    for name, size in PROGRAMS:
+        xml, _, _ = BENCHMARKS[name][0](size)
+        program = interpret.load_program(xml.encode())
+        run_once(program, None)
+        intervals = [None] + args.interval
+        best = dict.fromkeys(intervals, float('inf'))
+        samples = {}
+        for _ in range(args.repeat):
+            for interval in intervals:
+                profiler = SamplingProfiler(interval) if interval else None
+                best[interval] = min(best[interval], run_once(program, profiler))
+                samples[interval] = sum(profiler.samples.values()) if profiler else 0
+        base = best[None]
+        print('%-16s %10s %9.3fs %10s %9s' % (name, '-', base, '', ''))
+        for interval in args.interval:
+            print('%-16s %9gs %9.3fs %+9.1f%% %9d'
+                  % (name, interval, best[interval], (best[interval] / base - 1) * 100, samples[interval]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark of interpreter server, runs the same short program by plain interpret.py, by client.py process
+and by client.call in process (cost of server alone) and reports requests per second. Requests are run
+by --concurrency threads, output and exit code of every way must be the same as from interpret.py.
+
+Server is started by the benchmark on socket in temporary directory.
+
+Usage: python bench/bench_server.py [--requests N] [--concurrency N] [--workers N] [--program NAME --size N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from programs import BENCHMARKS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import client  # noqa: E402
+
+
+def run_process(command, socket_path):
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             env=dict(os.environ, **{client.SOCKET_ENV: socket_path}))
+    return process.stdout, process.returncode
+
+
+def run_call(args, socket_path, workdir):
+    """
+    Run request by client.call in process, output is written to temporary file
+    """
+    with tempfile.TemporaryFile(dir=workdir) as stdout, open(os.devnull, 'rb') as stdin:
+        code = client.call(args, socket_path, (stdin.fileno(), stdout.fileno(), sys.stderr.fileno()))
+        stdout.seek(0)
+        return stdout.read(), code
+
+
+def measure(function, requests, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: function(), range(requests)))
+    return time.perf_counter() - start, results
+
+
+def wait_for_server(socket_path, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit('server ended with %d' % server.returncode)
+        if os.path.exists(socket_path):
+            return
+        time.sleep(0.05)
+    sys.exit('server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--program', choices=sorted(BENCHMARKS), default='write_heavy')
+    parser.add_argument('--size', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        xml, text, steps = BENCHMARKS[args.program][0](args.size)
+        source = os.path.join(workdir, 'program.xml')
+        with open(source, 'w') as file:
+            file.write(xml)
+        interpret_args = ['--source', source, '--input', os.devnull]
+
+        socket_path = os.path.join(workdir, 'interpret.sock')
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py'), '--socket', socket_path,
+                                   '--workers', str(args.workers)])
+        try:
+            wait_for_server(socket_path, server)
+            ways = [
+                ('interpret.py', lambda: run_process([sys.executable, os.path.join(ROOT, 'interpret.py')]
+                                                     + interpret_args, socket_path)),
+                ('client.py', lambda: run_process([sys.executable, os.path.join(ROOT, 'client.py')]
+                                                  + interpret_args, socket_path)),
+                ('client.call', lambda: run_call(interpret_args, socket_path, workdir)),
+            ]
+            print('%s size %d (%d steps), %d requests, concurrency %d, %d workers'
+                  % (args.program, args.size, steps, args.requests, args.concurrency, args.workers))
+            print('%-14s %10s %12s %10s' % ('way', 'time', 'requests/s', 'speedup'))
+            expected = None
+            baseline = None
+            for name, function in ways:
+                elapsed, results = measure(function, args.requests, args.concurrency)
+                if expected is None:
+                    expected = results[0]
+                    baseline = elapsed
+                if any(result != expected for result in results):
+                    sys.exit('%s gives different output or exit code than interpret.py' % name)
+                print('%-14s %9.3fs %12.1f %9.1fx' % (name, elapsed, args.requests / elapsed, baseline / elapsed))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark of stack instructions, the same expression-heavy loop is run in version with temporary variables
+and in version with stack instructions (ADDS, MULS, JUMPIFNEQS ...). Programs are run in process by
+interpret.run with each engine and CPU time is measured, results of both versions must be equal
+
+Usage: python bench/bench_stack.py [--size N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+from programs import expression_stack, expression_vars
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import interpret  # noqa: E402
+
+VERSIONS = (('variables', expression_vars), ('stack', expression_stack))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    programs = {}
+    steps = {}
+    for name, generator in VERSIONS:
+        xml, _, steps[name] = generator(args.size)
+        programs[name] = interpret.load_program(xml.encode())
+
+    for engine in sorted(interpret.ENGINES):
+        # versions are interleaved, so slow drift of machine affects both of them
+        times = {name: [] for name, _ in VERSIONS}
+        expected = None
+        for _ in range(args.repeat):
+            for name, _ in VERSIONS:
+                start = time.process_time()
+                result = interpret.run(programs[name], engine=engine)
+                times[name].append(time.process_time() - start)
+                if expected is None:
+                    expected = result
+                elif result != expected:
+                    sys.exit('%s version gives different result' % name)
+
+        baseline = min(times['variables'])
+        for name, _ in VERSIONS:
+            best = min(times[name])
+            print('%-10s %-10s %9d instructions %8.3f s %12.0f instructions/s %+7.1f %%'
+                  % (engine, name, steps[name], best, steps[name] / best, (best / baseline - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmark of variable-heavy loop, run with one or more interpreters to compare them
+
+Usage: python bench/bench_variables.py [--size N] [--repeat N] [interpret.py ...]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from programs import variable_loop
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once(interpreter, source):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, interpreter, '--source', source, '--input', os.devnull],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(interpreter + ' failed with ' + str(result.returncode) + ': ' + result.stderr.decode()[-200:])
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('interpreters', nargs='*', default=[os.path.join(ROOT, 'interpret.py')])
+    args = parser.parse_args()
+
+    xml, _, steps = variable_loop(args.size)
+    with tempfile.NamedTemporaryFile('w', suffix='.xml', delete=False) as source:
+        source.write(xml)
+    try:
+        for interpreter in args.interpreters:
+            best = min(run_once(interpreter, source.name) for _ in range(args.repeat))
+            print('%-40s %8.3f s %12.0f instructions/s' % (interpreter, best, steps / best))
+    finally:
+        os.unlink(source.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""
+Generators of IPPcode23 XML programs used by benchmarks
+
+Each generator returns tuple (xml source, input text, number of executed instructions),
+programs are deterministic so the same size always gives the same program.
+"""
+from xml.sax.saxutils import escape
+
+
+def build_xml(instructions):
+    """
+    Build XML source from list of (opcode, [(arg type, arg text), ...])
+    :param instructions: list of instructions in program order
+    :return: XML source
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode23">']
+    for order, (opcode, args) in enumerate(instructions, 1):
+        lines.append('  <instruction order="%d" opcode="%s">' % (order, opcode))
+        for num, (arg_type, text) in enumerate(args, 1):
+            lines.append('    <arg%d type="%s">%s</arg%d>' % (num, arg_type, escape(text), num))
+        lines.append('  </instruction>')
+    lines.append('</program>')
+    return '\n'.join(lines) + '\n'
+
+
+def var(name):
+    return 'var', name
+
+
+def const(arg_type, text):
+    return arg_type, text
+
+
+def label(name):
+    return 'label', name
+
+
+def variable_loop(size):
+    """
+    Loop reading and writing several global and local variables in each iteration
+    :param size: number of iterations
+    """
+    program = [
+        ('DEFVAR', [var('GF@i')]),
+        ('DEFVAR', [var('GF@acc')]),
+        ('DEFVAR', [var('GF@tmp')]),
+        ('MOVE', [var('GF@i'), const('int', '0')]),
+        ('MOVE', [var('GF@acc'), const('int', '0')]),
+        ('CREATEFRAME', []),
+        ('PUSHFRAME', []),
+        ('DEFVAR', [var('LF@a')]),
+        ('DEFVAR', [var('LF@b')]),
+        ('MOVE', [var('LF@a'), const('int', '1')]),
+        ('MOVE', [var('LF@b'), const('int', '2')]),
+        ('LABEL', [label('loop')]),
+        ('ADD', [var('GF@tmp'), var('LF@a'), var('LF@b')]),
+        ('MOVE', [var('LF@a'), var('LF@b')]),
+        ('MOVE', [var('LF@b'), var('GF@tmp')]),
+        ('SUB', [var('LF@b'), var('LF@b'), var('LF@a')]),
+        ('ADD', [var('GF@acc'), var('GF@acc'), var('LF@b')]),
+        ('ADD', [var('GF@i'), var('GF@i'), const('int', '1')]),
+        ('JUMPIFNEQ', [label('loop'), var('GF@i'), const('int', str(size))]),
+        ('WRITE', [var('GF@acc')]),
+    ]
+    return build_xml(program), '', 12 + size * 8
+
+
+def large_program(size):
+    """
+    Long straight program with mixed instructions and operand types, used mainly for loading
+    :param size: number of instructions
+    """
+    program = [
+        ('DEFVAR', [var('GF@n')]),
+        ('DEFVAR', [var('GF@s')]),
+        ('MOVE', [var('GF@n'), const('int', '0')]),
+        ('MOVE', [var('GF@s'), const('string', '')]),
+    ]
+    body = [
+        ('ADD', [var('GF@n'), var('GF@n'), const('int', '1')]),
+        ('CONCAT', [var('GF@s'), const('string', 'a\\032b'), const('string', '<&>')]),
+        ('JUMPIFEQ', [label('skip%d'), var('GF@n'), const('nil', 'nil')]),
+        ('LABEL', [label('skip%d')]),
+    ]
+    while len(program) < size - 1:
+        opcode, args = body[len(program) % len(body)]
+        args = [(arg_type, text % len(program) if arg_type == 'label' else text) for arg_type, text in args]
+        if opcode == 'LABEL':
+            # label belongs to previous JUMPIFEQ
+            args = [('label', 'skip%d' % (len(program) - 1))]
+        program.append((opcode, args))
+    if program[-1][0] == 'JUMPIFEQ':
+        # there is no room for its label
+        program[-1] = body[0]
+    program.append(('WRITE', [var('GF@n')]))
+    steps = len(program)
+    return build_xml(program), '', steps
+
+
+def jumpif_loop(size):
+    """
+    Tight counting loop with conditional and unconditional jump in each iteration
+    :param size: number of iterations
+    """
+    program = [
+        ('DEFVAR', [var('GF@i')]),
+        ('MOVE', [var('GF@i'), const('int', '0')]),
+        ('LABEL', [label('loop')]),
+        ('ADD', [var('GF@i'), var('GF@i'), const('int', '1')]),
+        ('JUMPIFEQ', [label('end'), var('GF@i'), const('int', str(size))]),
+        ('JUMP', [label('loop')]),
+        ('LABEL', [label('end')]),
+        ('WRITE', [var('GF@i')]),
+    ]
+    return build_xml(program), '', 3 + size * 4
+
+
+def call_recursion(size):
+    """
+    Recursive function counting down, call stack grows to size calls
+    :param size: depth of recursion
+    """
+    program = [
+        ('DEFVAR', [var('GF@n')]),
+        ('MOVE', [var('GF@n'), const('int', str(size))]),
+        ('CALL', [label('rec')]),
+        ('WRITE', [var('GF@n')]),
+        ('JUMP', [label('end')]),
+        ('LABEL', [label('rec')]),
+        ('JUMPIFEQ', [label('ret'), var('GF@n'), const('int', '0')]),
+        ('SUB', [var('GF@n'), var('GF@n'), const('int', '1')]),
+        ('CALL', [label('rec')]),
+        ('LABEL', [label('ret')]),
+        ('RETURN', []),
+        ('LABEL', [label('end')]),
+    ]
+    return build_xml(program), '', 10 + size * 6
+
+
+def fibonacci(size):
+    """
+    Naive recursive Fibonacci, every call creates its own frame and passes argument and result on data stack
+    :param size: computed Fibonacci number
+    """
+    program = [
+        ('DEFVAR', [var('GF@r')]),
+        ('PUSHS', [const('int', str(size))]),
+        ('CALL', [label('fib')]),
+        ('POPS', [var('GF@r')]),
+        ('WRITE', [var('GF@r')]),
+        ('JUMP', [label('end')]),
+        ('LABEL', [label('fib')]),
+        ('CREATEFRAME', []),
+        ('PUSHFRAME', []),
+        ('DEFVAR', [var('LF@n')]),
+        ('POPS', [var('LF@n')]),
+        ('DEFVAR', [var('LF@a')]),
+        ('LT', [var('LF@a'), var('LF@n'), const('int', '2')]),
+        ('JUMPIFEQ', [label('base'), var('LF@a'), const('bool', 'true')]),
+        ('SUB', [var('LF@a'), var('LF@n'), const('int', '1')]),
+        ('PUSHS', [var('LF@a')]),
+        ('CALL', [label('fib')]),
+        ('POPS', [var('LF@a')]),
+        ('SUB', [var('LF@n'), var('LF@n'), const('int', '2')]),
+        ('PUSHS', [var('LF@n')]),
+        ('CALL', [label('fib')]),
+        ('POPS', [var('LF@n')]),
+        ('ADD', [var('LF@a'), var('LF@a'), var('LF@n')]),
+        ('PUSHS', [var('LF@a')]),
+        ('POPFRAME', []),
+        ('RETURN', []),
+        ('LABEL', [label('base')]),
+        ('PUSHS', [var('LF@n')]),
+        ('POPFRAME', []),
+        ('RETURN', []),
+        ('LABEL', [label('end')]),
+    ]
+    # calls with n < 2 run 12 instructions, other calls 20
+    leaves, inner = [1, 1], [0, 0]
+    for n in range(2, size + 1):
+        leaves.append(leaves[n - 1] + leaves[n - 2])
+        inner.append(inner[n - 1] + inner[n - 2] + 1)
+    return build_xml(program), '', 7 + 12 * leaves[size] + 20 * inner[size]
+
+
+def frame_churn(size):
+    """
+    Loop creating, pushing and popping frame with local variable in each iteration
+    :param size: number of iterations
+    """
+    program = [
+        ('DEFVAR', [var('GF@i')]),
+        ('MOVE', [var('GF@i'), const('int', '0')]),
+        ('LABEL', [label('loop')]),
+        ('CREATEFRAME', []),
+        ('DEFVAR', [var('TF@x')]),
+        ('MOVE', [var('TF@x'), var('GF@i')]),
+        ('PUSHFRAME', []),
+        ('ADD', [var('LF@x'), var('LF@x'), const('int', '1')]),
+        ('MOVE', [var('GF@i'), var('LF@x')]),
+        ('POPFRAME', []),
+        ('JUMPIFNEQ', [label('loop'), var('GF@i'), const('int', str(size))]),
+        ('WRITE', [var('GF@i')]),
+    ]
+    return build_xml(program), '', 3 + size * 9
+
+
+def string_building(size):
+    """
+    String grown by CONCAT and modified by SETCHAR in each iteration
+    :param size: number of iterations, final string has 2 * size characters
+    """
+    program = [
+        ('DEFVAR', [var('GF@s')]),
+        ('DEFVAR', [var('GF@i')]),
+        ('DEFVAR', [var('GF@len')]),
+        ('MOVE', [var('GF@s'), const('string', '')]),
+        ('MOVE', [var('GF@i'), const('int', '0')]),
+        ('LABEL', [label('loop')]),
+        ('CONCAT', [var('GF@s'), var('GF@s'), const('string', 'ab')]),
+        ('ADD', [var('GF@i'), var('GF@i'), const('int', '1')]),
+        ('STRLEN', [var('GF@len'), var('GF@s')]),
+        ('SUB', [var('GF@len'), var('GF@len'), const('int', '1')]),
+        ('SETCHAR', [var('GF@s'), var('GF@len'), const('string', 'c')]),
+        ('JUMPIFNEQ', [label('loop'), var('GF@i'), const('int', str(size))]),
+        ('STRLEN', [var('GF@len'), var('GF@s')]),
+        ('WRITE', [var('GF@len')]),
+    ]
+    return build_xml(program), '', 7 + size * 7
+
+
+def write_heavy(size):
+    """
+    Loop writing string with escape sequences and integer in each iteration
+    :param size: number of iterations, one output line per iteration
+    """
+    program = [
+        ('DEFVAR', [var('GF@i')]),
+        ('MOVE', [var('GF@i'), const('int', '0')]),
+        ('LABEL', [label('loop')]),
+        ('WRITE', [const('string', 'line\\032')]),
+        ('WRITE', [var('GF@i')]),
+        ('WRITE', [const('string', '\\010')]),
+        ('ADD', [var('GF@i'), var('GF@i'), const('int', '1')]),
+        ('JUMPIFNEQ', [label('loop'), var('GF@i'), const('int', str(size))]),
+    ]
+    return build_xml(program), '', 2 + size * 6
+
+
+def read_heavy(size):
+    """
+    Loop reading integer and string line in each iteration and summing integers
+    :param size: number of iterations, input has 2 * size lines
+    """
+    program = [
+        ('DEFVAR', [var('GF@i')]),
+        ('DEFVAR', [var('GF@x')]),
+        ('DEFVAR', [var('GF@sum')]),
+        ('MOVE', [var('GF@i'), const('int', '0')]),
+        ('MOVE', [var('GF@sum'), const('int', '0')]),
+        ('LABEL', [label('loop')]),
+        ('READ', [var('GF@x'), ('type', 'int')]),
+        ('ADD', [var('GF@sum'), var('GF@sum'), var('GF@x')]),
+        ('READ', [var('GF@x'), ('type', 'string')]),
+        ('ADD', [var('GF@i'), var('GF@i'), const('int', '1')]),
+        ('JUMPIFNEQ', [label('loop'), var('GF@i'), const('int', str(size))]),
+        ('WRITE', [var('GF@sum')]),
+    ]
+    text = ''.join('%d\nline %d\n' % (num, num) for num in range(size))
+    return build_xml(program), text, 6 + size * 6
+
+
+def optimizable_loop(size):
+    """
+    Loop with patterns of generated code handled by PeepholeOptimizer: DEFVAR followed by MOVE,
+    arithmetic on constants, chained CONCAT, comparison followed by conditional jump, label which
+    is never jumped to and unreachable code after JUMP
+    :param size: number of iterations
+    """
+    program = [
+        ('DEFVAR', [var('GF@i')]),
+        ('MOVE', [var('GF@i'), const('int', '0')]),
+        ('DEFVAR', [var('GF@cond')]),
+        ('DEFVAR', [var('GF@k')]),
+        ('DEFVAR', [var('GF@s')]),
+        ('LABEL', [label('loop')]),
+        ('CREATEFRAME', []),
+        ('DEFVAR', [var('TF@x')]),
+        ('MOVE', [var('TF@x'), const('int', '5')]),
+        ('DEFVAR', [var('TF@y')]),
+        ('MOVE', [var('TF@y'), const('string', 'ab')]),
+        ('PUSHFRAME', []),
+        ('LABEL', [label('if_body')]),
+        ('MUL', [var('GF@k'), const('int', '4'), const('int', '5')]),
+        ('ADD', [var('GF@k'), var('GF@k'), var('LF@x')]),
+        ('CONCAT', [var('GF@s'), var('LF@y'), const('string', 'c')]),
+        ('CONCAT', [var('GF@s'), var('GF@s'), const('string', 'd')]),
+        ('CONCAT', [var('GF@s'), var('GF@s'), var('LF@y')]),
+        ('POPFRAME', []),
+        ('ADD', [var('GF@i'), var('GF@i'), const('int', '1')]),
+        ('LT', [var('GF@cond'), var('GF@i'), const('int', str(size))]),
+        ('JUMPIFEQ', [label('loop'), var('GF@cond'), const('bool', 'true')]),
+        ('JUMP', [label('end')]),
+        ('WRITE', [const('string', 'unreachable')]),
+        ('ADD', [var('GF@k'), const('int', '1'), const('int', '2')]),
+        ('LABEL', [label('end')]),
+        ('WRITE', [var('GF@s')]),
+        ('WRITE', [var('GF@k')]),
+    ]
+    return build_xml(program), '', 9 + size * 17
+
+
+def expression_vars(size):
+    """
+    Loop evaluating acc += ((i * 3 - 1) * (i + 2)) / 4 with temporary variables, same result as expression_stack
+    :param size: number of iterations
+    """
+    program = [
+        ('DEFVAR', [var('GF@i')]),
+        ('DEFVAR', [var('GF@acc')]),
+        ('DEFVAR', [var('GF@t1')]),
+        ('DEFVAR', [var('GF@t2')]),
+        ('MOVE', [var('GF@i'), const('int', '0')]),
+        ('MOVE', [var('GF@acc'), const('int', '0')]),
+        ('LABEL', [label('loop')]),
+        ('MUL', [var('GF@t1'), var('GF@i'), const('int', '3')]),
+        ('SUB', [var('GF@t1'), var('GF@t1'), const('int', '1')]),
+        ('ADD', [var('GF@t2'), var('GF@i'), const('int', '2')]),
+        ('MUL', [var('GF@t1'), var('GF@t1'), var('GF@t2')]),
+        ('IDIV', [var('GF@t1'), var('GF@t1'), const('int', '4')]),
+        ('ADD', [var('GF@acc'), var('GF@acc'), var('GF@t1')]),
+        ('ADD', [var('GF@i'), var('GF@i'), const('int', '1')]),
+        ('JUMPIFNEQ', [label('loop'), var('GF@i'), const('int', str(size))]),
+        ('WRITE', [var('GF@acc')]),
+    ]
+    return build_xml(program), '', 7 + size * 9
+
+
+def expression_stack(size):
+    """
+    Loop evaluating acc += ((i * 3 - 1) * (i + 2)) / 4 on data stack with stack instructions
+    :param size: number of iterations
+    """
+    program = [
+        ('DEFVAR', [var('GF@i')]),
+        ('DEFVAR', [var('GF@acc')]),
+        ('MOVE', [var('GF@i'), const('int', '0')]),
+        ('MOVE', [var('GF@acc'), const('int', '0')]),
+        ('LABEL', [label('loop')]),
+        ('PUSHS', [var('GF@acc')]),
+        ('PUSHS', [var('GF@i')]),
+        ('PUSHS', [const('int', '3')]),
+        ('MULS', []),
+        ('PUSHS', [const('int', '1')]),
+        ('SUBS', []),
+        ('PUSHS', [var('GF@i')]),
+        ('PUSHS', [const('int', '2')]),
+        ('ADDS', []),
+        ('MULS', []),
+        ('PUSHS', [const('int', '4')]),
+        ('IDIVS', []),
+        ('ADDS', []),
+        ('POPS', [var('GF@acc')]),
+        ('PUSHS', [var('GF@i')]),
+        ('PUSHS', [const('int', '1')]),
+        ('ADDS', []),
+        ('POPS', [var('GF@i')]),
+        ('PUSHS', [var('GF@i')]),
+        ('PUSHS', [const('int', str(size))]),
+        ('JUMPIFNEQS', [label('loop')]),
+        ('WRITE', [var('GF@acc')]),
+    ]
+    return build_xml(program), '', 5 + size * 22
+
+
+# name: (generator, sizes used by suite)
+BENCHMARKS = {
+    'jumpif_loop': (jumpif_loop, (1000, 10000, 100000)),
+    'call_recursion': (call_recursion, (1000, 10000, 50000)),
+    'fibonacci': (fibonacci, (10, 15, 20)),
+    'frame_churn': (frame_churn, (1000, 10000, 50000)),
+    'string_building': (string_building, (1000, 5000, 20000)),
+    'write_heavy': (write_heavy, (1000, 10000, 50000)),
+    'read_heavy': (read_heavy, (1000, 10000, 50000)),
+    'large_program': (large_program, (1000, 10000, 50000)),
+    'variable_loop': (variable_loop, (1000, 10000, 50000)),
+    'optimizable_loop': (optimizable_loop, (1000, 10000, 50000)),
+    'expression_vars': (expression_vars, (1000, 10000, 50000)),
+    'expression_stack': (expression_stack, (1000, 10000, 50000)),
+}
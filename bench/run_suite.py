@@ -0,0 +1,204 @@
+"""
+Benchmark suite of generated programs, each stressing one hot path of the interpreter at several sizes.
+Reports wall time, instructions per second, parse time, peak RSS and startup time, writes results
+as JSON and compares them with stored baseline
+
+Usage: python bench/run_suite.py [--quick] [--only NAME ...] [--repeat N] [--interpreter interpret.py]
+                                 [--json results.json] [--baseline bench/baseline.json] [--save-baseline]
+
+Instructions per second are computed from whole wall time including startup, so they are meaningful
+mainly for the larger sizes, parse time is measured in process
+(ParseXML and decoding of operands) and peak RSS is maximal resident size of interpreter process
+(VmHWM read at exit, because ru_maxrss of child includes size of runner at fork on Linux).
+Exit code is 1 when some benchmark is slower than baseline by more than --threshold.
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from programs import BENCHMARKS, build_xml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'bench', 'baseline.json')
+
+# runs interpreter as __main__ and writes its peak RSS in KiB to file given as first argument
+LAUNCHER = '''
+import atexit, os, runpy, sys
+
+def report(path=sys.argv[1]):
+    try:
+        with open('/proc/self/status') as status, open(path, 'w') as out:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    out.write(line.split()[1])
+    except OSError:
+        pass
+
+atexit.register(report)
+sys.argv = sys.argv[2:]
+sys.path[0] = os.path.dirname(sys.argv[0])
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+
+def import_interpreter(path):
+    spec = importlib.util.spec_from_file_location('bench_interpret', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_process(interpreter, source, input_path):
+    """
+    Run interpreter once
+    :return: (wall time in seconds, peak RSS in KiB)
+    """
+    rss_path = source + '.rss'
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', LAUNCHER, rss_path, interpreter,
+                                '--source', source, '--input', input_path],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = process.stderr.read()
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.stderr.close()
+    code = os.waitstatus_to_exitcode(status)
+    # prevent Popen from waiting for already reaped process
+    process.returncode = code
+    if code != 0:
+        sys.exit('%s failed on %s with %d: %s' % (interpreter, source, code, stderr.decode()[-200:]))
+    try:
+        with open(rss_path) as file:
+            return elapsed, int(file.read())
+    except (OSError, ValueError):
+        return elapsed, usage.ru_maxrss
+
+
+def parse_time(module, xml, repeat):
+    """
+    Best time of loading program in process, XML parsing and decoding of operands
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        module.Program.from_source(io.BytesIO(xml), source_format='xml')
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure_startup(interpreter, workdir, repeat):
+    source = os.path.join(workdir, 'empty.xml')
+    with open(source, 'w') as file:
+        file.write(build_xml([]))
+    return min(run_process(interpreter, source, os.devnull)[0] for _ in range(repeat))
+
+
+def run_benchmark(interpreter, module, name, size, workdir, repeat):
+    generator = BENCHMARKS[name][0]
+    xml, text, steps = generator(size)
+    xml = xml.encode()
+    source = os.path.join(workdir, '%s-%d.xml' % (name, size))
+    input_path = os.path.join(workdir, '%s-%d.in' % (name, size))
+    with open(source, 'wb') as file:
+        file.write(xml)
+    with open(input_path, 'w') as file:
+        file.write(text)
+
+    runs = [run_process(interpreter, source, input_path) for _ in range(repeat)]
+    wall = min(elapsed for elapsed, _ in runs)
+    return {
+        'name': name,
+        'size': size,
+        'instructions': steps,
+        'time': wall,
+        'instructions_per_second': steps / wall,
+        'parse_time': parse_time(module, xml, repeat),
+        'peak_rss_kib': max(rss for _, rss in runs),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print change of time against baseline
+    :return: number of regressions
+    """
+    previous = {(result['name'], result['size']): result for result in baseline['results']}
+    regressions = 0
+    print()
+    print('%-18s %8s %10s %10s %8s' % ('benchmark', 'size', 'baseline', 'now', 'change'))
+    for result in results['results']:
+        old = previous.get((result['name'], result['size']))
+        if old is None:
+            continue
+        change = result['time'] / old['time'] - 1
+        flag = ''
+        if change > threshold:
+            flag = ' REGRESSION'
+            regressions += 1
+        print('%-18s %8d %9.3fs %9.3fs %+7.1f%%%s'
+              % (result['name'], result['size'], old['time'], result['time'], change * 100, flag))
+    print('startup %.3f s -> %.3f s' % (baseline['startup'], results['startup']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--interpreter', default=os.path.join(ROOT, 'interpret.py'))
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='run only these benchmarks')
+    parser.add_argument('--quick', action='store_true', help='run only the two smaller sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store results as new baseline')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown against baseline')
+    args = parser.parse_args()
+
+    interpreter = os.path.abspath(args.interpreter)
+    module = import_interpreter(interpreter)
+    results = {
+        'interpreter': os.path.relpath(interpreter, ROOT),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'results': [],
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results['startup'] = measure_startup(interpreter, workdir, args.repeat)
+        print('startup %.3f s' % results['startup'])
+        print('%-18s %8s %10s %9s %14s %10s %10s'
+              % ('benchmark', 'size', 'steps', 'time', 'instructions/s', 'parse', 'peak RSS'))
+        for name in args.only or BENCHMARKS:
+            sizes = BENCHMARKS[name][1]
+            for size in sizes[:2] if args.quick else sizes:
+                result = run_benchmark(interpreter, module, name, size, workdir, args.repeat)
+                results['results'].append(result)
+                print('%-18s %8d %10d %8.3fs %14.0f %9.4fs %7.1f MiB'
+                      % (name, size, result['instructions'], result['time'], result['instructions_per_second'],
+                         result['parse_time'], result['peak_rss_kib'] / 1024))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
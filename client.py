@@ -0,0 +1,96 @@
+"""
+Thin client of interpreter server (server.py), takes the same arguments as interpret.py and gives the same
+stdout, stderr and exit code. Only standard descriptors, working directory and arguments are sent to server,
+interpret module is not imported, so run of client costs only Python startup and one connection.
+When server is not running, interpret.py is executed directly.
+
+Socket path is taken from $INTERPRET_SOCKET, default /tmp/interpret-UID.sock
+
+Usage: python client.py [interpret.py arguments]
+"""
+import os
+import signal
+import socket
+import struct
+import sys
+
+DEFAULT_SOCKET = '/tmp/interpret-%d.sock' % os.getuid()
+SOCKET_ENV = 'INTERPRET_SOCKET'
+HEADER = struct.Struct('!i')
+RC_SERVER_ERROR = 1     # exit code when server ends without sending exit code
+
+
+class ServerUnavailable(Exception):
+    pass
+
+
+def socket_path(path=None):
+    return path or os.environ.get(SOCKET_ENV) or DEFAULT_SOCKET
+
+
+def _receive_int(connection):
+    data = b''
+    while len(data) < HEADER.size:
+        chunk = connection.recv(HEADER.size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return HEADER.unpack(data)[0]
+
+
+def call(args, path=None, fds=(0, 1, 2), cwd=None):
+    """
+    Run interpret.py with arguments in server
+    :param args: list of arguments of interpret.py
+    :param path: socket path or None for default
+    :param fds: descriptors used as stdin, stdout and stderr of run
+    :param cwd: working directory of run, default current directory
+    :return: exit code
+    :raises ServerUnavailable: when server does not accept connection
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            connection.connect(socket_path(path))
+        except OSError as e:
+            raise ServerUnavailable(str(e))
+        payload = '\0'.join([cwd or os.getcwd()] + list(args)).encode('utf-8', 'surrogateescape')
+        socket.send_fds(connection, [HEADER.pack(len(payload)) + payload], list(fds))
+        pid = _receive_int(connection)
+        if pid is None:
+            return RC_SERVER_ERROR
+
+        def forward(signum, frame):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+        previous = {}
+        try:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous[signum] = signal.signal(signum, forward)
+        except ValueError:
+            # not main thread, signals are not forwarded
+            pass
+        try:
+            code = _receive_int(connection)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        return RC_SERVER_ERROR if code is None else code
+    finally:
+        connection.close()
+
+
+def main():
+    try:
+        code = call(sys.argv[1:])
+    except ServerUnavailable:
+        interpreter = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interpret.py')
+        os.execv(sys.executable, [sys.executable, interpreter] + sys.argv[1:])
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
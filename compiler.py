@@ -0,0 +1,370 @@
+"""
+Compiled engine of interpret.py (--engine=compiled), basic blocks of program are compiled to Python functions.
+Imported only when the engine is selected, so runs by reference engine do not pay for compiling and loading it
+"""
+import threading
+
+from interpret import (FALSE, ORDERED_TYPES, SYMB_TYPES, TRUE, TYPE_BOOL, TYPE_INT, TYPE_NIL, TYPE_STRING,
+                       UNINITIALIZED, ConstOperand, InterpretWorker, LabelOperand, StringBuffer, Value, VarOperand)
+
+
+class BlockCompiler:
+    """
+    Backend of --engine=compiled, program is split to basic blocks which start at any instruction
+    (usually LABEL or instruction after jump) and end before LABEL, after jump, CALL, RETURN or EXIT
+    or after MAX_BLOCK instructions. Each block is compiled on its first run by compile() of generated
+    Python function, which returns index of next block.
+
+    Instructions with operands in global frame and constants are generated inline with guards
+    for types and defined variables, when guard fails or instruction is not supported, the reference
+    handler of InterpretWorker is called, so errors and their codes are the same as in reference engine.
+    Block which cannot be compiled at all is run by reference handlers.
+    """
+    MAX_BLOCK = 100
+    TERMINATORS = ('JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS', 'CALL', 'RETURN', 'EXIT',
+                   'EQ_JUMP', 'LT_JUMP', 'GT_JUMP')
+
+    def __init__(self, program):
+        """
+        :param program: Program, its instructions and handlers are only read
+        """
+        self.instructions = program.instructions
+        self.label_index = program.label_index
+        self.blocks = [None] * len(self.instructions)   # compiled function for each started block
+        self._lock = threading.Lock()                   # guards insert to blocks
+
+    def block(self, start):
+        """
+        Compiled block starting at instruction index, compiled on first use
+        :param start: index of first instruction
+        :return: function(worker) -> index of next instruction
+        """
+        block = self.blocks[start]
+        if block is None:
+            end = start + 1
+            while (end < len(self.instructions) and end - start < self.MAX_BLOCK
+                   and self.instructions[end - 1].opcode not in self.TERMINATORS
+                   and self.instructions[end].opcode != 'LABEL'):
+                end += 1
+            try:
+                block = self.compile(start, end)
+            except (SyntaxError, ValueError, RecursionError, MemoryError):
+                block = self.reference_block(start, end)
+            with self._lock:
+                # other worker could compile the same block meanwhile, all runs use the first one
+                if self.blocks[start] is None:
+                    self.blocks[start] = block
+                block = self.blocks[start]
+        return block
+
+    def reference_block(self, start, end):
+        """
+        Fallback for block which cannot be compiled, instructions are run by their handlers
+        """
+        instructions = self.instructions[start:end]
+
+        def run(worker):
+            for index, instruction in enumerate(instructions, start + 1):
+                worker._order_count = instruction.order
+                worker._pc = index
+                instruction.handler(worker, instruction)
+            return worker._pc
+        return run
+
+    def compile(self, start, end):
+        """
+        Generate and compile Python function for instructions start..end-1, generated source and namespace
+        belong only to this call, so blocks can be compiled by more workers at once
+        :return: function(worker) -> index of next instruction
+        """
+        generator = BlockGenerator(self.instructions, self.label_index)
+        code = compile(generator.generate(start, end), '<block %d>' % start, 'exec')
+        namespace = generator.namespace
+        exec(code, namespace)
+        return namespace['block']
+
+
+class BlockGenerator:
+    """
+    Source of one compiled block for BlockCompiler, new instance is used for every block, so its state
+    (namespace of constants and handlers, generated lines, index of current instruction) is never shared
+    """
+
+    def __init__(self, instructions, label_index):
+        """
+        :param instructions: instructions of Program, only read
+        :param label_index: label name -> index of label in instructions
+        """
+        self.instructions = instructions
+        self.label_index = label_index
+        self.namespace = {'Value': Value, 'StringBuffer': StringBuffer, 'TRUE': TRUE, 'FALSE': FALSE,
+                          'UNINITIALIZED': UNINITIALIZED}
+        self.lines = ['def block(w):', '    GF = w._GF']
+        self.index = 0
+
+    def generate(self, start, end):
+        """
+        :return: source of function block(w) for instructions start..end-1
+        """
+        for index in range(start, end):
+            instruction = self.instructions[index]
+            self.index = index
+            self.lines.append('    # %d %s' % (instruction.order, instruction.opcode))
+            generator = getattr(self, '_emit_' + instruction.opcode.lower(), None)
+            if generator is None or not generator(instruction):
+                self._fallback(instruction)
+        if self.instructions[end - 1].opcode in BlockCompiler.TERMINATORS:
+            self.lines.append('    return w._pc')
+        else:
+            self.lines.append('    return %d' % end)
+        return '\n'.join(self.lines)
+
+    def _name(self, prefix, value):
+        name = '%s%d_%d' % (prefix, self.index, len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def _fallback(self, instruction, indent='    '):
+        handler = self._name('h', instruction.handler)
+        args = self._name('i', instruction)
+        self.lines.append('%sw._pc = %d; w._order_count = %d; %s(w, %s)'
+                          % (indent, self.index + 1, instruction.order, handler, args))
+
+    def _var(self, operand):
+        """
+        :return: expression of global frame slot or None for other frames
+        """
+        if type(operand) is VarOperand and operand.frame == 'GF':
+            return 'GF[%d]' % operand.slot
+        return None
+
+    def _symb(self, operand, name):
+        """
+        Load symbol operand to local variable
+        :return: (name, tag known at compile time or None) or None when operand is not supported
+        """
+        if type(operand) is ConstOperand:
+            self.lines.append('    %s = %s' % (name, self._name('k', operand.value)))
+            return name, operand.value.tag
+        slot = self._var(operand)
+        if slot is None:
+            return None
+        self.lines.append('    %s = %s' % (name, slot))
+        return name, None
+
+    @staticmethod
+    def _has_tag(symb, tags):
+        """
+        :return: guard expression, None when constant has other type
+        """
+        name, tag = symb
+        if tag is not None:
+            return 'True' if tag in tags else None
+        if len(tags) == 1:
+            return '%s.__class__ is Value and %s.tag == %d' % (name, name, tags[0])
+        return '%s.__class__ is Value' % name
+
+    def _guarded(self, instruction, guards, statements, target=None):
+        """
+        Append statements run when all guards hold, otherwise reference handler reports error
+        :param target: expression of target slot which must be defined variable
+        :return: False when instruction cannot be generated
+        """
+        if None in guards:
+            return False
+        if target is not None:
+            guards = guards + ['%s is not None' % target]
+        self.lines.append('    if %s:' % ' and '.join(guards))
+        self.lines.extend('        ' + statement for statement in statements)
+        self.lines.append('    else:')
+        self._fallback(instruction, '        ')
+        return True
+
+    def _operands(self, instruction, tags):
+        """
+        Target slot and loaded symbols of instruction var symb symb
+        :return: (target, symbols, guards) or None when operands are not supported
+        """
+        target = self._var(instruction.args[0])
+        symbs = [self._symb(operand, name) for operand, name in zip(instruction.args[1:], 'ab')]
+        if target is None or None in symbs:
+            return None
+        return target, symbs, [self._has_tag(symb, tags) for symb in symbs]
+
+    def _emit_label(self, instruction):
+        return True
+
+    def _emit_defvar(self, instruction):
+        target = self._var(instruction.args[0])
+        if target is None:
+            return False
+        self.lines.append('    if %s is None:' % target)
+        self.lines.append('        %s = UNINITIALIZED' % target)
+        self.lines.append('    else:')
+        self._fallback(instruction, '        ')
+        return True
+
+    def _emit_move(self, instruction):
+        target = self._var(instruction.args[0])
+        symb = self._symb(instruction.args[1], 'a')
+        if target is None or symb is None:
+            return False
+        # StringBuffer belongs to one variable, it is copied by reference handler
+        return self._guarded(instruction, [self._has_tag(symb, SYMB_TYPES)], ['%s = a' % target], target)
+
+    def _arithmetic(self, instruction, statements):
+        operands = self._operands(instruction, (TYPE_INT,))
+        if operands is None:
+            return False
+        target, symbs, guards = operands
+        return self._guarded(instruction, guards, statements(target), target)
+
+    def _emit_add(self, instruction):
+        return self._arithmetic(instruction, lambda target: ['%s = Value(%d, a.data + b.data)' % (target, TYPE_INT)])
+
+    def _emit_sub(self, instruction):
+        return self._arithmetic(instruction, lambda target: ['%s = Value(%d, a.data - b.data)' % (target, TYPE_INT)])
+
+    def _emit_mul(self, instruction):
+        return self._arithmetic(instruction, lambda target: ['%s = Value(%d, a.data * b.data)' % (target, TYPE_INT)])
+
+    def _emit_idiv(self, instruction):
+        operands = self._operands(instruction, (TYPE_INT,))
+        if operands is None:
+            return False
+        target, symbs, guards = operands
+        return self._guarded(instruction, guards + ['b.data != 0'],
+                             ['%s = Value(%d, int(a.data / b.data))' % (target, TYPE_INT)], target)
+
+    def _compare(self, instruction, operator):
+        operands = self._operands(instruction, ORDERED_TYPES)
+        if operands is None:
+            return False
+        target, symbs, guards = operands
+        return self._guarded(instruction, guards + ['a.tag == b.tag', 'a.tag != %d' % TYPE_NIL],
+                             ['%s = TRUE if a.data %s b.data else FALSE' % (target, operator)], target)
+
+    def _emit_lt(self, instruction):
+        return self._compare(instruction, '<')
+
+    def _emit_gt(self, instruction):
+        return self._compare(instruction, '>')
+
+    @staticmethod
+    def _equals_guard():
+        return 'a.tag == b.tag or a.tag == %d or b.tag == %d' % (TYPE_NIL, TYPE_NIL)
+
+    def _emit_eq(self, instruction):
+        operands = self._operands(instruction, SYMB_TYPES)
+        if operands is None:
+            return False
+        target, symbs, guards = operands
+        return self._guarded(instruction, guards + ['(%s)' % self._equals_guard()],
+                             ['%s = TRUE if a.tag == b.tag and a.data == b.data else FALSE' % target], target)
+
+    def _logic(self, instruction, operator):
+        operands = self._operands(instruction, (TYPE_BOOL,))
+        if operands is None:
+            return False
+        target, symbs, guards = operands
+        return self._guarded(instruction, guards,
+                             ['%s = TRUE if a.data %s b.data else FALSE' % (target, operator)], target)
+
+    def _emit_and(self, instruction):
+        return self._logic(instruction, 'and')
+
+    def _emit_or(self, instruction):
+        return self._logic(instruction, 'or')
+
+    def _emit_not(self, instruction):
+        operands = self._operands(instruction, (TYPE_BOOL,))
+        if operands is None:
+            return False
+        target, symbs, guards = operands
+        return self._guarded(instruction, guards, ['%s = FALSE if a.data else TRUE' % target], target)
+
+    def _emit_concat(self, instruction):
+        operands = self._operands(instruction, (TYPE_STRING,))
+        if operands is None:
+            return False
+        target, symbs, guards = operands
+        if InterpretWorker._same_var(instruction.args[0], instruction.args[1]):
+            # appending to variable itself keeps its StringBuffer
+            guards[0] = 'a.__class__ is StringBuffer or ' + guards[0]
+            return self._guarded(instruction, ['(%s)' % guards[0], guards[1]],
+                                 ['%s = w._append(a, b.data)' % target], target)
+        return self._guarded(instruction, guards, ['%s = Value(%d, a.data + b.data)' % (target, TYPE_STRING)], target)
+
+    def _emit_strlen(self, instruction):
+        operands = self._operands(instruction, (TYPE_STRING,))
+        if operands is None:
+            return False
+        target, symbs, guards = operands
+        return self._guarded(instruction, guards, ['%s = Value(%d, len(a.data))' % (target, TYPE_INT)], target)
+
+    def _string_index(self, instruction, result):
+        target = self._var(instruction.args[0])
+        symbs = [self._symb(operand, name) for operand, name in zip(instruction.args[1:], 'ab')]
+        if target is None or None in symbs:
+            return False
+        guards = [self._has_tag(symbs[0], (TYPE_STRING,)), self._has_tag(symbs[1], (TYPE_INT,)),
+                  '0 <= b.data < len(a.data)']
+        return self._guarded(instruction, guards, ['%s = %s' % (target, result)], target)
+
+    def _emit_getchar(self, instruction):
+        return self._string_index(instruction, 'Value(%d, a.data[b.data])' % TYPE_STRING)
+
+    def _emit_stri2int(self, instruction):
+        return self._string_index(instruction, 'Value(%d, ord(a.data[b.data]))' % TYPE_INT)
+
+    def _emit_jump(self, instruction):
+        label = instruction.args[0]
+        if type(label) is not LabelOperand or label.name not in self.label_index:
+            return False
+        self.lines.append('    w._pc = %d' % self.label_index[label.name])
+        return True
+
+    def _conditional_jump(self, instruction, jump_when):
+        label, symb1, symb2 = instruction.args
+        symbs = [self._symb(symb1, 'a'), self._symb(symb2, 'b')]
+        if type(label) is not LabelOperand or label.name not in self.label_index or None in symbs:
+            return False
+        guards = [self._has_tag(symb, SYMB_TYPES) for symb in symbs] + ['(%s)' % self._equals_guard()]
+        targets = (self.label_index[label.name], self.index + 1)
+        return self._guarded(instruction, guards, [
+            'w._pc = %d if a.tag == b.tag and a.data == b.data else %d' % (targets if jump_when else targets[::-1])])
+
+    def _emit_jumpifeq(self, instruction):
+        return self._conditional_jump(instruction, True)
+
+    def _emit_jumpifneq(self, instruction):
+        return self._conditional_jump(instruction, False)
+
+
+class CompiledWorker(InterpretWorker):
+    """
+    InterpretWorker which runs blocks compiled by BlockCompiler of its program, --engine=compiled
+    """
+
+    def __init__(self, program, output, input_reader, stats=None, max_call_depth=InterpretWorker.MAX_CALL_DEPTH,
+                 limits=None, profiler=None):
+        super().__init__(program, output, input_reader, stats, max_call_depth, limits, profiler)
+        self._compiler = program.block_compiler()
+
+    def start_interpreter(self):
+        """
+        Run compiled blocks, statistics and limits check every instruction and profiler needs order of current
+        instruction, so with them reference loop is used
+        :return:
+        """
+        if self._stats is not None or self._limits is not None or self._profiler is not None:
+            return super().start_interpreter()
+        compiler = self._compiler
+        program_len = len(self._program)
+        blocks = compiler.blocks
+
+        self._pc = 0
+        pc = 0
+        while pc < program_len:
+            pc = (blocks[pc] or compiler.block(pc))(self)
+        self._output.flush()
@@ -4,6 +4,9 @@
 • 10 - chybějící parametr skriptu (je-li třeba) nebo použití zakázané kombinace parametrů;
 • 11 - chyba při otevírání vstupních souborů (např. neexistence, nedostatečné oprávnění);
 • 12 - chyba při otevření výstupních souborů pro zápis (např. nedostatečné oprávnění, chyba při zápisu);
+• 21 - chybná nebo chybějící hlavička ve zdrojovém kódu IPPcode23 (jen --source-format=ippcode);
+• 22 - neznámý nebo chybný operační kód ve zdrojovém kódu IPPcode23 (jen --source-format=ippcode);
+• 23 - jiná lexikální nebo syntaktická chyba zdrojového kódu IPPcode23 (jen --source-format=ippcode);
 • 31 - chybný XML formát ve vstupním souboru (soubor není tzv. dobře formátovaný, angl. well-formed, viz [1]);
 • 32 - neočekávaná struktura XML (např. element pro argument mimo element pro instrukci, instrukce s duplicitním pořadím nebo záporným pořadím);
 • 52 - chyba při sémantických kontrolách vstupního kódu v IPPcode23 (např. použití nedefinovaného návěští, redefinice proměnné);
@@ -13,23 +16,38 @@
 • 56 - běhová chyba interpretace – chybějící hodnota (v proměnné, na datovém zásobníku nebo v zásobníku volání);
 • 57 - běhová chyba interpretace – špatná hodnota operandu (např. dělení nulou, špatná návra tová hodnota instrukce EXIT);
 • 58 - běhová chyba interpretace – chybná práce s řetězcem.
+• 59 - překročena maximální hloubka volání (--max-call-depth);
+• 60 - překročen limit běhu (--max-steps, --max-time, --max-memory).
 """
+import functools
+import io
+import marshal
+import mmap
+import os
 import sys
+import time
 import xml.etree.ElementTree as XML
 import argparse
 import re
 
+# part of ProgramCache key, must change with every change of validation or of stored program form
+__version__ = '2.1'
+
 INSTRUCTIONS = ['CREATEFRAME', 'PUSHFRAME', 'POPFRAME', 'RETURN', 'BREAK', 'DEFVAR', 'CALL', 'PUSHS', 'POPS', 'WRITE',
                 'LABEL', 'JUMP', 'EXIT', 'DPRINT', 'READ', 'STRLEN', 'TYPE', 'MOVE', 'NOT', 'INT2CHAR', 'ADD', 'SUB',
                 'MUL', 'IDIV', 'LT', 'GT', 'EQ', 'AND', 'OR', 'STRI2INT', 'CONCAT', 'GETCHAR', 'SETCHAR', 'JUMPIFEQ',
-                'JUMPIFNEQ']
-NO_OP_INSTRUCTIONS = ['CREATEFRAME', 'PUSHFRAME', 'POPFRAME', 'RETURN', 'BREAK']
-ONE_OP_INSTRUCTIONS = ['DEFVAR', 'CALL', 'PUSHS', 'POPS', 'WRITE', 'LABEL', 'JUMP', 'EXIT', 'DPRINT']
-TWO_OP_INSTRUCTIONS = ['READ', 'STRLEN', 'TYPE', 'MOVE', 'NOT', 'INT2CHAR']
-THREE_OP_INSTRUCTIONS = ['ADD', 'SUB', 'MUL', 'IDIV', 'LT', 'GT', 'EQ', 'AND', 'OR', 'STRI2INT', 'CONCAT', 'GETCHAR',
-                         'SETCHAR', 'JUMPIFEQ', 'JUMPIFNEQ']
+                'JUMPIFNEQ', 'CLEARS', 'ADDS', 'SUBS', 'MULS', 'IDIVS', 'LTS', 'GTS', 'EQS', 'ANDS', 'ORS', 'NOTS',
+                'INT2CHARS', 'STRI2INTS', 'JUMPIFEQS', 'JUMPIFNEQS']
+
+# Type tags of Value
+TYPE_NIL = 0
+TYPE_INT = 1
+TYPE_BOOL = 2
+TYPE_STRING = 3
+TYPE_NAMES = ('nil', 'int', 'bool', 'string')
 
-INT_INSTRUCTIONS = ['ADD', 'SUB', 'MUL', 'IDIV']
+SYMB_TYPES = (TYPE_NIL, TYPE_INT, TYPE_BOOL, TYPE_STRING)
+ORDERED_TYPES = (TYPE_INT, TYPE_BOOL, TYPE_STRING)
 
 
 class ErrorHandler:
@@ -38,11 +56,15 @@ class ErrorHandler:
 
     Methods
     -------
-    Class containts one static method for print message and exit with error code
+    raise_error raises exception of type given by error code, it is used by parser and interpreter,
+    exit_with_message prints message and exits with error code, it is used only by command line interface
     """
     RUN_ERR_MISSING_PARAM = 10
     RUN_ERR_INFILE_OPEN = 11
     RUN_ERR_OUTFILE_OPEN = 12
+    ERROR_SOURCE_HEADER = 21
+    ERROR_SOURCE_OPCODE = 22
+    ERROR_SOURCE_SYNTAX = 23
     ERROR_WRONG_XML_INPUT_FORMAT = 31
     ERROR_UNEXPECTED_XML_STRUCT = 32
     ERROR_SEMANTIC_XML_INPUT = 52
@@ -52,6 +74,8 @@ class ErrorHandler:
     ERROR_MISSING_VALUE = 56
     ERROR_WRONG_OP_VALUE = 57
     ERROR_WRONG_STRING_OPERATION = 58
+    ERROR_RESOURCE_LIMIT = 59
+    ERROR_BUDGET_EXCEEDED = 60
     GENERAL_ERR = 99
 
     @staticmethod
@@ -59,10 +83,106 @@ class ErrorHandler:
         print(msg, file=sys.stderr)
         sys.exit(err_code)
 
+    @staticmethod
+    def raise_error(msg, err_code):
+        raise ERROR_TYPES.get(err_code, InterpretError)(str(msg), err_code)
+
+
+class InterpretError(Exception):
+    """
+    Error of parsed or interpreted program with exit code, base class of all typed errors
+    """
+    code = ErrorHandler.GENERAL_ERR
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        if code is not None:
+            self.code = code
+
+
+class SourceHeaderError(InterpretError):
+    code = ErrorHandler.ERROR_SOURCE_HEADER
+
+
+class SourceOpcodeError(InterpretError):
+    code = ErrorHandler.ERROR_SOURCE_OPCODE
+
+
+class SourceSyntaxError(InterpretError):
+    code = ErrorHandler.ERROR_SOURCE_SYNTAX
+
+
+class XMLFormatError(InterpretError):
+    code = ErrorHandler.ERROR_WRONG_XML_INPUT_FORMAT
+
+
+class XMLStructureError(InterpretError):
+    code = ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT
+
+
+class SemanticError(InterpretError):
+    code = ErrorHandler.ERROR_SEMANTIC_XML_INPUT
+
+
+class OperandTypeError(InterpretError):
+    code = ErrorHandler.ERROR_INVALID_OP
+
+
+class VariableError(InterpretError):
+    code = ErrorHandler.ERROR_VAR_NOT_EXIST
+
+
+class FrameError(InterpretError):
+    code = ErrorHandler.ERROR_INVALID_FRAME
+
+
+class MissingValueError(InterpretError):
+    code = ErrorHandler.ERROR_MISSING_VALUE
+
+
+class OperandValueError(InterpretError):
+    code = ErrorHandler.ERROR_WRONG_OP_VALUE
+
+
+class StringOperationError(InterpretError):
+    code = ErrorHandler.ERROR_WRONG_STRING_OPERATION
+
+
+class ResourceLimitError(InterpretError):
+    """
+    Program exceeded limit of interpreter, e.g. maximal call depth
+    """
+    code = ErrorHandler.ERROR_RESOURCE_LIMIT
+
+
+class BudgetExceededError(InterpretError):
+    """
+    Program exceeded budget of run given by --max-steps, --max-time or --max-memory, it has its own code,
+    so runner of untrusted programs can tell it from program which is only too deeply recursive
+    """
+    code = ErrorHandler.ERROR_BUDGET_EXCEEDED
+
+
+ERROR_TYPES = {error.code: error for error in (SourceHeaderError, SourceOpcodeError, SourceSyntaxError, XMLFormatError,
+                                               XMLStructureError, SemanticError, OperandTypeError, VariableError,
+                                               FrameError, MissingValueError, OperandValueError, StringOperationError,
+                                               ResourceLimitError, BudgetExceededError)}
+
+
+class ProgramExit(Exception):
+    """
+    Raised by EXIT instruction, program ended with given code, it is not an error
+    """
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
 
 class DataStore:
     """
-    Class contains all data that interpreter uses
+    Class contains all data that interpreter uses, every instance has its own data, so more programs
+    can be parsed and run in one process, also from more threads
 
     Attributes
     -------
@@ -72,139 +192,317 @@ class DataStore:
     -------
     None
     """
-    _instructions = {}      # stored all incoming instructions
-    _defined_labels = {}    # store all labels and order of that labels
-    _GF = {}                # Global frame storage
-    _LF = []                # Local frame storage
-    _TF = None              # Temp frame storage
-    _data_stack = []        # Data stack
-    _call_stack = []        # Call stack
-    _arg1_temp_val = None   # Fist, second and third operand after command, set in each instruction
-    _arg2_temp_val = None
-    _arg3_temp_val = None
-    read_source = None      # Defines from where will get input
-    is_file = None          # If not file, still None, if file set fopen
-    _skip_until = 0         # To which order will interpret skip if label is before call
-    _reset_interpret = False    # Helper for skip until
-    _order_count = 0
+
+    def __init__(self):
+        self._instructions = {}      # stored all incoming instructions
+        self._defined_labels = {}    # store all labels and order of that labels
+        self._program = []           # instructions ordered by position, indexed by program counter
+        self._label_index = {}       # label name -> index of that label in _program
+        self._var_slots = {}         # frame kind ('GF' or 'LF' shared by LF and TF) -> variable name -> slot index
+        self._GF = []                # Global frame storage, slot array indexed by VarOperand.slot
+        self._LF = []                # Local frame storage, stack of dicts slot index -> content of defined variable
+        self._TF = None              # Temp frame storage, dict slot index -> content of defined variable
+        self._data_stack = []        # Data stack
+        self._call_stack = []        # Call stack of return addresses, index of instruction after CALL
+        self._frame_pool = []        # Discarded temporary frames reused by CREATEFRAME
+        self._output = None          # OutputBuffer used by WRITE
+        self._input = None           # InputReader used by READ
+        self._pc = 0                 # Program counter, index of next instruction in _program
+        self._order_count = 0        # Order of currently executed instruction
 
 
 class ParseXML(DataStore):
     """
-    Class for parse incoming xml and fill _instructions and _defined_labels in DataStore
+    Class for parse incoming xml and fill _instructions and _defined_labels,
+    xml is parsed as stream and each instruction element is freed right after it is converted
+    to compact record (order, opcode, ((arg type, arg text), ...))
     """
-    __xml_origin = None
-    __xml_root = None
-    __instructions = {}
-    __defined_labels = {}
-    __DS = None
 
-    def __init__(self, xml_source, read_source, file=None):
-        self.__DS = DataStore
-        self.__DS.read_source = read_source
-        self.__DS.is_file = file
-        try:
-            self.__xml_origin = XML.parse(xml_source)
-            self.__xml_root = self.__xml_origin.getroot()
-        except Exception as e:
-            print(e, file=sys.stderr)
-            sys.exit(ErrorHandler.ERROR_WRONG_XML_INPUT_FORMAT)
+    # XML types of arg accepted by each operand kind of signature
+    OPERAND_TYPES = {
+        'var': frozenset(('var',)),
+        'symb': frozenset(('var', 'int', 'bool', 'string', 'nil')),
+        'label': frozenset(('label',)),
+        'type': frozenset(('type',)),
+    }
+    ARG_POSITIONS = {'arg1': 0, 'arg2': 1, 'arg3': 2}
+
+    def __init__(self, xml_source):
+        super().__init__()
+        self.__xml_source = xml_source
+        self.__instructions = {}
+        self.__defined_labels = {}
+        self.__label_uses = []      # (order, opcode, label name) of each jump and CALL
 
     @staticmethod
-    def _validate_arg(arg):
-        types = ["int", "bool", "string", "nil", "label", "type", "var"]
-        tags = ["arg1", "arg2", "arg3"]
-        if arg.attrib.get('type') is None or arg.attrib['type'] not in types or arg.tag not in tags:
-            ErrorHandler.exit_with_message("Invalid arg type or tag name", ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT)
+    @functools.lru_cache(maxsize=None)
+    def signatures():
+        """
+        Signatures of IPPcode23 instructions taken from InterpretWorker._opcode_table, internal
+        superinstructions are not accepted in source
+        :return: dict opcode -> tuple of (operand kind, accepted XML types) for each operand
+        """
+        return {opcode: tuple((kind, ParseXML.OPERAND_TYPES[kind])
+                              for kind in InterpretWorker.opcode_signature(opcode)[0])
+                for opcode in INSTRUCTIONS}
 
     @staticmethod
-    def _find_num_args(opcode):
-        if opcode in NO_OP_INSTRUCTIONS:
-            return 0
-        elif opcode in ONE_OP_INSTRUCTIONS:
-            return 1
-        elif opcode in TWO_OP_INSTRUCTIONS:
-            return 2
-        elif opcode in THREE_OP_INSTRUCTIONS:
-            return 3
-        else:
-            ErrorHandler.exit_with_message("_find_num_args: opcode not found in arrays", ErrorHandler.GENERAL_ERR)
+    def _check_root(root):
+        if root.tag != 'program' or 'language' not in root.attrib or root.attrib['language'] != 'IPPcode23':
+            raise XML.ParseError("Invalid source language")
+
+    @staticmethod
+    def _structure_error(msg, order, opcode=None):
+        ErrorHandler.raise_error("Instruction order %s%s: %s" % (order, " (%s)" % opcode if opcode else "", msg),
+                                 ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT)
+
+    def _parse_instruction(self, child):
+        """
+        Validate one complete child element of <program> against signature of its opcode in one pass
+        and save it as compact record
+        :param child: element of instruction
+        :return:
+        """
+        if child.tag != 'instruction':
+            raise XML.ParseError('Not instruction tag')
+
+        raw_order = child.attrib.get('order')
+        try:
+            order = int(raw_order)
+        except (TypeError, ValueError):
+            self._structure_error("invalid order", raw_order)
+        if order < 1:
+            self._structure_error("order cannot be less then 1", order)
+        opcode = sys.intern(child.attrib.get('opcode', ''))
+
+        signature = self.signatures().get(opcode)
+        if signature is None:
+            self._structure_error("unknown opcode " + repr(opcode), order)
+
+        args = [None] * len(signature)
+        for arg in child:
+            position = self.ARG_POSITIONS.get(arg.tag)
+            if position is None or position >= len(signature):
+                self._structure_error("unexpected element <%s>" % arg.tag, order, opcode)
+            if args[position] is not None:
+                self._structure_error("duplicate " + arg.tag, order, opcode)
+            kind, accepted = signature[position]
+            arg_type = arg.attrib.get('type')
+            if arg_type not in accepted:
+                self._structure_error("%s must be %s, not %s" % (arg.tag, kind, arg_type), order, opcode)
+            if arg.text is None and arg_type != 'string':
+                self._structure_error("empty " + arg.tag, order, opcode)
+            # names repeat a lot in programs, keep only one copy of each
+            arg_type = sys.intern(arg_type)
+            if arg_type in ('var', 'label'):
+                args[position] = (arg_type, sys.intern(arg.text))
+            else:
+                args[position] = (arg_type, "" if arg.text is None else arg.text)
+            if kind == 'label' and opcode != 'LABEL':
+                self.__label_uses.append((order, opcode, arg.text))
+
+        if None in args:
+            self._structure_error("expected %d arguments, arg%d is missing" % (len(args), args.index(None) + 1),
+                                  order, opcode)
+        args = tuple(args)
+
+        # save labels
+        if opcode == 'LABEL':
+            if args[0][1] in self.__defined_labels:
+                ErrorHandler.raise_error("Instruction order %d (LABEL): label %s already defined at order %d"
+                                         % (order, args[0][1], self.__defined_labels[args[0][1]]),
+                                         ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+            self.__defined_labels[args[0][1]] = order
+
+        if order in self.__instructions:
+            self._structure_error("duplicate order", order, opcode)
+
+        self.__instructions[order] = (order, opcode, args)
+
+    @staticmethod
+    def check_labels(defined_labels, label_uses):
+        """
+        Every jump and CALL must use defined label, checked before program is run
+        :param defined_labels: label name -> order of LABEL
+        :param label_uses: (order, opcode, label name) of each jump and CALL
+        """
+        for order, opcode, name in label_uses:
+            if name not in defined_labels:
+                ErrorHandler.raise_error("Instruction order %d (%s): undefined label %s" % (order, opcode, name),
+                                         ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
 
     def parse_instructions(self):
+        """
+        Parse whole source
+        :return: instructions sorted by order, dict order -> record
+        """
+        # error in structure is reported after whole input is read, so not well-formed xml is always 31
+        structure_error = None
+        depth = 0
+        root = None
         try:
-            if \
-                    self.__xml_root.tag != 'program' or \
-                            'language' not in self.__xml_root.attrib or \
-                            self.__xml_root.attrib['language'] != 'IPPcode23':
-                raise XML.ParseError("Invalid source language")
-
-            for child in self.__xml_root:
-                if child.tag != 'instruction':
-                    raise XML.ParseError('Not instruction tag')
-
-                order = int(child.attrib['order'])
-                child.attrib['order'] = int(child.attrib['order'])
-
-                if order < 1:
-                    raise XML.ParseError("Order cannot be less then 1")
-                opcode = child.attrib['opcode']
-
-                # check if exists
-                if opcode not in INSTRUCTIONS:
-                    raise XML.ParseError("opcode not instruction " + str(opcode))
-
-                # add instruction to final struct
-                final_instruction = child.attrib
-
-                args = {}
-                for arg in child:
-                    # run validation
-                    self._validate_arg(arg)
-
-                    # check if not duplicate arg
-                    if final_instruction.get(arg.tag) is None:
-                        # print(str(arg.attrib), str(arg.attrib) == 'string')
-                        if arg.text is None and arg.attrib['type'] != 'string':
-                            ErrorHandler.exit_with_message("Invalid arg", ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT)
-                        if arg.text is None and arg.attrib['type'] == 'string':
-                            arg.attrib['text'] = ""
-                        else:
-                            arg.attrib['text'] = arg.text
-                        # final_instruction[arg.tag] = arg.attrib
-                        args[arg.tag] = arg.attrib
-                    else:
-                        ErrorHandler.exit_with_message("Duplicite arg found", ErrorHandler.GENERAL_ERR)
-
-                testArg = []
-                for i in args:
-                    testArg.append(i)
-                if ('arg2' in testArg and 'arg1' not in testArg) or ('arg3' in testArg and 'arg2' not in testArg):
-                    raise XML.ParseError("Wrong arg number")
-
-                # check if it's right number of arguments
-                if len(args) != self._find_num_args(opcode):
-                    raise XML.ParseError("Invalid number of args for this functions")
-
-                args = dict(sorted(args.items(), key=lambda x: x))
-                final_instruction['args'] = args
-
-                # save labels
-                if opcode == 'LABEL':
-                    if final_instruction['args']["arg1"]['text'] in self.__defined_labels:
-                        sys.exit(ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
-                    self.__defined_labels[final_instruction['args']["arg1"]['text']] = final_instruction
-
-                if order in self.__instructions:
-                    raise XML.ParseError('Double order detected')
-
-                self.__instructions[order] = final_instruction
+            for event, element in XML.iterparse(self.__xml_source, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        root = element
+                        try:
+                            self._check_root(root)
+                        except Exception as e:
+                            structure_error = e
+                    continue
 
+                depth -= 1
+                if depth == 1:
+                    if structure_error is None:
+                        try:
+                            self._parse_instruction(element)
+                        except Exception as e:
+                            structure_error = e
+                    # free already processed instructions
+                    root.clear()
         except Exception as e:
-            ErrorHandler.exit_with_message("Parse err: " + str(e), ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT)
+            ErrorHandler.raise_error(e, ErrorHandler.ERROR_WRONG_XML_INPUT_FORMAT)
+
+        if isinstance(structure_error, InterpretError):
+            ErrorHandler.raise_error("Parse err: " + str(structure_error), structure_error.code)
+        if structure_error is not None:
+            ErrorHandler.raise_error("Parse err: " + str(structure_error),
+                                     ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT)
+        self.check_labels(self.__defined_labels, self.__label_uses)
 
         # sort array of instructions and return
-        self.__DS._instructions = dict(sorted(self.__instructions.items(), key=lambda x: x))
-        self.__DS._defined_labels = self.__defined_labels
+        self._instructions = dict(sorted(self.__instructions.items(), key=lambda x: x))
+        self._defined_labels = self.__defined_labels
+        return self._instructions
+
+
+class ParseIPPcode(DataStore):
+    """
+    Native front end of --source-format=ippcode, reads IPPcode23 source text line by line and builds the same
+    records (order, opcode, ((arg type, arg text), ...)) as ParseXML, so parse.php and XML are not needed.
+    Operands are checked by signature of opcode from ParseXML.signatures(), errors have codes of parse.php:
+    21 missing or wrong header, 22 unknown opcode, 23 other lexical or syntax error, labels are checked
+    same as in ParseXML (52)
+    """
+    HEADER = '.ippcode23'
+    VAR = re.compile(r'(GF|LF|TF)@[a-zA-Z_\-$&%*!?][a-zA-Z0-9_\-$&%*!?]*')
+    LABEL = re.compile(r'[a-zA-Z_\-$&%*!?][a-zA-Z0-9_\-$&%*!?]*')
+    INT = re.compile(r'[+-]?[0-9]+')
+    BAD_ESCAPE = re.compile(r'\\(?![0-9]{3})')
+    TYPES = frozenset(('int', 'bool', 'string', 'nil'))
+    VAR_PREFIXES = frozenset(('GF@', 'LF@', 'TF@'))
+
+    def __init__(self, source):
+        """
+        :param source: path or file object with IPPcode23 source
+        """
+        super().__init__()
+        self.__source = source
+        self.__instructions = {}
+        self.__defined_labels = {}
+        self.__label_uses = []      # (order, opcode, label name) of each jump and CALL
+
+    @staticmethod
+    def _error(msg, line_number, code=ErrorHandler.ERROR_SOURCE_SYNTAX):
+        ErrorHandler.raise_error("Line %d: %s" % (line_number, msg), code)
+
+    def _read(self):
+        try:
+            if isinstance(self.__source, str):
+                with open(self.__source, 'rb') as file:
+                    data = file.read()
+            else:
+                data = getattr(self.__source, 'buffer', self.__source).read()
+        except OSError as e:
+            ErrorHandler.raise_error("Unable to read source: " + str(e), ErrorHandler.RUN_ERR_INFILE_OPEN)
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            ErrorHandler.raise_error("Source is not UTF-8: " + str(e), ErrorHandler.ERROR_SOURCE_SYNTAX)
+
+    def _literal(self, token):
+        """
+        :return: (arg type, arg text) of constant or None when token is not valid constant
+        """
+        arg_type, at, text = token.partition('@')
+        if not at or arg_type not in self.TYPES:
+            return None
+        if arg_type == 'int':
+            valid = self.INT.fullmatch(text)
+        elif arg_type == 'bool':
+            valid = text in ('true', 'false')
+        elif arg_type == 'nil':
+            valid = text == 'nil'
+        else:
+            valid = '\\' not in text or not self.BAD_ESCAPE.search(text)
+        return (arg_type, text) if valid else None
+
+    def _operand(self, kind, token):
+        """
+        :return: (arg type, arg text) or None when token is not valid operand of given kind
+        """
+        if kind == 'var' or kind == 'symb' and token[:3] in self.VAR_PREFIXES:
+            return ('var', sys.intern(token)) if self.VAR.fullmatch(token) else None
+        if kind == 'label':
+            return ('label', sys.intern(token)) if self.LABEL.fullmatch(token) else None
+        if kind == 'type':
+            return ('type', token) if token in self.TYPES else None
+        return self._literal(token)
+
+    def parse_instructions(self):
+        """
+        Parse whole source
+        :return: instructions sorted by order, dict order -> record
+        """
+        signatures = ParseXML.signatures()
+        header = False
+        order = 0
+        for line_number, line in enumerate(self._read().split('\n'), 1):
+            tokens = line.split('#', 1)[0].split()
+            if not tokens:
+                continue
+            if not header:
+                if len(tokens) != 1 or tokens[0].lower() != self.HEADER:
+                    self._error("missing header .IPPcode23", line_number, ErrorHandler.ERROR_SOURCE_HEADER)
+                header = True
+                continue
+
+            opcode = sys.intern(tokens[0].upper())
+            signature = signatures.get(opcode)
+            if signature is None:
+                self._error("unknown opcode " + tokens[0], line_number, ErrorHandler.ERROR_SOURCE_OPCODE)
+            if len(tokens) - 1 != len(signature):
+                self._error("%s expects %d operands, got %d" % (opcode, len(signature), len(tokens) - 1),
+                            line_number)
+            order += 1
+            args = []
+            for (kind, _), token in zip(signature, tokens[1:]):
+                arg = self._operand(kind, token)
+                if arg is None:
+                    self._error("invalid %s operand %s of %s" % (kind, token, opcode), line_number)
+                args.append(arg)
+                if kind == 'label' and opcode != 'LABEL':
+                    self.__label_uses.append((order, opcode, arg[1]))
+
+            if opcode == 'LABEL':
+                if args[0][1] in self.__defined_labels:
+                    ErrorHandler.raise_error("Instruction order %d (LABEL): label %s already defined at order %d"
+                                             % (order, args[0][1], self.__defined_labels[args[0][1]]),
+                                             ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+                self.__defined_labels[args[0][1]] = order
+            self.__instructions[order] = (order, opcode, tuple(args))
+
+        if not header:
+            self._error("missing header .IPPcode23", 1, ErrorHandler.ERROR_SOURCE_HEADER)
+        ParseXML.check_labels(self.__defined_labels, self.__label_uses)
+        self._instructions = self.__instructions
+        self._defined_labels = self.__defined_labels
+        return self._instructions
+
+
+# values of --source-format, front ends building records of instructions
+SOURCE_FORMATS = {'xml': ParseXML, 'ippcode': ParseIPPcode}
 
 
 class ValidateArguments:
@@ -213,408 +511,1378 @@ class ValidateArguments:
     """
 
     @staticmethod
-    def is_var(arg, exit=False):
-        if arg['type'] == 'var' and bool(re.match(r'(GF|TF|LF)@[a-zA-Z_$-%!&?*][a-zA-Z_$-%!&?*0-9]*', arg['text'])):
-            return True
-        else:
-            if exit:
-                ErrorHandler.exit_with_message("Invalid arg not var" + str(arg), ErrorHandler.ERROR_INVALID_OP)
-            else:
-                return False
+    def is_var(text):
+        return bool(re.match(r'(GF|TF|LF)@[a-zA-Z_$-%!&?*][a-zA-Z_$-%!&?*0-9]*', text))
+
+    ESCAPE = re.compile(r'\\([0-9]{3})?')
+    ESCAPE_CACHE_SIZE = 4096    # decoded string literals kept by escape_string
 
     @staticmethod
-    def is_const(arg, exit=False):
-        types = ['nil', 'bool', 'string', 'int']
-        # print('is_const',arg)
-        if arg['type'] in types and type(arg['text']) == int:
-            return True
-        elif arg['type'] in types and bool(re.match(r'[a-zA_$-%!?*0-9]*', arg['text'])):
-            return True
-        else:
-            if exit:
-                ErrorHandler.exit_with_message("Invalid arg not const" + str(arg), ErrorHandler.ERROR_INVALID_OP)
-            else:
-                return False
+    def _decode_escape(match):
+        if match.group(1) is None:
+            ErrorHandler.raise_error("Invalid escape sequence in string", ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT)
+        return chr(int(match.group(1)))
 
     @staticmethod
+    @functools.lru_cache(maxsize=ESCAPE_CACHE_SIZE)
     def escape_string(text):
-        # print(type(text) == bool)
-        if type(text) == bool:
-            if text:
-                text = 'true'
-            else:
-                text = 'false'
-        starting_index = 0
-        while text.find('\\', starting_index) != -1:
-            i = text.find('\\', starting_index)
-            char = text[i + 1:i + 4]
-            # if bool(re.match(r'^[0-9][0-9][0-9]$', char)):
-            if char != '':
-                text = text[:i] + chr(int(char)) + text[i + 4:]
-                starting_index = i
-            else:
-                text = text[:i] + text[i] + text[i + 4:]
-                starting_index = i + 1
-        return text
+        """
+        Decode escape sequences \\ddd of string literal in one pass, called once for each literal when
+        program is decoded, repeated literals are taken from cache
+        :param text: string literal from XML
+        :return: decoded str
+        """
+        if '\\' not in text:
+            return text
+        return ValidateArguments.ESCAPE.sub(ValidateArguments._decode_escape, text)
 
 
-class InterpretWorker(DataStore):
+class OutputBuffer:
     """
-    Main class for interpret uses start_interpret for run and functions for each instruction
+    Buffered output of WRITE, text is collected and written encoded to binary stream
+    when buffer is full, on EXIT, on end of program and before error message
     """
+    DEFAULT_SIZE = 65536
 
-    def __init__(self):
-        pass
+    def __init__(self, stream, buffer_size=DEFAULT_SIZE):
+        """
+        :param stream: binary stream, e.g. sys.stdout.buffer or file opened in 'wb' mode
+        :param buffer_size: number of characters collected before write, 0 writes immediately
+        """
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self._chunks = []
+        self._size = 0
+
+    def write(self, text):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._chunks:
+            self.stream.write(''.join(self._chunks).encode('utf-8'))
+            self._chunks = []
+            self._size = 0
+        self.stream.flush()
+
+
+class InputReader:
+    """
+    Input of READ, file is memory-mapped (or loaded at once if it cannot be mapped) and lines are
+    served from memory without system call, standard input is read line by line so interactive input
+    still works
+    """
 
-    def start_interpreter(self):
+    def __init__(self, source, interactive=False):
         """
-        Main function for interpret
-        :return:
+        :param source: object with binary readline(), mmap, BytesIO or sys.stdin.buffer
+        :param interactive: source is standard input, output is flushed before each read
         """
-        # starts while cycle with break, but if I have to jump to earlier instruction i break for and restart it
-        # with while to reach that label
-        break_while = False
-        while True:
-            for i in self._instructions:
-                self._order_count = i
+        self.interactive = interactive
+        # next line including line end as bytes, empty at the end of input; bound directly to C method,
+        # the bound method also keeps source (e.g. mmap) alive
+        self.readline = source.readline
 
-                if self._skip_until > i:
-                    continue
-                if self._reset_interpret:
-                    break
-                self._execute_instruction(self._instructions[int(i)])
+    @staticmethod
+    def from_file(path):
+        with open(path, 'rb') as file:
+            try:
+                source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # empty file or file which cannot be mapped (pipe, device)
+                source = io.BytesIO(file.read())
+        return InputReader(source)
 
-            # breaks while
-            if self._reset_interpret:
-                self._reset_interpret = False
-            else:
-                break
 
-    def __insert_to_frame(self, name, data, update=False):
+class ProgramCache:
+    """
+    On-disk cache of validated and decoded programs, key is hash of source and interpreter version.
+    Entries are written to temporary file and atomically renamed, corrupt entries are removed and
+    least recently used entries are evicted when cache grows over max_size
+    """
+    MAGIC = b'IPPC'
+    DEFAULT_SIZE = 64 * 1024 * 1024
+    SUFFIX = '.ippc'
+    TEMP_PREFIX = '.tmp-'
+    TEMP_MAX_AGE = 3600     # temporary files of crashed writers older than this are removed
+
+    def __init__(self, directory, max_size=DEFAULT_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(source, source_format='xml'):
         """
-        Check if frame exists and if updating, also if variable exists
-        :param name: name of var
-        :param data: data to var
-        :param update: insert new/update existing
+        :param source: XML or IPPcode23 source as bytes
+        :param source_format: 'xml' or 'ippcode', keys of XML sources do not depend on it
+        :return: cache key
+        """
+        # hashlib and tempfile are imported only with cache, they are noticeable part of interpreter start
+        import hashlib
+        digest = hashlib.sha256()
+        digest.update(('%s\0%s\0' % (__version__, sys.implementation.cache_tag)).encode())
+        if source_format != 'xml':
+            digest.update(source_format.encode() + b'\0')
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def load(self, key):
+        """
+        Read entry in one read and check it
+        :param key: cache key
+        :return: stored program or None if it is missing or corrupt
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        import hashlib
+        header = len(self.MAGIC) + hashlib.sha256().digest_size
+        payload = data[header:]
+        try:
+            if data[:len(self.MAGIC)] != self.MAGIC or data[len(self.MAGIC):header] != hashlib.sha256(payload).digest():
+                raise ValueError("checksum mismatch")
+            program = marshal.loads(payload)
+        except (ValueError, EOFError, TypeError):
+            self._remove(path)
+            return None
+
+        # mark entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return program
+
+    def store(self, key, program):
+        """
+        Write entry atomically, concurrent writers of the same key just replace each other
+        :param key: cache key
+        :param program: structure of built-in types
         :return:
         """
-        name = name.split('@')
-        frame = name[0]
-        name = name[1]
+        import hashlib
+        import tempfile
+        payload = marshal.dumps(program)
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=self.TEMP_PREFIX, dir=self.directory)
+            with os.fdopen(fd, 'wb') as file:
+                file.write(self.MAGIC + hashlib.sha256(payload).digest() + payload)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if temp_path is not None:
+                self._remove(temp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except OSError:
+                # removed by another process
+                continue
+            if entry.name.startswith(self.TEMP_PREFIX):
+                if now - stat.st_mtime > self.TEMP_MAX_AGE:
+                    self._remove(entry.path)
+            elif entry.name.endswith(self.SUFFIX):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
 
-        if frame == 'LF':
-            if not self._LF:
-                ErrorHandler.exit_with_message("Frame not initialized", ErrorHandler.ERROR_INVALID_FRAME)
 
-            if update and name not in self._LF[-1]:
-                ErrorHandler.exit_with_message("check and insert err", ErrorHandler.ERROR_VAR_NOT_EXIST)
+class Value:
+    """
+    Data of variables, data stack and constants, integer type tag and native payload
+    (int, bool, str or None for nil). Values are never modified after creation, so they can be
+    shared between frames, data stack and constants; use NIL, TRUE and FALSE instead of new instances
+    """
+    __slots__ = ('tag', 'data')
+
+    def __init__(self, tag, data):
+        self.tag = tag
+        self.data = data
 
-            if not update and name in self._LF[-1]:
-                ErrorHandler.exit_with_message("Try to redefine err", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
-            self._LF[-1][name] = data
-        elif frame == 'GF':
-            if update and name not in self._GF:
-                ErrorHandler.exit_with_message("check and insert err", ErrorHandler.ERROR_VAR_NOT_EXIST)
 
-            if not update and name in self._GF:
-                ErrorHandler.exit_with_message("Try to redefine err", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+class StringBuffer(Value):
+    """
+    String of one variable changed in place by SETCHAR and CONCAT appending to the variable itself,
+    characters are kept in list, so both are amortised O(1). Text for other uses is joined lazily and
+    cached until next change. Buffer always belongs to exactly one frame slot, MOVE and PUSHS store
+    plain Value made by freeze instead of buffer
+    """
+    __slots__ = ('chars', '_text')
+
+    def __init__(self, text):
+        self.tag = TYPE_STRING
+        self.chars = list(text)
+        self._text = text
+
+    @property
+    def data(self):
+        if self._text is None:
+            self._text = ''.join(self.chars)
+        return self._text
+
+    def extend(self, text):
+        self.chars.extend(text)
+        self._text = None
+
+    def set(self, index, char):
+        self.chars[index] = char
+        self._text = None
+
+    def freeze(self):
+        return Value(TYPE_STRING, self.data)
 
-            self._GF[name] = data
-        elif frame == 'TF':
-            if self._TF is None:
-                ErrorHandler.exit_with_message("Frame not initialized", ErrorHandler.ERROR_INVALID_FRAME)
 
-            if update and name not in self._TF:
-                ErrorHandler.exit_with_message("check and insert err", ErrorHandler.ERROR_VAR_NOT_EXIST)
+NIL = Value(TYPE_NIL, None)
+TRUE = Value(TYPE_BOOL, True)
+FALSE = Value(TYPE_BOOL, False)
+UNINITIALIZED = object()    # slot of defined variable without value
 
-            if not update and name in self._TF:
-                ErrorHandler.exit_with_message("Try to redefine err", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
-            self._TF[name] = data
 
-    def __get_var_from_frame(self, name, instruction):
+class Operand:
+    """
+    Base class for decoded operands, instances are immutable once created
+    """
+    __slots__ = ()
+
+    def __setattr__(self, key, value):
+        raise AttributeError(type(self).__name__ + " is immutable")
+
+
+class ConstOperand(Operand):
+    """
+    Constant operand, value is already decoded Value
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        object.__setattr__(self, 'value', value)
+
+    def dump(self):
+        return 'const', self.value.tag, self.value.data
+
+
+class VarOperand(Operand):
+    """
+    Variable operand with pre-parsed frame, name and slot of variable in frame,
+    TF and LF share slots because temporary frame becomes local frame after PUSHFRAME
+    """
+    __slots__ = ('frame', 'name', 'slot')
+
+    def __init__(self, frame, name, slot):
+        object.__setattr__(self, 'frame', frame)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'slot', slot)
+
+    def dump(self):
+        return 'var', self.frame, self.name, self.slot
+
+
+class LabelOperand(Operand):
+    """
+    Label operand, name of label
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        object.__setattr__(self, 'name', name)
+
+    def dump(self):
+        return 'label', self.name
+
+
+class TypeOperand(Operand):
+    """
+    Type operand used by READ, name of type
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        object.__setattr__(self, 'name', name)
+
+    def dump(self):
+        return 'type', self.name
+
+
+class Instruction:
+    """
+    Decoded instruction, args are tuple of Operand instances sorted by arg number,
+    handler is bound from opcode table when program is loaded
+    """
+    __slots__ = ('order', 'opcode', 'args', 'handler')
+
+    def __init__(self, order, opcode, args):
+        self.order = order
+        self.opcode = opcode
+        self.args = args
+        self.handler = None
+
+
+class ResourceLimits:
+    """
+    Limits of one run of untrusted program (--max-steps, --max-time, --max-memory), exceeded limit is error 60
+    with report of the limit and instruction where it was hit. Steps are counted for every executed instruction
+    (also LABEL), time and memory are checked every CHECK_INTERVAL steps or later, when state of program
+    is big, so accounting costs constant time per step. Memory is estimate of slots of all frames, data stack
+    and call stack, values in them and payloads of strings, string written by CONCAT or READ is checked
+    right after the instruction, so repeated doubling of string cannot get far over the limit
+    """
+    CHECK_INTERVAL = 1024
+    SLOT_SIZE = 8                       # reference in frame, data stack or call stack
+    VALUE_SIZE = sys.getsizeof(NIL)     # Value instance
+    GROWING = ('CONCAT', 'CONCAT_CHAIN', 'READ')
+
+    def __init__(self, max_steps=None, max_time=None, max_memory=None):
         """
-        Method for get data from frames
-        :param name: name of variable
-        :param instruction: instruction data
+        :param max_steps: maximal number of executed instructions or None
+        :param max_time: maximal wall time of run in seconds or None
+        :param max_memory: maximal estimated memory of program in bytes or None
+        """
+        self.max_steps = max_steps
+        self.max_time = max_time
+        self.max_memory = max_memory
+        self.steps = 0
+        self.memory = 0         # last estimate
+        self._start = None
+        self._next_check = self.CHECK_INTERVAL
+
+    def start(self):
+        self._start = time.monotonic()
+        self.steps = 0
+        self.memory = 0
+        self._next_check = self.CHECK_INTERVAL
+
+    def elapsed(self):
+        return time.monotonic() - self._start
+
+    def exceeded(self, limit, value, instruction):
+        ErrorHandler.raise_error("Limit %s=%s exceeded (%s) at order %d (%s) after %d steps, %.3f s, %d B"
+                                 % (limit, getattr(self, limit.replace('-', '_')), value, instruction.order,
+                                    instruction.opcode, self.steps, self.elapsed(), self.memory),
+                                 ErrorHandler.ERROR_BUDGET_EXCEEDED)
+
+    @classmethod
+    def value_size(cls, value):
+        if type(value) is StringBuffer:
+            return cls.VALUE_SIZE + cls.SLOT_SIZE * len(value.chars)
+        if type(value) is Value and value.tag == TYPE_STRING:
+            return cls.VALUE_SIZE + sys.getsizeof(value.data)
+        return cls.VALUE_SIZE
+
+    def measure(self, worker):
+        """
+        Estimate memory of program
+        :return: (bytes, number of counted values)
+        """
+        frames = [worker._GF, worker._data_stack] + [frame.values() for frame in worker._LF]
+        if worker._TF is not None:
+            frames.append(worker._TF.values())
+        total = self.SLOT_SIZE * len(worker._call_stack)
+        count = len(worker._call_stack)
+        for frame in frames:
+            total += self.SLOT_SIZE * len(frame)
+            count += len(frame)
+            for value in frame:
+                if value is not None and value is not UNINITIALIZED:
+                    total += self.value_size(value)
+        return total, count
+
+    def check(self, worker, instruction):
+        """
+        Check time and memory
+        :return: number of steps to next check
+        """
+        if self.max_time is not None and self.elapsed() > self.max_time:
+            self.exceeded('max-time', '%.3f s' % self.elapsed(), instruction)
+        if self.max_memory is None:
+            return self.CHECK_INTERVAL
+        self.memory, count = self.measure(worker)
+        if self.memory > self.max_memory:
+            self.exceeded('max-memory', '%d B' % self.memory, instruction)
+        return max(self.CHECK_INTERVAL, count)
+
+    def check_string(self, worker, instruction):
+        """
+        Check string just written by instruction in GROWING together with memory from last check
+        """
+        if self.max_memory is None:
+            return
+        size = self.value_size(worker._peek(instruction.args[0]))
+        if self.memory + size > self.max_memory:
+            self.memory += size
+            self.exceeded('max-memory', '%d B' % self.memory, instruction)
+
+    def step(self, worker, instruction):
+        """
+        Count one instruction before it is run, used by loop with statistics
+        """
+        self.steps += 1
+        if self.max_steps is not None and self.steps > self.max_steps:
+            self.exceeded('max-steps', '%d steps' % self.steps, instruction)
+        if self.steps >= self._next_check:
+            self._next_check = self.steps + self.check(worker, instruction)
+
+
+class DecodeOperands:
+    """
+    Class contains only static methods for decoding parsed instructions before execution,
+    all literal errors are reported here so interpret never works with raw XML text
+    """
+
+    @staticmethod
+    def decode_operand(arg_type, text, var_slots):
+        """
+        Convert one parsed <argN> to typed operand
+        :param arg_type: type attribute of arg
+        :param text: text of arg
+        :param var_slots: slot tables for GF and LF/TF, new variable names are added
+        :return: Operand
+        """
+        if arg_type == 'var':
+            if not ValidateArguments.is_var(text):
+                ErrorHandler.raise_error("Invalid variable " + text, ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT)
+            frame, name = text.split('@', 1)
+            slots = var_slots['GF' if frame == 'GF' else 'LF']
+            if name not in slots:
+                slots[name] = len(slots)
+            return VarOperand(frame, name, slots[name])
+        if arg_type == 'label':
+            return LabelOperand(text)
+        if arg_type == 'type':
+            return TypeOperand(text)
+
+        if arg_type == 'int':
+            try:
+                return ConstOperand(Value(TYPE_INT, int(text)))
+            except Exception as e:
+                ErrorHandler.raise_error("Decode unable to convert to int " + str(e),
+                                         ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+        if arg_type == 'bool':
+            if text == 'true':
+                return ConstOperand(TRUE)
+            if text == 'false':
+                return ConstOperand(FALSE)
+            ErrorHandler.raise_error("not boolean", ErrorHandler.ERROR_INVALID_OP)
+        if arg_type == 'string':
+            return ConstOperand(Value(TYPE_STRING, ValidateArguments.escape_string(text)))
+        if text != 'nil':
+            ErrorHandler.raise_error("not nil", ErrorHandler.ERROR_INVALID_OP)
+        return ConstOperand(NIL)
+
+    @staticmethod
+    def decode_instruction(record, var_slots):
+        """
+        Convert parsed instruction to Instruction with decoded operands
+        :param record: parsed instruction from ParseXML (order, opcode, ((arg type, arg text), ...))
+        :param var_slots: slot tables for GF and LF/TF
+        :return: Instruction
+        """
+        order, opcode, args = record
+        args = tuple(DecodeOperands.decode_operand(arg_type, text, var_slots) for arg_type, text in args)
+        return Instruction(order, opcode, args)
+
+    @staticmethod
+    def dump_program(program, var_slots):
+        """
+        Convert decoded program to structure of built-in types which can be stored by marshal
+        :param program: list of Instruction
+        :param var_slots: slot tables for GF and LF/TF
+        :return: (var_slots, ((order, opcode, (dumped operand, ...)), ...))
+        """
+        return var_slots, tuple((instruction.order, instruction.opcode, tuple(arg.dump() for arg in instruction.args))
+                                for instruction in program)
+
+    @staticmethod
+    def load_operand(data):
+        if data[0] == 'const':
+            if data[1] == TYPE_NIL:
+                return ConstOperand(NIL)
+            if data[1] == TYPE_BOOL:
+                return ConstOperand(TRUE if data[2] else FALSE)
+            return ConstOperand(Value(data[1], data[2]))
+        if data[0] == 'var':
+            return VarOperand(data[1], data[2], data[3])
+        if data[0] == 'label':
+            return LabelOperand(data[1])
+        if data[0] == 'type':
+            return TypeOperand(data[1])
+        raise ValueError("Unknown operand " + str(data[0]))
+
+    @staticmethod
+    def load_program(data):
+        """
+        Rebuild program from dump_program output, nothing is validated or decoded again
+        :param data: output of dump_program
+        :return: (program, var_slots)
+        """
+        var_slots, instructions = data
+        program = [Instruction(order, opcode, tuple(DecodeOperands.load_operand(arg) for arg in args))
+                   for order, opcode, args in instructions]
+        return program, var_slots
+
+
+class Program:
+    """
+    Loaded program, decoded instructions bound to handlers, label indexes and slot tables of frames.
+    Program is never changed by execution, so one instance can be run by more InterpretWorker at once
+    """
+
+    def __init__(self, instructions, var_slots, optimize=None):
+        """
+        :param instructions: list of decoded Instruction in program order
+        :param var_slots: slot tables for GF and LF/TF
+        :param optimize: names of PeepholeOptimizer passes run before handlers are bound, None runs nothing
+        """
+        self.specialized = 0    # instructions with unchecked handler selected by type inference
+        if optimize:
+            from optimizer import PeepholeOptimizer
+            optimizer = PeepholeOptimizer(optimize)
+            instructions = optimizer.optimize(instructions)
+            self.specialized = optimizer.specialized
+        self.instructions = instructions
+        self.var_slots = var_slots
+        self.label_index = {}
+        self._compiler = None
+        for index, instruction in enumerate(instructions):
+            if instruction.handler is None:
+                instruction.handler = InterpretWorker.opcode_handler(instruction.opcode)
+            if instruction.opcode == 'LABEL':
+                self.label_index[instruction.args[0].name] = index
+
+    @staticmethod
+    def from_source(source, optimize=None, source_format='xml'):
+        """
+        Parse, validate and decode program in any of SOURCE_FORMATS
+        :param source: path or file object
+        :param optimize: names of optimizer passes or None
+        :param source_format: 'xml' or 'ippcode'
+        :return: Program
+        """
+        return Program(*Program.decode_source(source, source_format), optimize)
+
+    @staticmethod
+    def decode_source(source, source_format='xml'):
+        """
+        :param source: path or file object
+        :param source_format: 'xml' or 'ippcode'
+        :return: (list of decoded Instruction, var_slots)
+        """
+        instructions = SOURCE_FORMATS[source_format](source).parse_instructions()
+        var_slots = {'GF': {}, 'LF': {}}
+        decoded = [DecodeOperands.decode_instruction(instruction, var_slots) for instruction in instructions.values()]
+        return decoded, var_slots
+
+    @staticmethod
+    def from_dump(data, optimize=None):
+        """
+        Use program from dump instead of parsing XML
+        :param data: output of Program.dump
+        :param optimize: names of optimizer passes or None
+        :return: Program
+        """
+        return Program(*DecodeOperands.load_program(data), optimize)
+
+    def block_compiler(self):
+        """
+        BlockCompiler of this program created on first use by --engine=compiled, compiled blocks
+        are kept, so they are shared by all runs of the program
+        """
+        if self._compiler is None:
+            from compiler import BlockCompiler
+            self._compiler = BlockCompiler(self)
+        return self._compiler
+
+    def dump(self):
+        """
+        Decoded program as structure of built-in types, used by ProgramCache, optimized program
+        contains internal superinstructions, so only program loaded without optimization can be stored
+        """
+        return DecodeOperands.dump_program(self.instructions, self.var_slots)
+
+
+class InterpretWorker(DataStore):
+    """
+    Main class for interpret uses start_interpret for run and functions for each instruction
+    """
+
+    MAX_CALL_DEPTH = 1000000    # default limit of call stack
+    FRAME_POOL_SIZE = 64        # maximal number of kept discarded frames
+
+    def __init__(self, program, output, input_reader, stats=None, max_call_depth=MAX_CALL_DEPTH, limits=None,
+                 profiler=None):
+        """
+        :param program: loaded Program, it is only read, so it can be shared by more workers
+        :param output: OutputBuffer for WRITE
+        :param input_reader: InputReader for READ
+        :param stats: ExecutionStats collected during run or None
+        :param max_call_depth: maximal number of nested CALLs, deeper CALL is error 59
+        :param limits: ResourceLimits of this run or None
+        :param profiler: SamplingProfiler running during interpretation or None
+        """
+        super().__init__()
+        self._program = program.instructions
+        self._label_index = program.label_index
+        self._var_slots = program.var_slots
+        self._GF = [None] * len(self._var_slots['GF'])
+        self._output = output
+        self._input = input_reader
+        self._stats = stats
+        self._max_call_depth = max_call_depth
+        self._limits = limits
+        self._profiler = profiler
+
+    def start_interpreter(self):
+        """
+        Main function for interpret, errors are raised as InterpretError subclasses and EXIT raises ProgramExit
         :return:
         """
-        name = name.split('@')
-        frame = name[0]
-        name = name[1]
+        program = self._program
+        program_len = len(program)
 
+        # _pc points to next instruction, jumps just overwrite it
+        self._pc = 0
+        if self._profiler is not None:
+            self._profiler.start(self, program)
         try:
-            if frame == 'LF' and self._LF == []:
-                ErrorHandler.exit_with_message("Frame not initialized", ErrorHandler.ERROR_INVALID_FRAME)
-            if frame == 'LF' and name in self._LF[-1]:
-                if self._LF[-1][name]['text'] is None and instruction['opcode'] != 'TYPE':
-                    raise Exception('var does not exists')
-                return self._LF[-1][name]
-            elif frame == 'GF' and name in self._GF:
-                if self._GF[name]['text'] is None and instruction['opcode'] != 'TYPE':
-                    raise Exception('var does not exists')
-                return self._GF[name]
-            elif frame == 'TF':
-                if self._TF is None:
-                    ErrorHandler.exit_with_message("Frame not initialized", ErrorHandler.ERROR_INVALID_FRAME)
-                if name in self._TF:
-                    if self._TF[name]['text'] is None and instruction['opcode'] != 'TYPE':
-                        raise Exception('var does not exists')
-                    return self._TF[name]
-                else:
-                    ErrorHandler.exit_with_message("get val err not defined: " + name, ErrorHandler.ERROR_VAR_NOT_EXIST)
-            else:
-                ErrorHandler.exit_with_message("get val err not defined: " + name, ErrorHandler.ERROR_VAR_NOT_EXIST)
-        except Exception as e:
-            ErrorHandler.exit_with_message("get_var_from_frame err: " + frame + '@' + name + str(e),
-                                           ErrorHandler.ERROR_MISSING_VALUE)
+            if self._limits is not None:
+                self._limits.start()
+            if self._stats is not None:
+                self._run_with_stats(program)
+            elif self._limits is not None:
+                self._run_with_limits(program)
+            while self._pc < program_len:
+                instruction = program[self._pc]
+                self._order_count = instruction.order
+                self._pc += 1
+                instruction.handler(self, instruction)
+        finally:
+            if self._profiler is not None:
+                self._profiler.stop()
+        self._output.flush()
+
+    def _run_with_stats(self, program):
+        """
+        Same loop as in start_interpreter which also measures each instruction, kept separate so
+        normal run does not pay anything for statistics
+        :param program: decoded program
+        :return:
+        """
+        stats = self._stats
+        opcode_counts = stats.opcode_counts
+        opcode_times = stats.opcode_times
+        order_counts = stats.order_counts
+        # instructions which can initialize variable given by first operand
+        writes = {opcode for opcode, (kinds, types, handler) in self._opcode_table.items()
+                  if kinds and kinds[0] == 'var' and opcode != 'DEFVAR'}
+        program_len = len(program)
+        clock = time.perf_counter_ns
+        limits = self._limits
+
+        while self._pc < program_len:
+            instruction = program[self._pc]
+            opcode = instruction.opcode
+            if limits is not None:
+                limits.step(self, instruction)
+            self._order_count = instruction.order
+            self._pc += 1
+
+            opcode_counts[opcode] = opcode_counts.get(opcode, 0) + 1
+            if opcode not in stats.NOT_COUNTED:
+                order_counts[instruction.order] = order_counts.get(instruction.order, 0) + 1
+            target = None
+            discarded = 0
+            if opcode in writes:
+                target = instruction.args[0]
+                if self._is_initialized(target):
+                    target = None
+            elif opcode == 'CREATEFRAME' or opcode == 'POPFRAME':
+                discarded = stats.initialized_in(self._TF)
+
+            start = clock()
+            instruction.handler(self, instruction)
+            opcode_times[opcode] = opcode_times.get(opcode, 0) + clock() - start
+
+            if target is not None and self._is_initialized(target):
+                stats.variables += 1
+            stats.variables -= discarded
+            if stats.variables > stats.max_variables:
+                stats.max_variables = stats.variables
+            if len(self._data_stack) > stats.max_data_stack:
+                stats.max_data_stack = len(self._data_stack)
+            if len(self._call_stack) > stats.max_call_stack:
+                stats.max_call_stack = len(self._call_stack)
+            if limits is not None and opcode in limits.GROWING:
+                limits.check_string(self, instruction)
+
+    def _run_with_limits(self, program):
+        """
+        Same loop as in start_interpreter which counts steps and checks ResourceLimits
+        :param program: decoded program
+        :return:
+        """
+        limits = self._limits
+        max_steps = limits.max_steps if limits.max_steps is not None else float('inf')
+        growing = limits.GROWING
+        program_len = len(program)
+        steps = 0
+        next_check = limits.CHECK_INTERVAL
+
+        try:
+            while self._pc < program_len:
+                instruction = program[self._pc]
+                steps += 1
+                if steps > max_steps:
+                    limits.steps = steps
+                    limits.exceeded('max-steps', '%d steps' % steps, instruction)
+                self._order_count = instruction.order
+                self._pc += 1
+                instruction.handler(self, instruction)
+                if instruction.opcode in growing:
+                    limits.steps = steps
+                    limits.check_string(self, instruction)
+                if steps >= next_check:
+                    limits.steps = steps
+                    next_check = steps + limits.check(self, instruction)
+        finally:
+            limits.steps = steps
+
+    def _peek(self, var):
+        """
+        Read variable without errors, used by statistics and limits
+        :param var: decoded VarOperand
+        :return: content of slot, None when frame or variable does not exist
+        """
+        if var.frame == 'GF':
+            frame = self._GF
+        elif var.frame == 'LF':
+            frame = self._LF[-1] if self._LF else None
+        else:
+            frame = self._TF
+        if frame is None:
+            return None
+        return frame[var.slot] if frame is self._GF else frame.get(var.slot)
+
+    def _is_initialized(self, var):
+        """
+        Check without errors if variable has value, used only by statistics
+        :param var: decoded VarOperand
+        :return: bool
+        """
+        value = self._peek(var)
+        return value is not None and value is not UNINITIALIZED
+
+    def __frame_of(self, var):
+        """
+        Find frame of variable
+        :param var: decoded VarOperand
+        :return: slot array of GF or dict of LF/TF, variable not defined in LF/TF has no key
+        """
+        if var.frame == 'GF':
+            return self._GF
+        if var.frame == 'LF':
+            if not self._LF:
+                ErrorHandler.raise_error("Frame not initialized", ErrorHandler.ERROR_INVALID_FRAME)
+            return self._LF[-1]
+        if self._TF is None:
+            ErrorHandler.raise_error("Frame not initialized", ErrorHandler.ERROR_INVALID_FRAME)
+        return self._TF
+
+    def __insert_to_frame(self, var, data, update=False):
+        """
+        Check if frame exists and if updating, also if variable exists, empty slot means undefined variable
+        :param var: decoded VarOperand
+        :param data: data to var
+        :param update: insert new/update existing
+        :return:
+        """
+        frame = self.__frame_of(var)
+        current = frame[var.slot] if frame is self._GF else frame.get(var.slot)
+        if update and current is None:
+            ErrorHandler.raise_error("check and insert err: " + var.name, ErrorHandler.ERROR_VAR_NOT_EXIST)
+        if not update and current is not None:
+            ErrorHandler.raise_error("Try to redefine err: " + var.name, ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+        frame[var.slot] = data
+
+    def __get_var_from_frame(self, var, allow_uninitialized=False):
+        """
+        Method for get data from frames
+        :param var: decoded VarOperand
+        :param allow_uninitialized: return also variable without value (used by TYPE)
+        :return:
+        """
+        frame = self.__frame_of(var)
+        data = frame[var.slot] if frame is self._GF else frame.get(var.slot)
+        if data is None:
+            ErrorHandler.raise_error("get val err not defined: " + var.name, ErrorHandler.ERROR_VAR_NOT_EXIST)
+        if data is UNINITIALIZED and not allow_uninitialized:
+            ErrorHandler.raise_error("get_var_from_frame err: " + var.frame + '@' + var.name +
+                                     ' var does not exists', ErrorHandler.ERROR_MISSING_VALUE)
+        return data
+
+    def _symb(self, operand):
+        """
+        Get data of symbol operand, constant is already decoded, variable is read from frame
+        :param operand: ConstOperand or VarOperand
+        :return: Value
+        """
+        if type(operand) is ConstOperand:
+            return operand.value
+        return self.__get_var_from_frame(operand)
+
+    def _symb_copy(self, operand):
+        """
+        Get data of symbol operand stored to another variable or data stack, StringBuffer is frozen to Value
+        :param operand: ConstOperand or VarOperand
+        :return: Value
+        """
+        value = self._symb(operand)
+        if type(value) is StringBuffer:
+            return value.freeze()
+        return value
+
+    @staticmethod
+    def _chars(string):
+        """
+        :param string: Value of string type
+        :return: list of characters of StringBuffer or str, both support len and indexing
+        """
+        return string.chars if type(string) is StringBuffer else string.data
+
+    @staticmethod
+    def _append(string, text):
+        """
+        Result of CONCAT appending to its own target variable
+        :param string: current Value of target variable
+        :param text: appended str
+        :return: StringBuffer of variable, the same one when variable already had it
+        """
+        if type(string) is StringBuffer:
+            string.extend(text)
+            return string
+        return StringBuffer(string.data + text)
+
+    @staticmethod
+    def _same_var(var, operand):
+        return type(operand) is VarOperand and operand.frame == var.frame and operand.slot == var.slot
+
+    @staticmethod
+    def _invalid_op(instruction):
+        # superinstruction reports opcode of instruction it was created from, e.g. LT for LT_JUMP
+        opcode = instruction.opcode.split('_')[0]
+        ErrorHandler.raise_error(opcode + " invalid op type", ErrorHandler.ERROR_INVALID_OP)
+
+    def _jump_to(self, label):
+        if label.name not in self._label_index:
+            ErrorHandler.raise_error("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+        self._pc = self._label_index[label.name]
 
     """
-    Here starts all methods for each instruction
+    Here starts all methods for each instruction, each method reads and checks only its own operands
     """
     def _move(self, instruction):
-        self.__insert_to_frame(self._arg1_temp_val['text'], self._arg2_temp_val, True)
+        var, symb = instruction.args
+        self.__insert_to_frame(var, self._symb_copy(symb), True)
 
     def _createframe(self, instruction):
-        self._TF = {}
+        # frame is never shared, so discarded temporary frame can be cleared and used again
+        if self._TF is not None:
+            frame = self._TF
+        elif self._frame_pool:
+            frame = self._frame_pool.pop()
+        else:
+            self._TF = {}
+            return
+        frame.clear()
+        self._TF = frame
 
     def _pushframe(self, instruction):
         if self._TF is None:
-            ErrorHandler.exit_with_message("Trying to push empty", ErrorHandler.ERROR_INVALID_FRAME)
+            ErrorHandler.raise_error("Trying to push empty", ErrorHandler.ERROR_INVALID_FRAME)
         else:
             self._LF.append(self._TF)
             self._TF = None
 
     def _popframe(self, instruction):
         if self._LF:
+            if self._TF is not None and len(self._frame_pool) < self.FRAME_POOL_SIZE:
+                self._frame_pool.append(self._TF)
             self._TF = self._LF.pop()
         else:
-            ErrorHandler.exit_with_message("Unable to pop frame doesn't exits", ErrorHandler.ERROR_INVALID_FRAME)
+            ErrorHandler.raise_error("Unable to pop frame doesn't exits", ErrorHandler.ERROR_INVALID_FRAME)
 
     def _defvar(self, instruction):
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': self._arg1_temp_val['type'], 'text': None})
+        self.__insert_to_frame(instruction.args[0], UNINITIALIZED)
 
     def _call(self, instruction):
-        call = {'order': self._order_count}
-        self._call_stack.append(call)
-        self._jump(instruction)
+        if len(self._call_stack) >= self._max_call_depth:
+            ErrorHandler.raise_error("Maximal call depth %d exceeded" % self._max_call_depth,
+                                     ErrorHandler.ERROR_RESOURCE_LIMIT)
+        self._call_stack.append(self._pc)
+        self._jump_to(instruction.args[0])
 
     def _return(self, instruction):
         if not self._call_stack:
-            ErrorHandler.exit_with_message("Empty call stack unable to return", ErrorHandler.ERROR_MISSING_VALUE)
-        call = self._call_stack.pop()
-        self._skip_until = int(call['order']) + 1
-        if self._skip_until <= self._order_count:
-            self._reset_interpret = True
+            ErrorHandler.raise_error("Empty call stack unable to return", ErrorHandler.ERROR_MISSING_VALUE)
+        self._pc = self._call_stack.pop()
 
     def _pushs(self, instruction):
-        self._data_stack.append(self._arg1_temp_val)
+        self._data_stack.append(self._symb_copy(instruction.args[0]))
 
     def _pops(self, instruction):
         if not self._data_stack:
-            ErrorHandler.exit_with_message("empty stack", ErrorHandler.ERROR_MISSING_VALUE)
+            ErrorHandler.raise_error("empty stack", ErrorHandler.ERROR_MISSING_VALUE)
         result = self._data_stack.pop()
-        self.__insert_to_frame(self._arg1_temp_val['text'], result, True)
+        self.__insert_to_frame(instruction.args[0], result, True)
+
+    """
+    Stack instructions (STACK extension), operands are popped from data stack, the second one is on top,
+    and result is pushed back
+    """
+    def _pop_operands(self, count):
+        if len(self._data_stack) < count:
+            ErrorHandler.raise_error("empty stack", ErrorHandler.ERROR_MISSING_VALUE)
+        operands = self._data_stack[-count:]
+        del self._data_stack[-count:]
+        return operands
+
+    def _clears(self, instruction):
+        self._data_stack.clear()
+
+    def _stack_int_operands(self, instruction):
+        symb1, symb2 = self._pop_operands(2)
+        if symb1.tag != TYPE_INT or symb2.tag != TYPE_INT:
+            self._invalid_op(instruction)
+        return symb1.data, symb2.data
+
+    def _adds(self, instruction):
+        symb1, symb2 = self._stack_int_operands(instruction)
+        self._data_stack.append(Value(TYPE_INT, symb1 + symb2))
+
+    def _subs(self, instruction):
+        symb1, symb2 = self._stack_int_operands(instruction)
+        self._data_stack.append(Value(TYPE_INT, symb1 - symb2))
+
+    def _muls(self, instruction):
+        symb1, symb2 = self._stack_int_operands(instruction)
+        self._data_stack.append(Value(TYPE_INT, symb1 * symb2))
+
+    def _idivs(self, instruction):
+        symb1, symb2 = self._stack_int_operands(instruction)
+        if symb2 == 0:
+            ErrorHandler.raise_error('Divide by zero', ErrorHandler.ERROR_WRONG_OP_VALUE)
+        self._data_stack.append(Value(TYPE_INT, int(symb1 / symb2)))
+
+    def _stack_relation_operands(self, instruction):
+        symb1, symb2 = self._pop_operands(2)
+        if symb1.tag != symb2.tag or symb1.tag == TYPE_NIL:
+            self._invalid_op(instruction)
+        return symb1.data, symb2.data
+
+    def _lts(self, instruction):
+        symb1, symb2 = self._stack_relation_operands(instruction)
+        self._data_stack.append(TRUE if symb1 < symb2 else FALSE)
+
+    def _gts(self, instruction):
+        symb1, symb2 = self._stack_relation_operands(instruction)
+        self._data_stack.append(TRUE if symb1 > symb2 else FALSE)
+
+    def _stack_equals(self, instruction):
+        symb1, symb2 = self._pop_operands(2)
+        if symb1.tag != symb2.tag:
+            if symb1.tag != TYPE_NIL and symb2.tag != TYPE_NIL:
+                self._invalid_op(instruction)
+            return False
+        return symb1.data == symb2.data
+
+    def _eqs(self, instruction):
+        self._data_stack.append(TRUE if self._stack_equals(instruction) else FALSE)
+
+    def _stack_bool_operands(self, instruction):
+        symb1, symb2 = self._pop_operands(2)
+        if symb1.tag != TYPE_BOOL or symb2.tag != TYPE_BOOL:
+            self._invalid_op(instruction)
+        return symb1.data, symb2.data
+
+    def _ands(self, instruction):
+        symb1, symb2 = self._stack_bool_operands(instruction)
+        self._data_stack.append(TRUE if symb1 and symb2 else FALSE)
+
+    def _ors(self, instruction):
+        symb1, symb2 = self._stack_bool_operands(instruction)
+        self._data_stack.append(TRUE if symb1 or symb2 else FALSE)
+
+    def _nots(self, instruction):
+        symb, = self._pop_operands(1)
+        if symb.tag != TYPE_BOOL:
+            self._invalid_op(instruction)
+        self._data_stack.append(FALSE if symb.data else TRUE)
+
+    def _int2chars(self, instruction):
+        symb, = self._pop_operands(1)
+        if symb.tag != TYPE_INT:
+            self._invalid_op(instruction)
+        try:
+            result = chr(symb.data)
+        except Exception as e:
+            ErrorHandler.raise_error('Invalid op: ' + str(e), ErrorHandler.ERROR_WRONG_STRING_OPERATION)
+        self._data_stack.append(Value(TYPE_STRING, result))
+
+    def _stri2ints(self, instruction):
+        symb1, symb2 = self._pop_operands(2)
+        if symb1.tag != TYPE_STRING or symb2.tag != TYPE_INT:
+            self._invalid_op(instruction)
+        if 0 > symb2.data or symb2.data >= len(symb1.data):
+            ErrorHandler.raise_error('Invalid arr index: out of range', ErrorHandler.ERROR_WRONG_STRING_OPERATION)
+        self._data_stack.append(Value(TYPE_INT, ord(symb1.data[symb2.data])))
+
+    def _jumpifeqs(self, instruction):
+        label = instruction.args[0]
+        equals = self._stack_equals(instruction)
+        if label.name not in self._label_index:
+            ErrorHandler.raise_error("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+        if equals:
+            self._pc = self._label_index[label.name]
+
+    def _jumpifneqs(self, instruction):
+        label = instruction.args[0]
+        equals = self._stack_equals(instruction)
+        if label.name not in self._label_index:
+            ErrorHandler.raise_error("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+        if not equals:
+            self._pc = self._label_index[label.name]
+
+    def _int_operands(self, instruction):
+        var, symb1, symb2 = instruction.args
+        symb1 = self._symb(symb1)
+        symb2 = self._symb(symb2)
+        if symb1.tag != TYPE_INT or symb2.tag != TYPE_INT:
+            self._invalid_op(instruction)
+        return var, symb1.data, symb2.data
 
     def _add(self, instruction):
-        result = self._arg2_temp_val['text'] + self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'int', 'text': int(result)}, True)
+        var, symb1, symb2 = self._int_operands(instruction)
+        self.__insert_to_frame(var, Value(TYPE_INT, symb1 + symb2), True)
 
     def _sub(self, instruction):
-        result = self._arg2_temp_val['text'] - self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'int', 'text': int(result)}, True)
+        var, symb1, symb2 = self._int_operands(instruction)
+        self.__insert_to_frame(var, Value(TYPE_INT, symb1 - symb2), True)
 
     def _mul(self, instruction):
-        result = self._arg2_temp_val['text'] * self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'int', 'text': int(result)}, True)
+        var, symb1, symb2 = self._int_operands(instruction)
+        self.__insert_to_frame(var, Value(TYPE_INT, symb1 * symb2), True)
 
     def _idiv(self, instruction):
-        if int(self._arg3_temp_val['text']) == 0:
-            ErrorHandler.exit_with_message('Divide by zero', ErrorHandler.ERROR_WRONG_OP_VALUE)
-        result = self._arg2_temp_val['text'] / self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'int', 'text': int(result)}, True)
+        var, symb1, symb2 = self._int_operands(instruction)
+        if symb2 == 0:
+            ErrorHandler.raise_error('Divide by zero', ErrorHandler.ERROR_WRONG_OP_VALUE)
+        self.__insert_to_frame(var, Value(TYPE_INT, int(symb1 / symb2)), True)
+
+    def _relation_operands(self, instruction):
+        var, symb1, symb2 = instruction.args
+        symb1 = self._symb(symb1)
+        symb2 = self._symb(symb2)
+        if symb1.tag != symb2.tag or symb1.tag == TYPE_NIL:
+            self._invalid_op(instruction)
+        return var, symb1.data, symb2.data
 
     def _lt(self, instruction):
-        result = self._arg2_temp_val['text'] < self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'bool', 'text': str(result).lower()}, True)
+        var, symb1, symb2 = self._relation_operands(instruction)
+        self.__insert_to_frame(var, TRUE if symb1 < symb2 else FALSE, True)
 
     def _gt(self, instruction):
-        result = self._arg2_temp_val['text'] > self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'bool', 'text': str(result).lower()}, True)
+        var, symb1, symb2 = self._relation_operands(instruction)
+        self.__insert_to_frame(var, TRUE if symb1 > symb2 else FALSE, True)
+
+    def _equals(self, symb1, symb2, instruction):
+        """
+        Compare two symbols, nil can be compared with any type
+        :return: True if symbols are equal
+        """
+        symb1 = self._symb(symb1)
+        symb2 = self._symb(symb2)
+        if symb1.tag != symb2.tag:
+            if symb1.tag != TYPE_NIL and symb2.tag != TYPE_NIL:
+                self._invalid_op(instruction)
+            return False
+        return symb1.data == symb2.data
 
     def _eq(self, instruction):
-        result = self._arg2_temp_val['text'] == self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'bool', 'text': str(result).lower()}, True)
+        var, symb1, symb2 = instruction.args
+        self.__insert_to_frame(var, TRUE if self._equals(symb1, symb2, instruction) else FALSE, True)
+
+    def _bool_operands(self, instruction):
+        var, symb1, symb2 = instruction.args
+        symb1 = self._symb(symb1)
+        symb2 = self._symb(symb2)
+        if symb1.tag != TYPE_BOOL or symb2.tag != TYPE_BOOL:
+            self._invalid_op(instruction)
+        return var, symb1.data, symb2.data
 
     def _and(self, instruction):
-        result = self._arg2_temp_val['text'] and self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'bool', 'text': str(result).lower()}, True)
+        var, symb1, symb2 = self._bool_operands(instruction)
+        self.__insert_to_frame(var, TRUE if symb1 and symb2 else FALSE, True)
 
     def _or(self, instruction):
-        result = self._arg2_temp_val['text'] or self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'bool', 'text': str(result).lower()}, True)
+        var, symb1, symb2 = self._bool_operands(instruction)
+        self.__insert_to_frame(var, TRUE if symb1 or symb2 else FALSE, True)
 
     def _not(self, instruction):
-        result = not self._arg2_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'bool', 'text': str(result).lower()}, True)
+        var, symb = instruction.args
+        symb = self._symb(symb)
+        if symb.tag != TYPE_BOOL:
+            self._invalid_op(instruction)
+        self.__insert_to_frame(var, FALSE if symb.data else TRUE, True)
 
     def _int2char(self, instruction):
+        var, symb = instruction.args
+        symb = self._symb(symb)
+        if symb.tag != TYPE_INT:
+            self._invalid_op(instruction)
         try:
-            result = chr(self._arg2_temp_val['text'])
-            self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'string', 'text': result}, True)
+            result = chr(symb.data)
         except Exception as e:
-            ErrorHandler.exit_with_message('Invalid op: ' + str(e), ErrorHandler.ERROR_WRONG_STRING_OPERATION)
+            ErrorHandler.raise_error('Invalid op: ' + str(e), ErrorHandler.ERROR_WRONG_STRING_OPERATION)
+        self.__insert_to_frame(var, Value(TYPE_STRING, result), True)
+
+    def _string_index_operands(self, instruction):
+        var, symb1, symb2 = instruction.args
+        symb1 = self._symb(symb1)
+        symb2 = self._symb(symb2)
+        if symb1.tag != TYPE_STRING or symb2.tag != TYPE_INT:
+            self._invalid_op(instruction)
+        string = self._chars(symb1)
+        if 0 > symb2.data or symb2.data >= len(string):
+            ErrorHandler.raise_error('Invalid arr index: out of range', ErrorHandler.ERROR_WRONG_STRING_OPERATION)
+        return var, string, symb2.data
 
     def _stri2int(self, instruction):
-        try:
-            if 0 > self._arg3_temp_val['text'] or self._arg3_temp_val['text'] >= len(self._arg2_temp_val['text']) or \
-                    self._arg2_temp_val['text'] == '':
-                raise Exception('out of range')
-            result = ord(self._arg2_temp_val['text'][self._arg3_temp_val['text']])
-        except Exception as err:
-            ErrorHandler.exit_with_message('Invalid arr index: ' + str(err),
-                                           ErrorHandler.ERROR_WRONG_STRING_OPERATION)
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'int', 'text': result}, True)
+        var, string, index = self._string_index_operands(instruction)
+        self.__insert_to_frame(var, Value(TYPE_INT, ord(string[index])), True)
 
     def _read(self, instruction):
-        if self._arg2_temp_val['type'] != 'type':
-            ErrorHandler.exit_with_message('cannot print nil or not type', ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT)
-        if self._arg2_temp_val['text'] == 'nil':
-            ErrorHandler.exit_with_message('cannot print nil or not type', ErrorHandler.ERROR_INVALID_OP)
-        type = self._arg2_temp_val['text']
-
-        empty = True
-        try:
-            if self.is_file is not None:
-                src = self.is_file.readline()
-                if len(src) != 0:
-                    empty = False
-
-            else:
-                src = input()
-        except:
-            src = 'nil'
-
-        src = src.strip()
-        is_digit = True
-        try:
-            in_len = len(src)
-            src = int(src)
-        except:
-            is_digit = False
-
-        if type == 'int' and is_digit:
-            self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'int', 'text': int(src)}, True)
-
-        elif type == 'bool' and src != '':
-            if src.lower() == 'true':
-                self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'bool', 'text': 'true'}, True)
-            else:
-                self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'bool', 'text': 'false'}, True)
-
-        elif type == 'string' and src != 'nil' and not empty:
-            self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'string', 'text': src}, True)
-
-        else:
-            self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'nil', 'text': 'nil'}, True)
+        var, read_type = instruction.args
+        if type(read_type) is not TypeOperand:
+            ErrorHandler.raise_error('cannot print nil or not type', ErrorHandler.ERROR_UNEXPECTED_XML_STRUCT)
+        if read_type.name == 'nil':
+            ErrorHandler.raise_error('cannot print nil or not type', ErrorHandler.ERROR_INVALID_OP)
+        read_type = read_type.name
+
+        if self._input.interactive:
+            self._output.flush()
+        line = self._input.readline()
+
+        # parse line only for requested type, end of input and invalid data gives nil
+        value = NIL
+        if line:
+            line = line.decode('utf-8', 'replace').strip()
+            if read_type == 'int':
+                try:
+                    value = Value(TYPE_INT, int(line))
+                except ValueError:
+                    pass
+            elif read_type == 'bool':
+                if line != '':
+                    value = TRUE if line.lower() == 'true' else FALSE
+            elif read_type == 'string':
+                if line != 'nil':
+                    value = Value(TYPE_STRING, line)
+        self.__insert_to_frame(var, value, True)
 
     def _write(self, instruction):
-        if self._arg1_temp_val['type'] == 'nil':
-            text = ''
+        symb = self._symb(instruction.args[0])
+        if symb.tag == TYPE_STRING:
+            # literals are decoded when program is loaded, READ gives text without escapes
+            text = symb.data
+        elif symb.tag == TYPE_INT:
+            text = str(symb.data)
+        elif symb.tag == TYPE_BOOL:
+            text = 'true' if symb.data else 'false'
         else:
-            text = self._arg1_temp_val['text']
-
-        # handle escapes
-        if type(text) != int:
-            text = ValidateArguments.escape_string(text)
+            text = ''
 
-        print(text, end="")
+        self._output.write(text)
 
     def _concat(self, instruction):
-        result = self._arg2_temp_val['text'] + self._arg3_temp_val['text']
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'string', 'text': result}, True)
+        var, symb1, symb2 = instruction.args
+        append = self._same_var(var, symb1)
+        symb1 = self._symb(symb1)
+        symb2 = self._symb(symb2)
+        if symb1.tag != TYPE_STRING or symb2.tag != TYPE_STRING:
+            self._invalid_op(instruction)
+        if append:
+            self.__insert_to_frame(var, self._append(symb1, symb2.data), True)
+        else:
+            self.__insert_to_frame(var, Value(TYPE_STRING, symb1.data + symb2.data), True)
+
+    def _concat_chain(self, instruction):
+        """
+        Superinstruction of CONCAT followed by CONCATs appending to the same variable, first CONCAT checks
+        and writes variable, so later operands fail in the same order as separate instructions
+        """
+        var, symb1, symb2, *rest = instruction.args
+        append = self._same_var(var, symb1)
+        symb1 = self._symb(symb1)
+        symb2 = self._symb(symb2)
+        if symb1.tag != TYPE_STRING or symb2.tag != TYPE_STRING:
+            self._invalid_op(instruction)
+        if append:
+            # variable keeps its buffer, later operands are appended in place
+            string = self._append(symb1, symb2.data)
+            self.__insert_to_frame(var, string, True)
+            for symb in rest:
+                symb = self._symb(symb)
+                if symb.tag != TYPE_STRING:
+                    self._invalid_op(instruction)
+                string.extend(symb.data)
+            return
+        parts = [symb1.data, symb2.data]
+        self.__insert_to_frame(var, Value(TYPE_STRING, symb1.data + symb2.data), True)
+        for symb in rest:
+            symb = self._symb(symb)
+            if symb.tag != TYPE_STRING:
+                self._invalid_op(instruction)
+            parts.append(symb.data)
+        self.__insert_to_frame(var, Value(TYPE_STRING, ''.join(parts)), True)
 
     def _strlen(self, instruction):
-        result = len(self._arg2_temp_val['text'])
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'int', 'text': result}, True)
+        var, symb = instruction.args
+        symb = self._symb(symb)
+        if symb.tag != TYPE_STRING:
+            self._invalid_op(instruction)
+        self.__insert_to_frame(var, Value(TYPE_INT, len(self._chars(symb))), True)
 
     def _getchar(self, instruction):
-        try:
-            if 0 > self._arg3_temp_val['text'] or len(self._arg2_temp_val['text']) <= self._arg3_temp_val['text']:
-                raise Exception("out of range")
-            result = self._arg2_temp_val['text'][self._arg3_temp_val['text']]
-        except Exception as e:
-            ErrorHandler.exit_with_message(str(e), ErrorHandler.ERROR_WRONG_STRING_OPERATION)
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'string', 'text': result}, True)
+        var, string, index = self._string_index_operands(instruction)
+        self.__insert_to_frame(var, Value(TYPE_STRING, string[index]), True)
 
     def _setchar(self, instruction):
-        try:
-            result = self.__get_var_from_frame(self._arg1_temp_val['text'], instruction)
-
-            if 0 > self._arg2_temp_val['text'] or self._arg2_temp_val['text'] >= len(result['text']) or \
-                    self._arg3_temp_val['text'] == '':
-                ErrorHandler.exit_with_message("out of string", ErrorHandler.ERROR_WRONG_STRING_OPERATION)
-
-            if result['type'] != 'string':
-                raise Exception("invalid setchar type")
-
-            result = result['text']
-            result = f"{result[:self._arg2_temp_val['text']]}{self._arg3_temp_val['text'][0]}{result[self._arg2_temp_val['text'] + 1:]}"
-        except Exception as e:
-            ErrorHandler.exit_with_message('ERR : ' + str(e), ErrorHandler.ERROR_INVALID_OP)
-        self.__insert_to_frame(self._arg1_temp_val['text'], {'type': 'string', 'text': result}, True)
+        var, symb1, symb2 = instruction.args
+        symb1 = self._symb(symb1)
+        symb2 = self._symb(symb2)
+        if symb1.tag != TYPE_INT or symb2.tag != TYPE_STRING:
+            self._invalid_op(instruction)
+
+        result = self.__get_var_from_frame(var)
+        if result.tag != TYPE_STRING:
+            self._invalid_op(instruction)
+        index = symb1.data
+        if 0 > index or index >= len(self._chars(result)) or symb2.data == '':
+            ErrorHandler.raise_error("out of string", ErrorHandler.ERROR_WRONG_STRING_OPERATION)
+
+        # variable gets its own buffer on first change, later changes are in place
+        if type(result) is not StringBuffer:
+            result = StringBuffer(result.data)
+            self.__insert_to_frame(var, result, True)
+        result.set(index, symb2.data[0])
 
     def _type(self, instruction):
+        var, symb = instruction.args
+        if type(symb) is ConstOperand:
+            symb = symb.value
+        else:
+            symb = self.__get_var_from_frame(symb, True)
 
-        if self._arg2_temp_val['type'] == 'type':
-            self.__insert_to_frame(self._arg1_temp_val['text'],
-                                   {'type': 'type', 'text': 'string'}, True)
-
-        elif self._arg2_temp_val['text'] is None and self._arg2_temp_val['type'] == 'var':
-            self.__insert_to_frame(self._arg1_temp_val['text'],
-                                   {'type': 'type', 'text': ''}, True)
+        if symb is UNINITIALIZED:
+            self.__insert_to_frame(var, Value(TYPE_STRING, ''), True)
         else:
-            self.__insert_to_frame(self._arg1_temp_val['text'],
-                                   {'type': 'type', 'text': self._arg2_temp_val['type']}, True)
+            self.__insert_to_frame(var, Value(TYPE_STRING, TYPE_NAMES[symb.tag]), True)
 
     def _label(self, instruction):
         return
 
     def _jump(self, instruction):
-        if self._arg1_temp_val['text'] not in self._defined_labels:
-            ErrorHandler.exit_with_message("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
-
-        self._skip_until = int(self._defined_labels[self._arg1_temp_val['text']]['order'])
-        if self._skip_until < self._order_count:
-            self._reset_interpret = True
+        self._jump_to(instruction.args[0])
 
     def _jumpifeq(self, instruction):
-        if self._arg1_temp_val['text'] not in self._defined_labels:
-            ErrorHandler.exit_with_message("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
-
-        if self._arg2_temp_val['text'] == self._arg3_temp_val['text']:
-            self._skip_until = int(self._defined_labels[self._arg1_temp_val['text']]['order'])
-            if self._skip_until < self._order_count:
-                self._reset_interpret = True
+        label, symb1, symb2 = instruction.args
+        equals = self._equals(symb1, symb2, instruction)
+        if label.name not in self._label_index:
+            ErrorHandler.raise_error("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+        if equals:
+            self._pc = self._label_index[label.name]
 
     def _jumpifneq(self, instruction):
-        if self._arg1_temp_val['text'] not in self._defined_labels:
-            ErrorHandler.exit_with_message("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
-
-        if self._arg2_temp_val['text'] != self._arg3_temp_val['text']:
-            self._skip_until = int(self._defined_labels[self._arg1_temp_val['text']]['order'])
-            if self._skip_until < self._order_count:
-                self._reset_interpret = True
+        label, symb1, symb2 = instruction.args
+        equals = self._equals(symb1, symb2, instruction)
+        if label.name not in self._label_index:
+            ErrorHandler.raise_error("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+        if not equals:
+            self._pc = self._label_index[label.name]
+
+    def _defvar_move(self, instruction):
+        var, symb = instruction.args
+        self.__insert_to_frame(var, UNINITIALIZED)
+        self.__insert_to_frame(var, self._symb_copy(symb), True)
+
+    def _compare_jump(self, instruction, result):
+        """
+        Second half of EQ_JUMP, LT_JUMP and GT_JUMP, store result and jump when it is jump_when
+        """
+        var, symb1, symb2, label, jump_when = instruction.args
+        result = TRUE if result else FALSE
+        self.__insert_to_frame(var, result, True)
+        if label.name not in self._label_index:
+            ErrorHandler.raise_error("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+        if result is jump_when.value:
+            self._pc = self._label_index[label.name]
+
+    def _eq_jump(self, instruction):
+        self._compare_jump(instruction, self._equals(instruction.args[1], instruction.args[2], instruction))
+
+    def _lt_jump(self, instruction):
+        symb1 = self._symb(instruction.args[1])
+        symb2 = self._symb(instruction.args[2])
+        if symb1.tag != symb2.tag or symb1.tag == TYPE_NIL:
+            self._invalid_op(instruction)
+        self._compare_jump(instruction, symb1.data < symb2.data)
+
+    def _gt_jump(self, instruction):
+        symb1 = self._symb(instruction.args[1])
+        symb2 = self._symb(instruction.args[2])
+        if symb1.tag != symb2.tag or symb1.tag == TYPE_NIL:
+            self._invalid_op(instruction)
+        self._compare_jump(instruction, symb1.data > symb2.data)
 
     def _exit(self, instruction):
-        exit_code = self._arg1_temp_val['text']
-        try:
-            if 0 <= exit_code < 50:
-                sys.exit(exit_code)
-            else:
-                ErrorHandler.exit_with_message("failed to exit invalid err code: " + str(exit_code),
-                                               ErrorHandler.ERROR_WRONG_OP_VALUE)
-        except Exception as e:
-            ErrorHandler.exit_with_message("failed to exit convert err: " + str(e), ErrorHandler.ERROR_INVALID_OP)
+        symb = self._symb(instruction.args[0])
+        if symb.tag != TYPE_INT:
+            self._invalid_op(instruction)
+        exit_code = symb.data
+        if 0 <= exit_code < 50:
+            self._output.flush()
+            raise ProgramExit(exit_code)
+        else:
+            ErrorHandler.raise_error("failed to exit invalid err code: " + str(exit_code),
+                                     ErrorHandler.ERROR_WRONG_OP_VALUE)
 
     def _dprint(self, instruction):
         pass
@@ -622,128 +1890,299 @@ class InterpretWorker(DataStore):
     def _break(self, instruction):
         pass
 
-    def _execute_instruction(self, instruction):
-        """
-        Method called from start_interpret check data, get data from frame and execute instruction
-        :param instruction:
-        :return:
-        """
-
-        # reset data store
-        self._arg1_temp_val = self._arg2_temp_val = self._arg3_temp_val = None
-
-        # iterate over arguments and set data to DataStore
-        for arg, arg_data in instruction['args'].items():
-            if ValidateArguments.is_const(arg_data):
-                # if type should be int, try to convert
-                if arg_data['type'] == 'int':
-                    try:
-                        arg_data['text'] = int(arg_data['text'])
-                    except Exception as e:
-                        ErrorHandler.exit_with_message("Execute unable to convert to int" + str(e),
-                                                       ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
-                # if bool try to match
-                elif arg_data['type'] == 'bool':
-                    if arg_data['text'] == 'true':
-                        arg_data['text'] = True
-                    elif arg_data['text'] == 'false':
-                        arg_data['text'] = False
-                    else:
-                        ErrorHandler.exit_with_message("not boolean", ErrorHandler.ERROR_INVALID_OP)
-                # if it's string, check if it contains escaped string to replace
-                elif arg_data['type'] == 'string':
-                    arg_data['text'] = ValidateArguments.escape_string(arg_data['text'])
-                # check nil type
-                if arg_data['type'] == 'nil' and arg_data['text'] != 'nil':
-                    ErrorHandler.exit_with_message("not boolean", ErrorHandler.ERROR_INVALID_OP)
-
-            # Get data from variable if var not supposed to be written
-            if (ValidateArguments.is_var(arg_data) and arg in ('arg2', 'arg3')) or \
-                    (instruction['opcode'] in ('WRITE', 'EXIT', 'PUSHS') and ValidateArguments.is_var(arg_data)):
-                arg_data = self.__get_var_from_frame(arg_data['text'], instruction)
-
-            # save data to DataStore
-            if arg == 'arg1':
-                self._arg1_temp_val = arg_data
-            elif arg == 'arg2':
-                self._arg2_temp_val = arg_data
-            else:
-                self._arg3_temp_val = arg_data
-
-        # Check args specific for these instructions
-        if instruction['opcode'] in ('EXIT') and self._arg1_temp_val['type'] != 'int':
-            ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
-
-        if (instruction['opcode'] in ('AND', 'OR') and
-            (self._arg2_temp_val['type'] != 'bool' or self._arg3_temp_val['type'] != 'bool')) or \
-                instruction['opcode'] == 'NOT' and self._arg2_temp_val['type'] != 'bool':
-            ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
+    # Opcode signature table: opcode -> (operand kinds, allowed types of each operand, handler).
+    # Allowed types are None for operands which are not symbols, handler checks its operands itself.
+    _opcode_table = {
+        'MOVE': (('var', 'symb'), (None, SYMB_TYPES), _move),
+        'CREATEFRAME': ((), (), _createframe),
+        'PUSHFRAME': ((), (), _pushframe),
+        'POPFRAME': ((), (), _popframe),
+        'DEFVAR': (('var',), (None,), _defvar),
+        'CALL': (('label',), (None,), _call),
+        'RETURN': ((), (), _return),
+        'PUSHS': (('symb',), (SYMB_TYPES,), _pushs),
+        'POPS': (('var',), (None,), _pops),
+        'ADD': (('var', 'symb', 'symb'), (None, (TYPE_INT,), (TYPE_INT,)), _add),
+        'SUB': (('var', 'symb', 'symb'), (None, (TYPE_INT,), (TYPE_INT,)), _sub),
+        'MUL': (('var', 'symb', 'symb'), (None, (TYPE_INT,), (TYPE_INT,)), _mul),
+        'IDIV': (('var', 'symb', 'symb'), (None, (TYPE_INT,), (TYPE_INT,)), _idiv),
+        'LT': (('var', 'symb', 'symb'), (None, ORDERED_TYPES, ORDERED_TYPES), _lt),
+        'GT': (('var', 'symb', 'symb'), (None, ORDERED_TYPES, ORDERED_TYPES), _gt),
+        'EQ': (('var', 'symb', 'symb'), (None, SYMB_TYPES, SYMB_TYPES), _eq),
+        'AND': (('var', 'symb', 'symb'), (None, (TYPE_BOOL,), (TYPE_BOOL,)), _and),
+        'OR': (('var', 'symb', 'symb'), (None, (TYPE_BOOL,), (TYPE_BOOL,)), _or),
+        'NOT': (('var', 'symb'), (None, (TYPE_BOOL,)), _not),
+        'INT2CHAR': (('var', 'symb'), (None, (TYPE_INT,)), _int2char),
+        'STRI2INT': (('var', 'symb', 'symb'), (None, (TYPE_STRING,), (TYPE_INT,)), _stri2int),
+        'READ': (('var', 'type'), (None, None), _read),
+        'WRITE': (('symb',), (SYMB_TYPES,), _write),
+        'CONCAT': (('var', 'symb', 'symb'), (None, (TYPE_STRING,), (TYPE_STRING,)), _concat),
+        'STRLEN': (('var', 'symb'), (None, (TYPE_STRING,)), _strlen),
+        'GETCHAR': (('var', 'symb', 'symb'), (None, (TYPE_STRING,), (TYPE_INT,)), _getchar),
+        'SETCHAR': (('var', 'symb', 'symb'), (None, (TYPE_INT,), (TYPE_STRING,)), _setchar),
+        'TYPE': (('var', 'symb'), (None, SYMB_TYPES), _type),
+        'LABEL': (('label',), (None,), _label),
+        'JUMP': (('label',), (None,), _jump),
+        'JUMPIFEQ': (('label', 'symb', 'symb'), (None, SYMB_TYPES, SYMB_TYPES), _jumpifeq),
+        'JUMPIFNEQ': (('label', 'symb', 'symb'), (None, SYMB_TYPES, SYMB_TYPES), _jumpifneq),
+        'EXIT': (('symb',), ((TYPE_INT,),), _exit),
+        'DPRINT': (('symb',), (SYMB_TYPES,), _dprint),
+        'BREAK': ((), (), _break),
+        # STACK extension
+        'CLEARS': ((), (), _clears),
+        'ADDS': ((), (), _adds),
+        'SUBS': ((), (), _subs),
+        'MULS': ((), (), _muls),
+        'IDIVS': ((), (), _idivs),
+        'LTS': ((), (), _lts),
+        'GTS': ((), (), _gts),
+        'EQS': ((), (), _eqs),
+        'ANDS': ((), (), _ands),
+        'ORS': ((), (), _ors),
+        'NOTS': ((), (), _nots),
+        'INT2CHARS': ((), (), _int2chars),
+        'STRI2INTS': ((), (), _stri2ints),
+        'JUMPIFEQS': (('label',), (None,), _jumpifeqs),
+        'JUMPIFNEQS': (('label',), (None,), _jumpifneqs),
+        # superinstructions created by PeepholeOptimizer
+        'DEFVAR_MOVE': (('var', 'symb'), (None, SYMB_TYPES), _defvar_move),
+        'EQ_JUMP': (('var', 'symb', 'symb', 'label', 'symb'), (None, SYMB_TYPES, SYMB_TYPES, None, (TYPE_BOOL,)),
+                    _eq_jump),
+        'LT_JUMP': (('var', 'symb', 'symb', 'label', 'symb'), (None, ORDERED_TYPES, ORDERED_TYPES, None, (TYPE_BOOL,)),
+                    _lt_jump),
+        'GT_JUMP': (('var', 'symb', 'symb', 'label', 'symb'), (None, ORDERED_TYPES, ORDERED_TYPES, None, (TYPE_BOOL,)),
+                    _gt_jump),
+        # any number of symb operands
+        'CONCAT_CHAIN': (('var', 'symb', 'symb'), (None, (TYPE_STRING,), (TYPE_STRING,)), _concat_chain),
+    }
 
-        if instruction['opcode'] in ('ADD', 'SUB', 'IDIV', 'MUL') and \
-                (self._arg2_temp_val['type'] != 'int' or self._arg3_temp_val['type'] != 'int'):
-            ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
-
-        if instruction['opcode'] in ('CONCAT') and \
-                (self._arg2_temp_val['type'] != 'string' or self._arg3_temp_val['type'] != 'string'):
-            ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
+    @staticmethod
+    def opcode_handler(opcode):
+        return InterpretWorker._opcode_table[opcode][2]
 
-        if instruction['opcode'] in ('SETCHAR'):
-            if self._arg2_temp_val['type'] != 'int' or self._arg3_temp_val['type'] != 'string':
-                ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
+    @staticmethod
+    def opcode_signature(opcode):
+        return InterpretWorker._opcode_table[opcode]
 
-        if instruction['opcode'] in ('INT2CHAR'):
-            if self._arg2_temp_val['type'] != 'int':
-                ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
 
-        if instruction['opcode'] in ('STRLEN'):
-            if self._arg2_temp_val['type'] != 'string':
-                ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
+# values of --engine, compiled engine is in compiler.py
+ENGINES = ('reference', 'compiled')
+# passes of PeepholeOptimizer (optimizer.py) and default interval of SamplingProfiler (profiler.py), defined here,
+# so argument parser does not import the modules
+OPTIMIZER_PASSES = ('fold', 'dead', 'defmove', 'cmpjump', 'concat', 'types')
+PROFILE_INTERVAL = 0.001
 
-        if instruction['opcode'] in ('GETCHAR', 'STRI2INT'):
-            if self._arg2_temp_val['type'] != 'string' or self._arg3_temp_val['type'] != 'int':
-                ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
 
-        if instruction['opcode'] in ('LT', 'GT'):
-            if self._arg2_temp_val['type'] != self._arg3_temp_val['type'] or \
-                    (self._arg2_temp_val['type'] == 'nil' or self._arg3_temp_val['type'] == 'nil'):
-                ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
+def engine_class(engine):
+    """
+    Worker class of engine, compiler.py is imported only when compiled engine is used
+    :param engine: name of engine from ENGINES
+    :return: InterpretWorker or its subclass
+    """
+    if engine == 'compiled':
+        from compiler import CompiledWorker
+        return CompiledWorker
+    return InterpretWorker
 
-        if instruction['opcode'] in ('EQ', 'JUMPIFEQ', 'JUMPIFNEQ') and \
-                self._arg2_temp_val['type'] != self._arg3_temp_val['type'] and \
-                (self._arg2_temp_val['type'] != 'nil' and self._arg3_temp_val['type'] != 'nil'):
-            ErrorHandler.exit_with_message("Add invalid op ", ErrorHandler.ERROR_INVALID_OP)
 
-        # Dynamically call function
-        string_name = "_" + instruction['opcode'].lower()
-        func = getattr(self, string_name)
-        func(instruction)
+def load_program(source, optimize=None, source_format='xml'):
+    """
+    Parse, validate and decode program, errors are raised as InterpretError subclasses
+    :param source: XML or IPPcode23 source as bytes
+    :param optimize: names of PeepholeOptimizer passes or None
+    :param source_format: 'xml' or 'ippcode'
+    :return: Program which can be run many times, also from more threads at once
+    """
+    return Program.from_source(io.BytesIO(source), optimize, source_format)
 
 
-def main():
-    parser = argparse.ArgumentParser()
+def run(program, stdin=b'', stats=None, engine='reference', max_call_depth=InterpretWorker.MAX_CALL_DEPTH,
+        limits=None, optimize=None):
+    """
+    Run program in memory without touching process state, every call has its own frames, stacks and output
+    :param program: XML source as bytes or Program from load_program
+    :param stdin: input of READ as bytes
+    :param stats: ExecutionStats to fill or None
+    :param engine: name of engine from ENGINES
+    :param max_call_depth: maximal number of nested CALLs
+    :param limits: ResourceLimits or None
+    :param optimize: names of PeepholeOptimizer passes used when program is given as source
+    :return: (stdout bytes, stderr bytes, exit code)
+    """
+    stdout = io.BytesIO()
+    output = OutputBuffer(stdout)
+    message = ''
+    try:
+        if not isinstance(program, Program):
+            program = load_program(program, optimize)
+        engine_class(engine)(program, output, InputReader(io.BytesIO(stdin)), stats, max_call_depth,
+                             limits).start_interpreter()
+        code = 0
+    except ProgramExit as e:
+        code = e.code
+    except InterpretError as e:
+        code = e.code
+        message = str(e) + '\n'
+    output.flush()
+    return stdout.getvalue(), message.encode('utf-8'), code
+
+
+@functools.lru_cache(maxsize=None)
+def argument_parser():
+    """
+    Parser of command line arguments, built once per process
+    :return: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(prog=os.path.basename(__file__))
 
     parser.add_argument("--source")
     parser.add_argument("--input")
-
-    args = parser.parse_args()
+    parser.add_argument("--source-format", choices=sorted(SOURCE_FORMATS), default='xml',
+                        help="ippcode reads IPPcode23 source directly, without parse.php")
+    parser.add_argument("--output", help="write program output to file instead of stdout")
+    parser.add_argument("--output-buffer", type=int, default=OutputBuffer.DEFAULT_SIZE,
+                        help="number of characters buffered before output is written")
+    parser.add_argument("--cache-dir", help="directory of cache with validated and decoded programs")
+    parser.add_argument("--cache-size", type=int, default=ProgramCache.DEFAULT_SIZE,
+                        help="maximal size of cache directory in bytes")
+    parser.add_argument("--stats", help="write execution statistics as JSON to file")
+    parser.add_argument("--opt", nargs='?', const='all',
+                        help="optimize program, comma separated passes from " +
+                             ', '.join(OPTIMIZER_PASSES) + " (default all)")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default='reference',
+                        help="compiled runs basic blocks compiled to Python functions")
+    parser.add_argument("--max-call-depth", type=int, default=InterpretWorker.MAX_CALL_DEPTH,
+                        help="maximal number of nested CALLs, deeper CALL ends with code 59")
+    parser.add_argument("--max-steps", type=int,
+                        help="maximal number of executed instructions, exceeded limit ends with code 60")
+    parser.add_argument("--max-time", type=float,
+                        help="maximal run time in seconds, exceeded limit ends with code 60")
+    parser.add_argument("--max-memory", type=int,
+                        help="maximal estimated memory of program in bytes, exceeded limit ends with code 60")
+    parser.add_argument("--profile", help="write sampled IPPcode23 call stacks in collapsed format to file")
+    parser.add_argument("--profile-interval", type=float, default=PROFILE_INTERVAL,
+                        help="sampling interval of --profile in seconds")
+    return parser
+
+
+def main(argv=None):
+    """
+    Command line interface
+    :param argv: arguments without program name, default sys.argv[1:]
+    """
+    args = argument_parser().parse_args(argv)
     if args.source is None and args.input is None:
         ErrorHandler.exit_with_message("Use at least --source or --input", ErrorHandler.RUN_ERR_MISSING_PARAM)
+    for name in ('max_call_depth', 'max_steps', 'max_time', 'max_memory', 'profile_interval'):
+        if getattr(args, name) is not None and getattr(args, name) <= 0:
+            ErrorHandler.exit_with_message("--%s must be positive" % name.replace('_', '-'),
+                                           ErrorHandler.RUN_ERR_MISSING_PARAM)
+    limits = None
+    if args.max_steps is not None or args.max_time is not None or args.max_memory is not None:
+        limits = ResourceLimits(args.max_steps, args.max_time, args.max_memory)
+    if args.opt is not None:
+        args.opt = args.opt.split(',')
+        from optimizer import PeepholeOptimizer
+        try:
+            PeepholeOptimizer(args.opt)
+        except ValueError as e:
+            ErrorHandler.exit_with_message(e, ErrorHandler.RUN_ERR_MISSING_PARAM)
+
+    if args.output is None:
+        output = OutputBuffer(sys.stdout.buffer, args.output_buffer)
+    else:
+        try:
+            output = OutputBuffer(open(args.output, "wb"), args.output_buffer)
+        except OSError as e:
+            ErrorHandler.exit_with_message("Unable to open output: " + str(e), ErrorHandler.RUN_ERR_OUTFILE_OPEN)
 
     if args.source is None:
         args.source = sys.stdin
 
     if args.input is None:
-        args.input = sys.stdin
-        xml_parser = ParseXML(args.source, args.input)
+        input_reader = InputReader(sys.stdin.buffer, True)
     else:
-        file = open(args.input, "r")
-        xml_parser = ParseXML(args.source, None, file)
-
-    xml_parser.parse_instructions()
+        try:
+            input_reader = InputReader.from_file(args.input)
+        except OSError as e:
+            ErrorHandler.exit_with_message("Unable to open input: " + str(e), ErrorHandler.RUN_ERR_INFILE_OPEN)
+    stats = None
+    if args.stats is not None:
+        try:
+            stats_file = open(args.stats, "w")
+        except OSError as e:
+            ErrorHandler.exit_with_message("Unable to open stats file: " + str(e), ErrorHandler.RUN_ERR_OUTFILE_OPEN)
+        from stats import ExecutionStats
+        stats = ExecutionStats()
+    profiler = None
+    if args.profile is not None:
+        try:
+            profile_file = open(args.profile, "w")
+        except OSError as e:
+            ErrorHandler.exit_with_message("Unable to open profile file: " + str(e), ErrorHandler.RUN_ERR_OUTFILE_OPEN)
+        from profiler import SamplingProfiler
+        profiler = SamplingProfiler(args.profile_interval)
+
+    error = None
+    try:
+        if args.cache_dir is None:
+            program = Program.from_source(args.source, args.opt, args.source_format)
+        else:
+            program = load_cached_program(args)
+        if stats is not None:
+            stats.specialized = program.specialized
+        engine_class(args.engine)(program, output, input_reader, stats, args.max_call_depth, limits,
+                                  profiler).start_interpreter()
+    except ProgramExit as e:
+        sys.exit(e.code)
+    except InterpretError as e:
+        error = e
+    finally:
+        # buffered output is written however the run ends (also by KeyboardInterrupt or crash of interpreter),
+        # statistics also when program ends by EXIT or runtime error
+        output.flush()
+        if stats is not None:
+            stats.write(stats_file)
+        if profiler is not None:
+            profiler.write(profile_file)
+    if error is not None:
+        # reported after flush, so output written before error goes first and stdout and stderr are not reordered
+        ErrorHandler.exit_with_message(error, error.code)
+
+
+def load_cached_program(args):
+    """
+    Load program from cache or parse it and store it to cache, when cache cannot be used
+    program is just parsed
+    :param args: parsed arguments of script
+    :return: Program
+    """
+    try:
+        cache = ProgramCache(args.cache_dir, args.cache_size)
+        if args.source is sys.stdin:
+            source = sys.stdin.buffer.read()
+        else:
+            with open(args.source, 'rb') as file:
+                source = file.read()
+    except OSError:
+        return Program.from_source(args.source, args.opt, args.source_format)
+
+    key = cache.key(source, args.source_format)
+    data = cache.load(key)
+    if data is not None:
+        try:
+            return Program.from_dump(data, args.opt)
+        except (ValueError, TypeError, IndexError):
+            pass
 
-    interpret = InterpretWorker()
-    interpret.start_interpreter()
+    # cache holds program before optimization, so it does not depend on --opt
+    instructions, var_slots = Program.decode_source(io.BytesIO(source), args.source_format)
+    cache.store(key, DecodeOperands.dump_program(instructions, var_slots))
+    return Program(instructions, var_slots, args.opt)
 
 
 if __name__ == "__main__":
+    # optimizer.py, compiler.py, stats.py and profiler.py import this module as interpret, it must not be loaded
+    # second time with its own classes (e.g. InterpretError raised there would not be caught by main)
+    sys.modules['interpret'] = sys.modules[__name__]
     main()
@@ -0,0 +1,511 @@
+"""
+Optimizer of decoded program (--opt) of interpret.py: PeepholeOptimizer, TypeInference and handlers without
+type checks selected by it. Imported by Program only when some pass is requested, so plain runs do not
+pay for compiling and loading it
+"""
+from interpret import (FALSE, OPTIMIZER_PASSES, SYMB_TYPES, TRUE, TYPE_BOOL, TYPE_INT, TYPE_NAMES, TYPE_NIL,
+                       TYPE_STRING, UNINITIALIZED, ConstOperand, ErrorHandler, Instruction, InterpretError,
+                       InterpretWorker, LabelOperand, Program, TypeOperand, Value, VarOperand)
+
+
+class PeepholeOptimizer:
+    """
+    Optional optimization of decoded program (--opt), output and error codes of program stay the same.
+    Jumps can only land on LABEL, so any two neighbouring instructions which are not LABEL always run
+    together and can be replaced by one superinstruction
+
+    Passes
+    -------
+    fold: instruction with only constant operands is replaced by MOVE of its result, instructions which
+          would fail at runtime are left as they are, so the error is still reported
+    dead: instructions unreachable from start are removed, also labels which are never jumped to
+    defmove: DEFVAR followed by MOVE to the same variable becomes DEFVAR_MOVE
+    cmpjump: EQ/LT/GT followed by JUMPIFEQ/JUMPIFNEQ on its result and bool constant becomes EQ_JUMP/LT_JUMP/GT_JUMP
+    concat: CONCAT followed by CONCATs appending to the same variable becomes CONCAT_CHAIN
+    types: instructions with operands of types proven by TypeInference get handler without type checks,
+           runs last, so it sees superinstructions of other passes
+    """
+    PASSES = OPTIMIZER_PASSES
+    FOLDABLE = ('ADD', 'SUB', 'MUL', 'IDIV', 'LT', 'GT', 'EQ', 'AND', 'OR', 'NOT', 'INT2CHAR', 'STRI2INT',
+                'CONCAT', 'STRLEN', 'GETCHAR', 'TYPE')
+    JUMPS = ('JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS', 'CALL')
+    NO_FALLTHROUGH = ('JUMP', 'EXIT', 'RETURN')
+
+    def __init__(self, passes):
+        """
+        :param passes: iterable of pass names, 'all' runs every pass
+        """
+        passes = set(passes)
+        if 'all' in passes:
+            passes = set(self.PASSES)
+        unknown = passes - set(self.PASSES)
+        if unknown:
+            raise ValueError("Unknown optimization " + ', '.join(sorted(unknown)))
+        self.passes = passes
+        self.specialized = 0
+
+    def optimize(self, instructions):
+        """
+        :param instructions: list of decoded Instruction
+        :return: new list of Instruction
+        """
+        if 'fold' in self.passes:
+            # real handlers run on scratch frame of one worker, so folded result is the same as at runtime
+            worker = InterpretWorker(Program([], {'GF': {}, 'LF': {}}), None, None)
+            worker._GF = [UNINITIALIZED]
+            instructions = [self._fold(instruction, worker) for instruction in instructions]
+        if 'dead' in self.passes:
+            instructions = self._remove_dead(instructions)
+        if 'defmove' in self.passes:
+            instructions = self._fuse_pairs(instructions, self._defvar_move)
+        if 'cmpjump' in self.passes:
+            instructions = self._fuse_pairs(instructions, self._compare_jump)
+        if 'concat' in self.passes:
+            instructions = self._concat_chains(instructions)
+        if 'types' in self.passes:
+            self.specialized = TypeInference(instructions).specialize()
+        return instructions
+
+    @staticmethod
+    def _same_var(first, second):
+        return (type(first) is VarOperand and type(second) is VarOperand
+                and first.frame == second.frame and first.slot == second.slot)
+
+    def _fold(self, instruction, worker):
+        if instruction.opcode not in self.FOLDABLE:
+            return instruction
+        var, *symbs = instruction.args
+        if type(var) is not VarOperand or any(type(symb) is not ConstOperand for symb in symbs):
+            return instruction
+
+        worker._GF[0] = UNINITIALIZED
+        scratch = Instruction(instruction.order, instruction.opcode, (VarOperand('GF', var.name, 0),) + tuple(symbs))
+        try:
+            InterpretWorker.opcode_handler(instruction.opcode)(worker, scratch)
+        except (InterpretError, ArithmeticError):
+            # e.g. OverflowError of IDIV on huge constants, left to runtime, where it happens only if reached
+            return instruction
+        return Instruction(instruction.order, 'MOVE', (var, ConstOperand(worker._GF[0])))
+
+    def _remove_dead(self, instructions):
+        labels = {instruction.args[0].name: index for index, instruction in enumerate(instructions)
+                  if instruction.opcode == 'LABEL'}
+        reachable = [False] * len(instructions)
+        referenced = set()
+        pending = [0]
+        while pending:
+            index = pending.pop()
+            if index >= len(instructions) or reachable[index]:
+                continue
+            reachable[index] = True
+            instruction = instructions[index]
+            if instruction.opcode in self.JUMPS and type(instruction.args[0]) is LabelOperand:
+                name = instruction.args[0].name
+                referenced.add(name)
+                if name in labels:
+                    pending.append(labels[name])
+            if instruction.opcode not in self.NO_FALLTHROUGH:
+                pending.append(index + 1)
+
+        return [instruction for index, instruction in enumerate(instructions)
+                if reachable[index] and (instruction.opcode != 'LABEL' or instruction.args[0].name in referenced)]
+
+    @staticmethod
+    def _fuse_pairs(instructions, fuse):
+        """
+        Replace neighbouring pairs for which fuse returns superinstruction
+        :param fuse: function (first, second) -> Instruction or None
+        """
+        result = []
+        index = 0
+        while index < len(instructions):
+            fused = None
+            if index + 1 < len(instructions):
+                fused = fuse(instructions[index], instructions[index + 1])
+            if fused is None:
+                result.append(instructions[index])
+                index += 1
+            else:
+                result.append(fused)
+                index += 2
+        return result
+
+    def _defvar_move(self, first, second):
+        if first.opcode == 'DEFVAR' and second.opcode == 'MOVE' and self._same_var(first.args[0], second.args[0]):
+            return Instruction(first.order, 'DEFVAR_MOVE', second.args)
+        return None
+
+    def _compare_jump(self, first, second):
+        if first.opcode not in ('EQ', 'LT', 'GT') or second.opcode not in ('JUMPIFEQ', 'JUMPIFNEQ'):
+            return None
+        label, symb1, symb2 = second.args
+        if type(symb1) is ConstOperand:
+            symb1, symb2 = symb2, symb1
+        if not self._same_var(first.args[0], symb1) or type(symb2) is not ConstOperand or symb2.value.tag != TYPE_BOOL:
+            return None
+        # jump when result of comparison is this value
+        jump_when = symb2.value.data == (second.opcode == 'JUMPIFEQ')
+        return Instruction(first.order, first.opcode + '_JUMP', first.args + (label, ConstOperand(TRUE if jump_when else FALSE)))
+
+    def _concat_chains(self, instructions):
+        result = []
+        index = 0
+        while index < len(instructions):
+            first = instructions[index]
+            index += 1
+            if first.opcode != 'CONCAT':
+                result.append(first)
+                continue
+            var = first.args[0]
+            parts = list(first.args[1:])
+            # CONCAT var var symb, symb must not be var itself, it would read intermediate value
+            while (index < len(instructions) and instructions[index].opcode == 'CONCAT'
+                   and self._same_var(instructions[index].args[0], var)
+                   and self._same_var(instructions[index].args[1], var)
+                   and not self._same_var(instructions[index].args[2], var)):
+                parts.append(instructions[index].args[2])
+                index += 1
+            if len(parts) == 2:
+                result.append(first)
+            else:
+                result.append(Instruction(first.order, 'CONCAT_CHAIN', (var,) + tuple(parts)))
+        return result
+
+
+class TypeInference:
+    """
+    Data-flow analysis of global frame variables over control-flow graph given by labels, for each
+    instruction it finds possible types of every GF variable. Instruction whose operands are constants
+    or GF variables with one proven type and whose target is proven defined GF variable gets unchecked
+    handler, all other instructions keep checked handler with all error codes.
+
+    State of variable is bit mask of possible tags (1 << tag) and MAY_UNINITIALIZED, MAY_UNDEFINED.
+    CALL continues at label, RETURN continues after every CALL, error just stops the path, so state
+    after instruction can be refined by types which instruction accepted.
+    """
+    MAY_UNINITIALIZED = 1 << 4
+    MAY_UNDEFINED = 1 << 5
+    ANY_VALUE = (1 << TYPE_NIL) | (1 << TYPE_INT) | (1 << TYPE_BOOL) | (1 << TYPE_STRING)
+    UNKNOWN = ANY_VALUE | MAY_UNINITIALIZED | MAY_UNDEFINED
+
+    # type of result written to first operand
+    RESULT_TYPES = {
+        'ADD': TYPE_INT, 'SUB': TYPE_INT, 'MUL': TYPE_INT, 'IDIV': TYPE_INT, 'STRLEN': TYPE_INT, 'STRI2INT': TYPE_INT,
+        'LT': TYPE_BOOL, 'GT': TYPE_BOOL, 'EQ': TYPE_BOOL, 'AND': TYPE_BOOL, 'OR': TYPE_BOOL, 'NOT': TYPE_BOOL,
+        'EQ_JUMP': TYPE_BOOL, 'LT_JUMP': TYPE_BOOL, 'GT_JUMP': TYPE_BOOL,
+        'INT2CHAR': TYPE_STRING, 'CONCAT': TYPE_STRING, 'GETCHAR': TYPE_STRING, 'SETCHAR': TYPE_STRING,
+        'TYPE': TYPE_STRING, 'CONCAT_CHAIN': TYPE_STRING,
+    }
+    # symb operands of these are not type-checked by handler, DPRINT does not read them at all and TYPE
+    # accepts also uninitialized variable, so successful execution proves nothing about them
+    UNCHECKED_OPERANDS = ('TYPE', 'DPRINT')
+    # index of label operand of conditional jumps
+    CONDITIONAL_JUMPS = {'JUMPIFEQ': 0, 'JUMPIFNEQ': 0, 'JUMPIFEQS': 0, 'JUMPIFNEQS': 0, 'EQ_JUMP': 3, 'LT_JUMP': 3,
+                         'GT_JUMP': 3}
+
+    def __init__(self, instructions):
+        self.instructions = instructions
+        self.labels = {instruction.args[0].name: index for index, instruction in enumerate(instructions)
+                       if instruction.opcode == 'LABEL'}
+        self.return_sites = [index + 1 for index, instruction in enumerate(instructions) if instruction.opcode == 'CALL']
+        slots = [arg.slot for instruction in instructions for arg in instruction.args
+                 if type(arg) is VarOperand and arg.frame == 'GF']
+        self.slot_count = max(slots) + 1 if slots else 0
+
+    def _successors(self, index, instruction):
+        opcode = instruction.opcode
+        if opcode in ('JUMP', 'CALL') or opcode in self.CONDITIONAL_JUMPS:
+            label = instruction.args[self.CONDITIONAL_JUMPS.get(opcode, 0)]
+            targets = [self.labels[label.name]] if type(label) is LabelOperand and label.name in self.labels else []
+            if opcode in self.CONDITIONAL_JUMPS:
+                targets.append(index + 1)
+            return targets
+        if opcode == 'RETURN':
+            return self.return_sites
+        if opcode == 'EXIT':
+            return []
+        return [index + 1]
+
+    @staticmethod
+    def _operands(instruction):
+        """
+        :return: list of (operand, kind, allowed types), CONCAT_CHAIN repeats signature of its last symb
+        """
+        kinds, types, handler = InterpretWorker.opcode_signature(instruction.opcode)
+        extra = len(instruction.args) - len(kinds)
+        if extra > 0:
+            kinds = kinds + kinds[-1:] * extra
+            types = types + types[-1:] * extra
+        return list(zip(instruction.args, kinds, types))
+
+    def _mask(self, operand, state):
+        if type(operand) is ConstOperand:
+            return 1 << operand.value.tag
+        if type(operand) is VarOperand and operand.frame == 'GF':
+            return state[operand.slot]
+        return self.UNKNOWN
+
+    def _transfer(self, instruction, state):
+        """
+        :return: state after successful execution of instruction
+        """
+        opcode = instruction.opcode
+        operands = self._operands(instruction)
+        state = list(state)
+        args = instruction.args
+
+        # operand read without error has value of accepted type
+        if opcode not in self.UNCHECKED_OPERANDS:
+            for arg, kind, allowed in operands:
+                if kind == 'symb' and type(arg) is VarOperand and arg.frame == 'GF':
+                    state[arg.slot] &= sum(1 << tag for tag in allowed)
+
+        target = args[0] if args else None
+        if not operands or operands[0][1] != 'var' or type(target) is not VarOperand or target.frame != 'GF':
+            return tuple(state)
+        if opcode == 'DEFVAR':
+            state[target.slot] = self.MAY_UNINITIALIZED
+        elif opcode in ('MOVE', 'DEFVAR_MOVE'):
+            state[target.slot] = self._mask(args[1], state) & self.ANY_VALUE
+        elif opcode == 'READ':
+            read_type = TYPE_NAMES.index(args[1].name) if type(args[1]) is TypeOperand and args[1].name in TYPE_NAMES \
+                else TYPE_NIL
+            state[target.slot] = (1 << read_type) | (1 << TYPE_NIL)
+        elif opcode in self.RESULT_TYPES:
+            state[target.slot] = 1 << self.RESULT_TYPES[opcode]
+        else:
+            # POPS
+            state[target.slot] = self.ANY_VALUE
+        return tuple(state)
+
+    def analyze(self):
+        """
+        :return: list of states before each instruction, None for unreachable instruction
+        """
+        states = [None] * len(self.instructions)
+        if not self.instructions:
+            return states
+        states[0] = (self.MAY_UNDEFINED,) * self.slot_count
+        pending = [0]
+        while pending:
+            index = pending.pop()
+            result = self._transfer(self.instructions[index], states[index])
+            for successor in self._successors(index, self.instructions[index]):
+                if successor >= len(self.instructions):
+                    continue
+                old = states[successor]
+                new = result if old is None else tuple(a | b for a, b in zip(old, result))
+                if new != old:
+                    states[successor] = new
+                    pending.append(successor)
+        return states
+
+    def _proven(self, instruction, state):
+        """
+        Check if instruction can use unchecked handler in given state
+        """
+        opcode = instruction.opcode
+        tags = []
+        for arg, kind, allowed in self._operands(instruction):
+            if kind == 'var':
+                if type(arg) is not VarOperand or arg.frame != 'GF' or state[arg.slot] & self.MAY_UNDEFINED:
+                    return False
+            elif kind == 'symb':
+                mask = self._mask(arg, state)
+                if type(arg) is VarOperand and arg.frame != 'GF':
+                    return False
+                tag = {1 << tag: tag for tag in SYMB_TYPES}.get(mask)
+                if tag is None or tag not in allowed:
+                    return False
+                tags.append(tag)
+        if opcode in ('LT', 'GT', 'LT_JUMP', 'GT_JUMP'):
+            return tags[0] == tags[1]
+        if opcode in ('EQ', 'JUMPIFEQ', 'JUMPIFNEQ', 'EQ_JUMP'):
+            return tags[0] == tags[1] or TYPE_NIL in tags
+        return True
+
+    def specialize(self):
+        """
+        Select unchecked handlers for proven instructions
+        :return: number of specialized instructions
+        """
+        count = 0
+        for instruction, state in zip(self.instructions, self.analyze()):
+            handler = UNCHECKED_HANDLERS.get(instruction.opcode)
+            if state is not None and handler is not None and self._proven(instruction, state):
+                instruction.handler = handler
+                count += 1
+        return count
+
+
+# Unchecked handlers selected by TypeInference, called as handlers of InterpretWorker with the worker as first
+# argument, operands are constants or GF variables of proven type and target is defined GF variable, checks
+# of values (zero, index, label) are kept
+
+def _value(worker, operand):
+    return operand.value if type(operand) is ConstOperand else worker._GF[operand.slot]
+
+
+def _add_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    worker._GF[var.slot] = Value(TYPE_INT, _value(worker, symb1).data + _value(worker, symb2).data)
+
+
+def _sub_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    worker._GF[var.slot] = Value(TYPE_INT, _value(worker, symb1).data - _value(worker, symb2).data)
+
+
+def _mul_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    worker._GF[var.slot] = Value(TYPE_INT, _value(worker, symb1).data * _value(worker, symb2).data)
+
+
+def _idiv_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    symb2 = _value(worker, symb2).data
+    if symb2 == 0:
+        ErrorHandler.raise_error('Divide by zero', ErrorHandler.ERROR_WRONG_OP_VALUE)
+    worker._GF[var.slot] = Value(TYPE_INT, int(_value(worker, symb1).data / symb2))
+
+
+def _lt_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    worker._GF[var.slot] = TRUE if _value(worker, symb1).data < _value(worker, symb2).data else FALSE
+
+
+def _gt_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    worker._GF[var.slot] = TRUE if _value(worker, symb1).data > _value(worker, symb2).data else FALSE
+
+
+def _equals_unchecked(worker, symb1, symb2):
+    symb1 = _value(worker, symb1)
+    symb2 = _value(worker, symb2)
+    return symb1.tag == symb2.tag and symb1.data == symb2.data
+
+
+def _eq_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    worker._GF[var.slot] = TRUE if _equals_unchecked(worker, symb1, symb2) else FALSE
+
+
+def _and_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    worker._GF[var.slot] = TRUE if _value(worker, symb1).data and _value(worker, symb2).data else FALSE
+
+
+def _or_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    worker._GF[var.slot] = TRUE if _value(worker, symb1).data or _value(worker, symb2).data else FALSE
+
+
+def _not_unchecked(worker, instruction):
+    var, symb = instruction.args
+    worker._GF[var.slot] = FALSE if _value(worker, symb).data else TRUE
+
+
+def _concat_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    if worker._same_var(var, symb1):
+        worker._GF[var.slot] = worker._append(worker._GF[var.slot], _value(worker, symb2).data)
+    else:
+        worker._GF[var.slot] = Value(TYPE_STRING, _value(worker, symb1).data + _value(worker, symb2).data)
+
+
+def _strlen_unchecked(worker, instruction):
+    var, symb = instruction.args
+    worker._GF[var.slot] = Value(TYPE_INT, len(worker._chars(_value(worker, symb))))
+
+
+def _string_index_unchecked(worker, instruction):
+    var, symb1, symb2 = instruction.args
+    string = worker._chars(_value(worker, symb1))
+    index = _value(worker, symb2).data
+    if 0 > index or index >= len(string):
+        ErrorHandler.raise_error('Invalid arr index: out of range', ErrorHandler.ERROR_WRONG_STRING_OPERATION)
+    return var, string, index
+
+
+def _getchar_unchecked(worker, instruction):
+    var, string, index = _string_index_unchecked(worker, instruction)
+    worker._GF[var.slot] = Value(TYPE_STRING, string[index])
+
+
+def _stri2int_unchecked(worker, instruction):
+    var, string, index = _string_index_unchecked(worker, instruction)
+    worker._GF[var.slot] = Value(TYPE_INT, ord(string[index]))
+
+
+def _jumpifeq_unchecked(worker, instruction):
+    label, symb1, symb2 = instruction.args
+    if label.name not in worker._label_index:
+        ErrorHandler.raise_error("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+    if _equals_unchecked(worker, symb1, symb2):
+        worker._pc = worker._label_index[label.name]
+
+
+def _jumpifneq_unchecked(worker, instruction):
+    label, symb1, symb2 = instruction.args
+    if label.name not in worker._label_index:
+        ErrorHandler.raise_error("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+    if not _equals_unchecked(worker, symb1, symb2):
+        worker._pc = worker._label_index[label.name]
+
+
+def _compare_jump_unchecked(worker, instruction, result):
+    var, symb1, symb2, label, jump_when = instruction.args
+    result = TRUE if result else FALSE
+    worker._GF[var.slot] = result
+    if label.name not in worker._label_index:
+        ErrorHandler.raise_error("Label not found", ErrorHandler.ERROR_SEMANTIC_XML_INPUT)
+    if result is jump_when.value:
+        worker._pc = worker._label_index[label.name]
+
+
+def _eq_jump_unchecked(worker, instruction):
+    _compare_jump_unchecked(worker, instruction, _equals_unchecked(worker, instruction.args[1], instruction.args[2]))
+
+
+def _lt_jump_unchecked(worker, instruction):
+    args = instruction.args
+    _compare_jump_unchecked(worker, instruction, _value(worker, args[1]).data < _value(worker, args[2]).data)
+
+
+def _gt_jump_unchecked(worker, instruction):
+    args = instruction.args
+    _compare_jump_unchecked(worker, instruction, _value(worker, args[1]).data > _value(worker, args[2]).data)
+
+
+def _concat_chain_unchecked(worker, instruction):
+    var, *symbs = instruction.args
+    if worker._same_var(var, symbs[0]):
+        worker._GF[var.slot] = worker._append(worker._GF[var.slot], ''.join([_value(worker, symb).data
+                                                                              for symb in symbs[1:]]))
+    else:
+        worker._GF[var.slot] = Value(TYPE_STRING, ''.join([_value(worker, symb).data for symb in symbs]))
+
+
+# opcode -> handler without type checks used by TypeInference
+UNCHECKED_HANDLERS = {
+    'ADD': _add_unchecked,
+    'SUB': _sub_unchecked,
+    'MUL': _mul_unchecked,
+    'IDIV': _idiv_unchecked,
+    'LT': _lt_unchecked,
+    'GT': _gt_unchecked,
+    'EQ': _eq_unchecked,
+    'AND': _and_unchecked,
+    'OR': _or_unchecked,
+    'NOT': _not_unchecked,
+    'CONCAT': _concat_unchecked,
+    'STRLEN': _strlen_unchecked,
+    'GETCHAR': _getchar_unchecked,
+    'STRI2INT': _stri2int_unchecked,
+    'JUMPIFEQ': _jumpifeq_unchecked,
+    'JUMPIFNEQ': _jumpifneq_unchecked,
+    'EQ_JUMP': _eq_jump_unchecked,
+    'LT_JUMP': _lt_jump_unchecked,
+    'GT_JUMP': _gt_jump_unchecked,
+    'CONCAT_CHAIN': _concat_chain_unchecked,
+}
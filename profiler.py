@@ -0,0 +1,103 @@
+"""
+Sampling profiler of IPPcode23 programs run by interpret.py (--profile), imported only when profile is requested
+"""
+import signal
+import sys
+
+from interpret import PROFILE_INTERVAL
+
+
+class SamplingProfiler:
+    """
+    Sampling profiler of IPPcode23 program (--profile), wall clock timer signal (SIGALRM) interrupts
+    interpretation every interval seconds and handler records logical call stack: label of each CALL
+    in call stack (instruction before return address is the CALL) and currently executed instruction.
+    Signal can come in the middle of handler of CALL or RETURN, so the stack is recorded only after
+    the sampled instruction ends (profile hook waits for start of next instruction), CALL is thus charged
+    to the called function and RETURN to the function it returns to. Interpretation loop is not changed,
+    so cost is only the handler and the hook, which copies call stack of at most MAX_STACK innermost frames. Result is written as collapsed stacks ("main;f;g;ADD:12 37"), input
+    of flamegraph.pl and other flame graph tools. Signals are handled only by main thread. Wall clock is used,
+    because timers of CPU time have resolution of kernel tick (often 4 ms), time spent in READ is also sampled
+    """
+    TIMER = signal.ITIMER_REAL
+    SIGNAL = signal.SIGALRM
+    DEFAULT_INTERVAL = PROFILE_INTERVAL
+    MAX_STACK = 256
+    ROOT = 'main'
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        """
+        :param interval: sampling interval in seconds
+        """
+        self.interval = interval
+        self.samples = {}       # (return addresses, order of instruction, truncated) -> number of samples
+        self._worker = None
+        self._program = []
+        self._previous = None
+        self._previous_profile = None
+        self._pending = 0           # samples of running instruction, recorded when it ends
+        self._pending_order = 0
+
+    def start(self, worker, program):
+        self._worker = worker
+        self._program = program
+        self._previous_profile = sys.getprofile()
+        self._previous = signal.signal(self.SIGNAL, self._sample)
+        signal.setitimer(self.TIMER, self.interval, self.interval)
+
+    def stop(self):
+        if self._previous is None:
+            return
+        signal.setitimer(self.TIMER, 0)
+        signal.signal(self.SIGNAL, self._previous)
+        self._previous = None
+        # last instruction ended by end of program, EXIT or error
+        if self._pending:
+            self._record()
+
+    def _sample(self, signum, frame):
+        if self._pending:
+            self._pending += 1
+            return
+        self._pending = 1
+        self._pending_order = self._worker._order_count
+        sys.setprofile(self._after_instruction)
+
+    def _after_instruction(self, frame, event, arg):
+        # handler of next instruction is called only after _order_count changes, so sampled one has ended
+        if self._worker._order_count != self._pending_order:
+            self._record()
+
+    def _record(self):
+        sys.setprofile(self._previous_profile)
+        call_stack = self._worker._call_stack
+        key = (tuple(call_stack[-self.MAX_STACK:]), self._pending_order, len(call_stack) > self.MAX_STACK)
+        self.samples[key] = self.samples.get(key, 0) + self._pending
+        self._pending = 0
+
+    def _function(self, return_address):
+        instruction = self._program[return_address - 1]
+        if instruction.opcode == 'CALL':
+            return instruction.args[0].name
+        return '?%d' % return_address
+
+    def collapsed(self):
+        """
+        :return: dict collapsed stack -> number of samples
+        """
+        opcodes = {instruction.order: instruction.opcode for instruction in self._program}
+        result = {}
+        for (call_stack, order, truncated), count in self.samples.items():
+            frames = [self.ROOT]
+            if truncated:
+                frames.append('[truncated]')
+            frames.extend(self._function(address) for address in call_stack)
+            frames.append('%s:%d' % (opcodes[order], order) if order in opcodes else 'start')
+            stack = ';'.join(frames)
+            result[stack] = result.get(stack, 0) + count
+        return result
+
+    def write(self, file):
+        for stack, count in sorted(self.collapsed().items()):
+            file.write('%s %d\n' % (stack, count))
+        file.flush()
@@ -0,0 +1,204 @@
+"""
+Pre-forking server of interpret.py, removes cost of interpreter start (Python startup, imports, building
+of argument parser) from each run of short program
+
+Server imports and warms up interpreter once, listens on Unix socket and keeps --workers forked children
+waiting for connection. Each child handles exactly one request and exits, so every run has fresh state
+copied from warm server and the server replaces it by new child. Client (client.py) sends its working
+directory and arguments of interpret.py together with its stdin, stdout and stderr descriptors (SCM_RIGHTS),
+child runs interpret.main on them and returns exit code, output and errors therefore go directly to
+the client's descriptors, same as with plain interpret.py.
+
+Protocol: request is 4 byte length and NUL separated working directory and arguments, sent together with
+three descriptors, child answers with its pid (client forwards SIGINT and SIGTERM to it) and after run
+with exit code, both as 4 byte signed integers.
+
+Socket is created only for owner of server, connections from other users are refused.
+
+Usage: python server.py [--socket PATH] [--workers N]
+"""
+import argparse
+import os
+import signal
+import socket
+import struct
+import sys
+import traceback
+
+import interpret
+from client import DEFAULT_SOCKET, HEADER, SOCKET_ENV, socket_path
+
+MAX_REQUEST = 1 << 20
+RC_INTERRUPTED = 128 + signal.SIGINT
+
+# program run by warm up, touches parser, optimizer, engines and output so they are loaded before fork
+WARM_UP = b'''<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode23">
+<instruction order="1" opcode="DEFVAR"><arg1 type="var">GF@a</arg1></instruction>
+<instruction order="2" opcode="MOVE"><arg1 type="var">GF@a</arg1><arg2 type="string">a\\032b</arg2></instruction>
+<instruction order="3" opcode="CONCAT"><arg1 type="var">GF@a</arg1><arg2 type="var">GF@a</arg2>
+<arg3 type="string">c</arg3></instruction>
+<instruction order="4" opcode="WRITE"><arg1 type="var">GF@a</arg1></instruction>
+</program>
+'''
+
+
+def warm_up():
+    """
+    Load everything that interpreter loads lazily, so children only copy it
+    """
+    interpret.argument_parser()
+    # modules of --stats and --profile, optimizer and compiled engine are loaded by the runs below
+    import profiler  # noqa: F401
+    import stats  # noqa: F401
+    for engine in interpret.ENGINES:
+        interpret.run(WARM_UP, engine=engine)
+        interpret.run(interpret.load_program(WARM_UP, ['all']), engine=engine)
+
+
+def receive_request(connection):
+    """
+    :return: (working directory, arguments, descriptors of stdin, stdout and stderr)
+    """
+    data, fds, _, _ = socket.recv_fds(connection, MAX_REQUEST, 3)
+    if len(fds) != 3:
+        raise ValueError('Request without stdin, stdout and stderr descriptors')
+    while len(data) < HEADER.size or len(data) < HEADER.size + HEADER.unpack_from(data)[0]:
+        chunk = connection.recv(MAX_REQUEST)
+        if not chunk:
+            raise ValueError('Incomplete request')
+        data += chunk
+    fields = data[HEADER.size:].decode('utf-8', 'surrogateescape').split('\0')
+    return fields[0], fields[1:], fds
+
+
+def redirect(fds):
+    """
+    Replace standard streams of child by descriptors of client
+    """
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdin = open(0, 'r', closefd=False)
+    sys.stdout = open(1, 'w', buffering=1 if os.isatty(1) else -1, closefd=False)
+    sys.stderr = open(2, 'w', buffering=1, errors='backslashreplace', closefd=False)
+
+
+def run_main(args):
+    """
+    Run interpret.main same as interpret.py run as script
+    :return: exit code
+    """
+    code = 0
+    try:
+        interpret.main(args)
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code & 0xFF
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except KeyboardInterrupt:
+        traceback.print_exc()
+        code = RC_INTERRUPTED
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except (OSError, ValueError):
+            pass
+    return code
+
+
+def child(listener):
+    """
+    Handle one request in forked child, never returns
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    code = 1
+    try:
+        connection, _ = listener.accept()
+        listener.close()
+        uid = struct.unpack('3i', connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                        struct.calcsize('3i')))[1]
+        if uid != os.getuid():
+            os._exit(1)
+        cwd, args, fds = receive_request(connection)
+        connection.sendall(HEADER.pack(os.getpid()))
+        redirect(fds)
+        os.chdir(cwd)
+        sys.argv = ['interpret.py'] + args
+        code = run_main(args)
+        connection.sendall(HEADER.pack(code))
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(code)
+
+
+def spawn(listener):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        child(listener)
+    return pid
+
+
+def _terminate(signum, frame):
+    raise SystemExit(0)
+
+
+def serve(path, workers):
+    """
+    Listen on socket and keep given number of children waiting for requests
+    :param path: path of Unix socket, existing socket is replaced
+    :param workers: number of pre-forked children
+    """
+    warm_up()
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    mask = os.umask(0o077)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(mask)
+    listener.listen(socket.SOMAXCONN)
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+
+    children = set()
+    try:
+        while True:
+            while len(children) < workers:
+                children.add(spawn(listener))
+            pid, _ = os.wait()
+            children.discard(pid)
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        listener.close()
+        os.unlink(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', help='path of Unix socket (default $%s or %s)' % (SOCKET_ENV, DEFAULT_SOCKET))
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of pre-forked children')
+    args = parser.parse_args()
+    if args.workers < 1:
+        sys.exit('--workers must be positive')
+    serve(socket_path(args.socket), args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Execution statistics of interpret.py (--stats), imported only when statistics are requested
+"""
+from interpret import UNINITIALIZED
+
+
+class ExecutionStats:
+    """
+    Statistics of program execution collected when --stats is used, written as JSON.
+    Like STATI extension, LABEL, DPRINT and BREAK are not counted to executed instructions and hot order,
+    per-opcode counts and times contain all instructions
+    """
+    NOT_COUNTED = ('LABEL', 'DPRINT', 'BREAK')
+
+    def __init__(self):
+        self.opcode_counts = {}
+        self.opcode_times = {}     # nanoseconds
+        self.order_counts = {}
+        self.variables = 0         # currently initialized variables in all frames
+        self.max_variables = 0
+        self.max_data_stack = 0
+        self.max_call_stack = 0
+        self.specialized = 0       # instructions specialized by TypeInference, set from Program
+
+    @staticmethod
+    def initialized_in(frame):
+        if frame is None:
+            return 0
+        return sum(1 for data in frame.values() if data is not UNINITIALIZED)
+
+    def result(self):
+        instructions = sum(count for opcode, count in self.opcode_counts.items() if opcode not in self.NOT_COUNTED)
+        hot = None
+        if self.order_counts:
+            # most executed, smallest order on tie
+            hot = min(self.order_counts, key=lambda order: (-self.order_counts[order], order))
+        return {
+            'instructions': instructions,
+            'hot': hot,
+            'hot_count': self.order_counts.get(hot, 0),
+            'vars': self.max_variables,
+            'data_stack': self.max_data_stack,
+            'call_stack': self.max_call_stack,
+            'specialized': self.specialized,
+            'opcodes': {opcode: {'count': count, 'time': self.opcode_times.get(opcode, 0) / 1e9}
+                        for opcode, count in sorted(self.opcode_counts.items())},
+        }
+
+    def write(self, file):
+        import json     # only --stats needs it, import would slow down start of every run
+        json.dump(self.result(), file, indent=2)
+        file.write('\n')
+        file.flush()
@@ -0,0 +1,471 @@
+"""
+Generator of random programs of fuzz/ corpus. Programs are structured so that they run: all GF variables
+are defined and initialized at start, jumps go only to labels of generated if blocks, loops and functions,
+loops have counters not written by their body and functions are called only from lower levels, so every
+program ends. Operands have mostly the type expected by instruction, runtime errors (wrong type, division
+by zero, index out of range) come only now and then.
+
+Expected output and exit code are computed by Model, small independent implementation of IPPcode23
+semantics, so the corpus does not check the interpreter against itself. Generation is deterministic,
+program NNN is generated from seed NNN.
+
+Usage: python tests/differential/generate_fuzz.py [--count N] [--directory DIR]
+"""
+import argparse
+import os
+import random
+import re
+from xml.sax.saxutils import escape
+
+INT_VARS = ['GF@i0', 'GF@i1', 'GF@i2']
+STRING_VARS = ['GF@s0', 'GF@s1']
+BOOL_VARS = ['GF@b0', 'GF@b1']
+NIL_VARS = ['GF@n0']
+VARS = {'int': INT_VARS, 'string': STRING_VARS, 'bool': BOOL_VARS, 'nil': NIL_VARS}
+# strings are never empty, so index 0 is always valid
+STRINGS = ['a', 'ab', 'xyz', 'hello world', 'tab\tx', 'a#b', 'back\\slash', 'žluťoučký', '123']
+ERROR_RATE = 0.005      # probability of operand of wrong type
+
+# operand types and result type of instructions var symb symb
+BINARY = {
+    'ADD': ('int', 'int', 'int'), 'SUB': ('int', 'int', 'int'), 'MUL': ('int', 'int', 'int'),
+    'IDIV': ('int', 'int', 'int'), 'AND': ('bool', 'bool', 'bool'), 'OR': ('bool', 'bool', 'bool'),
+    'CONCAT': ('string', 'string', 'string'), 'GETCHAR': ('string', 'string', 'int'),
+    'STRI2INT': ('int', 'string', 'int'),
+}
+UNARY = {'NOT': ('bool', 'bool'), 'STRLEN': ('int', 'string'), 'INT2CHAR': ('string', 'int')}
+STACK_BINARY = {'ADDS': 'int', 'SUBS': 'int', 'MULS': 'int', 'IDIVS': 'int', 'ANDS': 'bool', 'ORS': 'bool'}
+
+
+def encode_string(text):
+    return ''.join('\\%03d' % ord(char) if ord(char) <= 32 or char in '#\\' else char for char in text)
+
+
+class Generator:
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.instructions = []
+        self.labels = 0
+        self.functions = []         # bodies of functions, function N may call only functions > N
+        self.local = None           # type of LF@a in generated function body, None in main body
+
+    def label(self, prefix):
+        self.labels += 1
+        return '%s%d' % (prefix, self.labels)
+
+    def emit(self, opcode, *args):
+        self.instructions.append((opcode, args))
+
+    def constant(self, type_name):
+        r = self.random
+        if type_name == 'int':
+            return 'int', str(r.choice([0, 1, 2, 3, 5, 7, 10, 42, 100, -1, -7, r.randrange(-1000, 1000)]))
+        if type_name == 'string':
+            return 'string', encode_string(r.choice(STRINGS))
+        if type_name == 'bool':
+            return 'bool', r.choice(['true', 'false'])
+        return 'nil', 'nil'
+
+    def symb(self, type_name):
+        r = self.random
+        if r.random() < ERROR_RATE:
+            type_name = r.choice(list(VARS))
+        if type_name == 'int' and self.local and r.random() < 0.3:
+            return 'var', 'LF@a'
+        if r.random() < 0.6:
+            return 'var', r.choice(VARS[type_name])
+        return self.constant(type_name)
+
+    def target(self, type_name):
+        if type_name == 'int' and self.local and self.random.random() < 0.3:
+            return 'var', 'LF@a'
+        return 'var', self.random.choice(VARS[type_name])
+
+    def statement(self, depth, counters):
+        r = self.random
+        kind = r.random()
+        if kind < 0.3:
+            opcode = r.choice(sorted(BINARY))
+            result, first, second = BINARY[opcode]
+            if opcode == 'GETCHAR' or opcode == 'STRI2INT':
+                index = ('int', '0') if r.random() < 0.9 else ('int', str(r.randrange(1, 4)))
+                self.emit(opcode, self.target(result), self.symb(first), index)
+            elif opcode == 'IDIV' and r.random() < 0.9:
+                self.emit(opcode, self.target(result), self.symb(first), ('int', str(r.choice([1, 2, 3, -4, 7]))))
+            else:
+                self.emit(opcode, self.target(result), self.symb(first), self.symb(second))
+        elif kind < 0.38:
+            opcode = r.choice(['LT', 'GT', 'EQ'])
+            type_name = r.choice(['int', 'string', 'bool'] + (['nil'] if opcode == 'EQ' else []))
+            other = 'nil' if opcode == 'EQ' and r.random() < 0.2 else type_name
+            self.emit(opcode, self.target('bool'), self.symb(type_name), self.symb(other))
+        elif kind < 0.46:
+            opcode = r.choice(sorted(UNARY))
+            result, operand = UNARY[opcode]
+            if opcode == 'INT2CHAR' and r.random() < 0.95:
+                self.emit(opcode, self.target(result), ('int', str(r.choice([65, 97, 122, 32, 269, 382, 8364]))))
+            else:
+                self.emit(opcode, self.target(result), self.symb(operand))
+        elif kind < 0.5:
+            self.emit('SETCHAR', self.target('string'), ('int', '0' if r.random() < 0.9 else '2'),
+                      self.symb('string') if r.random() < 0.2 else ('string', r.choice(['X', 'yz', 'č'])))
+        elif kind < 0.54:
+            type_name = r.choice(list(VARS))
+            self.emit('TYPE', self.target('string'), self.symb(type_name))
+        elif kind < 0.6:
+            type_name = r.choice(list(VARS))
+            self.emit('MOVE', self.target(type_name), self.symb(type_name))
+        elif kind < 0.72:
+            self.emit('WRITE', self.symb(r.choice(['int', 'int', 'string', 'string', 'bool', 'nil'])))
+        elif kind < 0.77:
+            opcode = r.choice(sorted(STACK_BINARY))
+            type_name = STACK_BINARY[opcode]
+            self.emit('PUSHS', self.symb(type_name))
+            self.emit('PUSHS', self.symb(type_name) if opcode != 'IDIVS' else ('int', str(r.choice([1, 2, 5]))))
+            self.emit(opcode)
+            self.emit('POPS', self.target(type_name))
+        elif kind < 0.8:
+            type_name = r.choice(list(VARS))
+            self.emit('PUSHS', self.symb(type_name))
+            self.emit('POPS', self.target(type_name))
+        elif kind < 0.88 and depth < 3:
+            # if block, jump over body
+            end = self.label('skip')
+            type_name = r.choice(['int', 'bool', 'string'])
+            self.emit(r.choice(['JUMPIFEQ', 'JUMPIFNEQ']), ('label', end), self.symb(type_name),
+                      self.symb(type_name) if r.random() < 0.9 else ('nil', 'nil'))
+            self.block(depth + 1, counters)
+            self.emit('LABEL', ('label', end))
+        elif kind < 0.94 and depth < 2 and len(counters) < 2:
+            # loop with own counter, body never writes it
+            counter = 'GF@k%d' % len(counters)
+            loop = self.label('loop')
+            self.emit('MOVE', ('var', counter), ('int', str(r.randrange(1, 5))))
+            self.emit('LABEL', ('label', loop))
+            self.block(depth + 1, counters + [counter])
+            self.emit('SUB', ('var', counter), ('var', counter), ('int', '1'))
+            self.emit('JUMPIFNEQ', ('label', loop), ('var', counter), ('int', '0'))
+        elif self.functions_available():
+            self.call()
+        else:
+            self.emit('WRITE', self.symb('int'))
+
+    def block(self, depth, counters):
+        for _ in range(self.random.randrange(1, 5)):
+            self.statement(depth, counters)
+
+    def functions_available(self):
+        return self.function_index + 1 < self.function_count
+
+    def call(self):
+        callee = self.random.randrange(self.function_index + 1, self.function_count)
+        self.emit('CREATEFRAME')
+        self.emit('DEFVAR', ('var', 'TF@a'))
+        self.emit('MOVE', ('var', 'TF@a'), self.symb('int'))
+        self.emit('CALL', ('label', 'f%d' % callee))
+
+    def generate(self):
+        r = self.random
+        self.function_count = r.randrange(0, 4)
+        self.function_index = -1
+        for names in VARS.values():
+            for name in names:
+                self.emit('DEFVAR', ('var', name))
+        for counter in ('GF@k0', 'GF@k1'):
+            self.emit('DEFVAR', ('var', counter))
+        for type_name, names in VARS.items():
+            for name in names:
+                self.emit('MOVE', ('var', name), self.constant(type_name))
+
+        for _ in range(r.randrange(8, 30)):
+            self.statement(0, [])
+        for names in VARS.values():
+            for name in names:
+                self.emit('WRITE', ('var', name))
+        if r.random() < 0.2:
+            self.emit('EXIT', ('int', str(r.randrange(0, 50))))
+        else:
+            self.emit('JUMP', ('label', 'end'))
+
+        self.local = 'int'
+        for index in range(self.function_count):
+            self.function_index = index
+            self.emit('LABEL', ('label', 'f%d' % index))
+            self.emit('PUSHFRAME')
+            if index == 0 and r.random() < 0.5:
+                # bounded recursion, LF@a is decremented until it is not positive
+                done = self.label('done')
+                self.emit('LT', ('var', 'GF@b1'), ('var', 'LF@a'), ('int', '1'))
+                self.emit('JUMPIFEQ', ('label', done), ('var', 'GF@b1'), ('bool', 'true'))
+                self.emit('GT', ('var', 'GF@b1'), ('var', 'LF@a'), ('int', '20'))
+                self.emit('JUMPIFEQ', ('label', done), ('var', 'GF@b1'), ('bool', 'true'))
+                self.emit('WRITE', ('var', 'LF@a'))
+                self.emit('CREATEFRAME')
+                self.emit('DEFVAR', ('var', 'TF@a'))
+                self.emit('SUB', ('var', 'TF@a'), ('var', 'LF@a'), ('int', '1'))
+                self.emit('CALL', ('label', 'f0'))
+                self.emit('LABEL', ('label', done))
+            self.block(1, [])
+            self.emit('WRITE', ('var', 'LF@a'))
+            self.emit('POPFRAME')
+            self.emit('RETURN')
+        self.emit('LABEL', ('label', 'end'))
+        return self.instructions
+
+
+def to_xml(instructions):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode23">']
+    for order, (opcode, args) in enumerate(instructions, 1):
+        lines.append('<instruction order="%d" opcode="%s">%s</instruction>'
+                     % (order, opcode, ''.join('<arg%d type="%s">%s</arg%d>' % (n, arg_type, escape(text), n)
+                                               for n, (arg_type, text) in enumerate(args, 1))))
+    lines.append('</program>')
+    return '\n'.join(lines) + '\n'
+
+
+class ModelError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class Model:
+    """
+    Reference semantics of instructions used by Generator, values are Python int, str, bool and None (nil)
+    """
+    UNINITIALIZED = object()
+    MAX_STEPS = 100000
+
+    def __init__(self, instructions):
+        self.instructions = instructions
+        self.labels = {args[0][1]: index for index, (opcode, args) in enumerate(instructions) if opcode == 'LABEL'}
+        self.frames = {'GF': {}, 'LF': [], 'TF': None}
+        self.data_stack = []
+        self.call_stack = []
+        self.output = []
+
+    @staticmethod
+    def type_of(value):
+        if value is None:
+            return 'nil'
+        return {bool: 'bool', int: 'int', str: 'string'}[type(value)]
+
+    def frame(self, name):
+        frame_name = name.split('@')[0]
+        if frame_name == 'GF':
+            return self.frames['GF']
+        if frame_name == 'LF':
+            if not self.frames['LF']:
+                raise ModelError(55)
+            return self.frames['LF'][-1]
+        if self.frames['TF'] is None:
+            raise ModelError(55)
+        return self.frames['TF']
+
+    def read(self, arg, allow_uninitialized=False):
+        arg_type, text = arg
+        if arg_type == 'int':
+            return int(text)
+        if arg_type == 'bool':
+            return text == 'true'
+        if arg_type == 'nil':
+            return None
+        if arg_type == 'string':
+            return re.sub(r'\\(\d{3})', lambda match: chr(int(match.group(1))), text)
+        frame = self.frame(text)
+        if text not in frame:
+            raise ModelError(54)
+        value = frame[text]
+        if value is self.UNINITIALIZED and not allow_uninitialized:
+            raise ModelError(56)
+        return value
+
+    def write(self, arg, value):
+        frame = self.frame(arg[1])
+        if arg[1] not in frame:
+            raise ModelError(54)
+        frame[arg[1]] = value
+
+    def typed(self, args, *types):
+        values = [self.read(arg) for arg in args]
+        if any(self.type_of(value) != type_name for value, type_name in zip(values, types)):
+            raise ModelError(53)
+        return values
+
+    def compare(self, opcode, first, second):
+        first_type, second_type = self.type_of(first), self.type_of(second)
+        if opcode == 'EQ':
+            if first_type != second_type and 'nil' not in (first_type, second_type):
+                raise ModelError(53)
+            return first_type == second_type and first == second
+        if first_type != second_type or first_type == 'nil':
+            raise ModelError(53)
+        return first < second if opcode == 'LT' else first > second
+
+    def arithmetic(self, opcode, first, second):
+        if opcode == 'ADD':
+            return first + second
+        if opcode == 'SUB':
+            return first - second
+        if opcode == 'MUL':
+            return first * second
+        if second == 0:
+            raise ModelError(57)
+        # same as interpreter, division is truncated towards zero
+        return int(first / second)
+
+    def run(self):
+        """
+        :return: (output, exit code), None when program does not end in MAX_STEPS
+        """
+        try:
+            code = self.execute()
+        except ModelError as e:
+            code = e.code
+        return ''.join(self.output), code
+
+    def execute(self):
+        pc = 0
+        steps = 0
+        while pc < len(self.instructions):
+            steps += 1
+            if steps > self.MAX_STEPS:
+                return None
+            opcode, args = self.instructions[pc]
+            pc += 1
+            if opcode == 'DEFVAR':
+                frame = self.frame(args[0][1])
+                if args[0][1] in frame:
+                    raise ModelError(52)
+                frame[args[0][1]] = self.UNINITIALIZED
+            elif opcode == 'MOVE':
+                self.write(args[0], self.read(args[1]))
+            elif opcode in ('ADD', 'SUB', 'MUL', 'IDIV'):
+                first, second = self.typed(args[1:], 'int', 'int')
+                self.write(args[0], self.arithmetic(opcode, first, second))
+            elif opcode in ('LT', 'GT', 'EQ'):
+                self.write(args[0], self.compare(opcode, self.read(args[1]), self.read(args[2])))
+            elif opcode in ('AND', 'OR'):
+                first, second = self.typed(args[1:], 'bool', 'bool')
+                self.write(args[0], first and second if opcode == 'AND' else first or second)
+            elif opcode == 'NOT':
+                self.write(args[0], not self.typed(args[1:], 'bool')[0])
+            elif opcode == 'CONCAT':
+                first, second = self.typed(args[1:], 'string', 'string')
+                self.write(args[0], first + second)
+            elif opcode == 'STRLEN':
+                self.write(args[0], len(self.typed(args[1:], 'string')[0]))
+            elif opcode in ('GETCHAR', 'STRI2INT'):
+                string, index = self.typed(args[1:], 'string', 'int')
+                if not 0 <= index < len(string):
+                    raise ModelError(58)
+                self.write(args[0], string[index] if opcode == 'GETCHAR' else ord(string[index]))
+            elif opcode == 'INT2CHAR':
+                code = self.typed(args[1:], 'int')[0]
+                if not 0 <= code <= 0x10FFFF:
+                    raise ModelError(58)
+                self.write(args[0], chr(code))
+            elif opcode == 'SETCHAR':
+                string, index, replacement = self.typed(args, 'string', 'int', 'string')
+                if not 0 <= index < len(string) or not replacement:
+                    raise ModelError(58)
+                self.write(args[0], string[:index] + replacement[0] + string[index + 1:])
+            elif opcode == 'TYPE':
+                value = self.read(args[1], allow_uninitialized=True)
+                self.write(args[0], '' if value is self.UNINITIALIZED else self.type_of(value))
+            elif opcode == 'WRITE':
+                value = self.read(args[0])
+                self.output.append({bool: lambda v: 'true' if v else 'false', type(None): lambda v: ''}
+                                   .get(type(value), str)(value))
+            elif opcode == 'PUSHS':
+                self.data_stack.append(self.read(args[0]))
+            elif opcode == 'POPS':
+                if not self.data_stack:
+                    raise ModelError(56)
+                self.write(args[0], self.data_stack.pop())
+            elif opcode in STACK_BINARY:
+                if len(self.data_stack) < 2:
+                    raise ModelError(56)
+                second = self.data_stack.pop()
+                first = self.data_stack.pop()
+                type_name = STACK_BINARY[opcode]
+                if self.type_of(first) != type_name or self.type_of(second) != type_name:
+                    raise ModelError(53)
+                if type_name == 'int':
+                    self.data_stack.append(self.arithmetic(opcode[:-1], first, second))
+                else:
+                    self.data_stack.append(first and second if opcode == 'ANDS' else first or second)
+            elif opcode == 'LABEL':
+                pass
+            elif opcode == 'JUMP':
+                pc = self.labels[args[0][1]]
+            elif opcode in ('JUMPIFEQ', 'JUMPIFNEQ'):
+                equal = self.compare('EQ', self.read(args[1]), self.read(args[2]))
+                if equal == (opcode == 'JUMPIFEQ'):
+                    pc = self.labels[args[0][1]]
+            elif opcode == 'CREATEFRAME':
+                self.frames['TF'] = {}
+            elif opcode == 'PUSHFRAME':
+                if self.frames['TF'] is None:
+                    raise ModelError(55)
+                self.frames['LF'].append({'LF' + name[2:]: value for name, value in self.frames['TF'].items()})
+                self.frames['TF'] = None
+            elif opcode == 'POPFRAME':
+                if not self.frames['LF']:
+                    raise ModelError(55)
+                self.frames['TF'] = {'TF' + name[2:]: value for name, value in self.frames['LF'].pop().items()}
+            elif opcode == 'CALL':
+                self.call_stack.append(pc)
+                pc = self.labels[args[0][1]]
+            elif opcode == 'RETURN':
+                if not self.call_stack:
+                    raise ModelError(56)
+                pc = self.call_stack.pop()
+            elif opcode == 'EXIT':
+                code = self.typed(args, 'int')[0]
+                if not 0 <= code <= 49:
+                    raise ModelError(57)
+                return code
+            else:
+                raise ValueError('Model does not support ' + opcode)
+        return 0
+
+
+def generate(seed):
+    """
+    :return: (XML source, expected output, expected exit code), output is None when program does not end
+    """
+    instructions = Generator(seed).generate()
+    result = Model(instructions).run()
+    return to_xml(instructions), result[0], result[1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=150)
+    parser.add_argument('--directory', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fuzz'))
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    for name in os.listdir(args.directory):
+        os.unlink(os.path.join(args.directory, name))
+    codes = {}
+    for seed in range(args.count):
+        source, output, code = generate(seed)
+        if code is None:
+            continue
+        base = os.path.join(args.directory, '%03d' % seed)
+        with open(base + '.src', 'w', encoding='utf-8') as file:
+            file.write(source)
+        if output:
+            with open(base + '.out', 'w', encoding='utf-8') as file:
+                file.write(output)
+        if code:
+            with open(base + '.rc', 'w') as file:
+                file.write('%d\n' % code)
+        codes[code] = codes.get(code, 0) + 1
+    print('generated %d programs, exit codes %s' % (sum(codes.values()), dict(sorted(codes.items()))))
+
+
+if __name__ == '__main__':
+    main()
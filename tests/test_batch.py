@@ -0,0 +1,40 @@
+"""
+Tests of batch.py runner
+"""
+import time
+
+import batch
+
+
+def big_program(count):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode23">',
+             '<instruction order="1" opcode="DEFVAR"><arg1 type="var">GF@x</arg1></instruction>']
+    for order in range(2, count + 2):
+        lines.append('<instruction order="%d" opcode="MOVE"><arg1 type="var">GF@x</arg1>'
+                     '<arg2 type="int">%d</arg2></instruction>' % (order, order))
+    lines.append('</program>')
+    return '\n'.join(lines).encode()
+
+
+def test_timeout_during_parsing():
+    # parsing of 50000 instructions takes much longer than timeout, so alarm comes while parser runs
+    source = big_program(50000)
+    start = time.perf_counter()
+    stdout, stderr, code = batch.execute(source, b'', timeout=0.02)
+    assert code == batch.RC_TIMEOUT
+    assert stderr.startswith('Timeout')
+    assert time.perf_counter() - start < 1
+
+
+def test_timeout_during_run():
+    source = b'''<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode23">
+<instruction order="1" opcode="LABEL"><arg1 type="label">loop</arg1></instruction>
+<instruction order="2" opcode="JUMP"><arg1 type="label">loop</arg1></instruction>
+</program>'''
+    assert batch.execute(source, b'', timeout=0.05)[2] == batch.RC_TIMEOUT
+
+
+def test_no_timeout():
+    stdout, stderr, code = batch.execute(big_program(10), b'', timeout=5)
+    assert (stdout, code) == (b'', 0)
@@ -0,0 +1,41 @@
+"""
+Runs differential corpus tests/differential by the same code as batch.py --differential, with and without
+optimizer, and checks that fuzz corpus is up to date with its generator
+"""
+import os
+import sys
+
+import pytest
+
+import batch
+
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'differential')
+TESTS = batch.find_tests(DIRECTORY)
+TIMEOUT = 10
+
+sys.path.insert(0, DIRECTORY)
+import generate_fuzz  # noqa: E402
+
+
+def _name(base):
+    return os.path.relpath(base, DIRECTORY)
+
+
+@pytest.mark.parametrize('optimize', [None, ['all']], ids=['plain', 'opt'])
+@pytest.mark.parametrize('base', TESTS, ids=_name)
+def test_corpus(base, optimize):
+    _, passed, code, expected_rc, _, message = batch.run_test((base, TIMEOUT, 'reference', True, optimize))
+    assert passed, 'rc=%s expected=%s %s' % (code, expected_rc, message)
+
+
+@pytest.mark.parametrize('seed', range(0, 150, 15))
+def test_fuzz_generator(seed):
+    source, output, code = generate_fuzz.generate(seed)
+    base = os.path.join(DIRECTORY, 'fuzz', '%03d' % seed)
+    if code is None:
+        assert not os.path.exists(base + '.src')
+        return
+    with open(base + '.src', encoding='utf-8') as file:
+        assert file.read() == source
+    assert batch._read(base + '.out', b'').decode('utf-8') == output
+    assert int(batch._read(base + '.rc', b'0')) == code
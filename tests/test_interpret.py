@@ -0,0 +1,51 @@
+"""
+Tests of command line interface of interpret.py, run in separate process like by test.php
+"""
+import os
+import subprocess
+import sys
+
+INTERPRET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'interpret.py')
+
+
+def interpret(tmp_path, source, *args):
+    path = tmp_path / 'program.ippcode'
+    path.write_text('.IPPcode23\n' + source)
+    return subprocess.run([sys.executable, INTERPRET, '--source', str(path), '--input', os.devnull,
+                           '--source-format=ippcode'] + list(args), capture_output=True)
+
+
+def test_output_flushed_on_crash(tmp_path):
+    # OverflowError is not InterpretError, output written before it is still flushed in finally
+    result = interpret(tmp_path, 'WRITE string@before\nDEFVAR GF@x\nIDIV GF@x int@1%s int@3\n' % ('0' * 400))
+    assert result.returncode == 1
+    assert result.stdout == b'before'
+    assert b'OverflowError' in result.stderr
+
+
+def test_output_before_error(tmp_path):
+    result = interpret(tmp_path, 'WRITE string@before\nWRITE GF@x\n')
+    assert (result.returncode, result.stdout) == (54, b'before')
+
+
+def test_call_depth_limit(tmp_path):
+    result = interpret(tmp_path, 'LABEL f\nCALL f\n', '--max-call-depth', '10')
+    assert result.returncode == 59
+
+
+def test_max_steps(tmp_path):
+    result = interpret(tmp_path, 'LABEL loop\nJUMP loop\n', '--max-steps', '1000')
+    assert result.returncode == 60
+    assert result.stderr.startswith(b'Limit max-steps=1000 exceeded')
+
+
+def test_max_time(tmp_path):
+    result = interpret(tmp_path, 'LABEL loop\nJUMP loop\n', '--max-time', '0.05')
+    assert result.returncode == 60
+    assert result.stderr.startswith(b'Limit max-time=0.05 exceeded')
+
+
+def test_max_memory(tmp_path):
+    result = interpret(tmp_path, 'LABEL loop\nPUSHS int@1\nJUMP loop\n', '--max-memory', '100000')
+    assert result.returncode == 60
+    assert result.stderr.startswith(b'Limit max-memory=100000 exceeded')